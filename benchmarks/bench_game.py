@@ -0,0 +1,298 @@
+"""
+Microbenchmarks for the game engine's hot paths.
+
+Each benchmark prepares its inputs up front (not timed) from fixed seeds, then
+times one operation per input. Results report operations per second (best of
+several runs) and, from a separate tracemalloc run that keeps each operation's
+result alive, the bytes and memory blocks each operation leaves allocated.
+
+    python -m benchmarks.bench_game              # run and compare with the baseline
+    python -m benchmarks.bench_game --save       # store the results as the new baseline
+    python -m benchmarks.bench_game --check 0.25 # exit 1 if any benchmark is >25% slower
+    python -m benchmarks.bench_game make_move    # run only benchmarks matching a name
+
+Ops/sec depends on the machine, so compare against a baseline saved on the
+same machine; allocations per op should match anywhere.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from server.game import Game
+from server.player import Player
+from server.card import CARDS, CARD_STRINGS, Suit, card_from_str
+from server import rules
+import common.protocol as protocol
+from common.codec import JSON_CODEC, BINARY_CODEC
+
+SEED = 20240501
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_OPS = 10000  # Operations per timed run
+DEFAULT_REPEAT = 3  # Timed runs per benchmark; the best one is reported
+
+BENCHMARKS = {}  # name -> (prepare(n, rng) returning a list of argument tuples, operation)
+
+def benchmark(name, prepare):
+    """Register fn as a benchmark operation, called once per prepared argument tuple."""
+    def register(fn):
+        BENCHMARKS[name] = (prepare, fn)
+        return fn
+    return register
+
+# Input builders. Game shuffles with the module-level random, which run() seeds.
+
+def _new_game(rng, players=None):
+    game = Game()
+    for i in range(players or rng.randint(2, 5)):
+        game.add_player(f"p{i}", None)
+    return game
+
+def _started_game(rng, players=None):
+    game = _new_game(rng, players)
+    game.start_game()
+    return game
+
+def _legal_card(game):
+    """A legal card for the current player, or None."""
+    player = game.players[game.get_current_player()]
+    legal = player.hand_mask & rules.legal_mask(game.get_top_discard_card(), game.current_suit)
+    for card in player.hand:
+        if (legal >> card.id) & 1:
+            return card
+    return None
+
+def _prepare_new_games(n, rng):
+    return [(_new_game(rng),) for _ in range(n)]
+
+def _prepare_moves(n, rng):
+    items = []
+    while len(items) < n:
+        game = _started_game(rng)
+        card = _legal_card(game)
+        if card is not None:
+            declared = rng.choice(list(Suit)).value if card.value == '8' else None
+            items.append((game, game.get_current_player(), str(card), declared))
+    return items
+
+def _prepare_draws(n, rng):
+    games = [_started_game(rng) for _ in range(n)]
+    return [(game, game.get_current_player()) for game in games]
+
+def _prepare_reshuffles(n, rng):
+    items = []
+    for _ in range(n):
+        game = _started_game(rng)
+        # Move most of the deck onto the discard pile, as late in a long game
+        while len(game.deck.cards) > 2:
+            game.discard_pile.append(game.deck.cards.pop())
+        items.append((game,))
+    return items
+
+def _prepare_started_games(n, rng):
+    return [(_started_game(rng),) for _ in range(n)]
+
+def _prepare_hands(n, rng):
+    items = []
+    for _ in range(n):
+        player = Player("p", None)
+        for card in rng.sample(CARDS, 8):
+            player.add_card(card)
+        items.append((player, CARD_STRINGS[rng.choice(player.hand).id]))
+    return items
+
+def _prepare_can_play(n, rng):
+    items = []
+    for player, _ in _prepare_hands(n, rng):
+        top = rng.choice(CARDS)
+        suit = rng.choice(list(Suit)) if top.value == '8' else None
+        items.append((player, top, suit))
+    return items
+
+def _prepare_card_strings(n, rng):
+    return [(CARD_STRINGS[rng.randrange(len(CARDS))],) for _ in range(n)]
+
+def _prepare_cards(n, rng):
+    return [(rng.choice(CARDS),) for _ in range(n)]
+
+def _prepare_messages(n, rng):
+    items = []
+    while len(items) < n:
+        game = _started_game(rng)
+        game.publish_state()
+        card = _legal_card(game)
+        if card is not None:
+            game.make_move(game.get_current_player(), str(card), 'hearts' if card.value == '8' else None)
+        if not game.started:
+            continue  # Rare: the move ended the game
+        version, changes = game.publish_state()
+        hand = game.players[game.get_current_player()].get_hand_as_strings()
+        suit = game.current_suit.value if game.current_suit else None
+        items.append((version, changes, hand, str(game.get_top_discard_card()), suit))
+    return items
+
+def _build_messages(version, changes, hand, top_card, suit):
+    return (
+        protocol.create_state_delta_message(version, changes, {"player": "p0", "card": top_card}),
+        protocol.create_deal_message(hand),
+        protocol.create_game_started_message("p0", top_card, suit),
+    )
+
+# Benchmarks
+
+@benchmark("start_game", _prepare_new_games)
+def bench_start_game(game):
+    return game.start_game()
+
+@benchmark("make_move", _prepare_moves)
+def bench_make_move(game, username, card, declared_suit):
+    return game.make_move(username, card, declared_suit)
+
+@benchmark("draw_card", _prepare_draws)
+def bench_draw_card(game, username):
+    return game.draw_card(username)
+
+@benchmark("reshuffle_discard_pile", _prepare_reshuffles)
+def bench_reshuffle(game):
+    return game.reshuffle_discard_pile()
+
+@benchmark("end_game", _prepare_started_games)
+def bench_end_game(game):
+    game.end_game(blocked=True)  # The blocked path also ranks the scores
+    return game.game_over_data
+
+@benchmark("calculate_scores", _prepare_started_games)
+def bench_calculate_scores(game):
+    return game.calculate_scores()
+
+@benchmark("player_remove_card", _prepare_hands)
+def bench_remove_card(player, card):
+    return player.remove_card(card)
+
+@benchmark("player_can_play", _prepare_can_play)
+def bench_can_play(player, top_card, current_suit):
+    return player.can_play(top_card, current_suit)
+
+@benchmark("card_from_str", _prepare_card_strings)
+def bench_card_from_str(card):
+    return card_from_str(card)
+
+@benchmark("card_str", _prepare_cards)
+def bench_card_str(card):
+    return str(card)
+
+@benchmark("protocol_build", _prepare_messages)
+def bench_protocol_build(*args):
+    return _build_messages(*args)
+
+@benchmark("protocol_json_roundtrip", _prepare_messages)
+def bench_json_roundtrip(*args):
+    return [JSON_CODEC.decode(JSON_CODEC.encode(message)) for message in _build_messages(*args)]
+
+@benchmark("protocol_binary_roundtrip", _prepare_messages)
+def bench_binary_roundtrip(*args):
+    return [BINARY_CODEC.decode(BINARY_CODEC.encode(message)) for message in _build_messages(*args)]
+
+# Runner
+
+def _prepare(name, n):
+    prepare, _ = BENCHMARKS[name]
+    random.seed(SEED)
+    return prepare(n, random.Random(SEED))
+
+def run(name, n=DEFAULT_OPS, repeat=DEFAULT_REPEAT):
+    """Time a benchmark and measure its allocations. Returns a result dict."""
+    _, operation = BENCHMARKS[name]
+    best = float('inf')
+    gc_was_enabled = gc.isenabled()
+    for _ in range(repeat):
+        items = _prepare(name, n)
+        random.seed(SEED + 1)  # Same shuffles in every run
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            for args in items:
+                operation(*args)
+            best = min(best, time.perf_counter() - started)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    # Allocation run: keep every result alive so it is counted
+    items = _prepare(name, n)
+    random.seed(SEED + 1)
+    results = [None] * n
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for i, args in enumerate(items):
+            results[i] = operation(*args)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    diff = after.compare_to(before, 'filename')
+    allocated = sum(stat.size_diff for stat in diff)
+    blocks = sum(stat.count_diff for stat in diff)
+
+    return {
+        'ops_per_sec': round(n / best),
+        'bytes_per_op': round(allocated / n, 1),
+        'blocks_per_op': round(blocks / n, 2),
+    }
+
+def load_baseline(path=BASELINE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get('results', {})
+
+def main():
+    """Entry point for the benchmark suite."""
+    parser = argparse.ArgumentParser(description="Benchmark the game engine's hot paths.")
+    parser.add_argument("names", nargs="*", help="run only benchmarks whose name contains one of these")
+    parser.add_argument("-n", type=int, default=DEFAULT_OPS, help="operations per run")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed runs per benchmark")
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file")
+    parser.add_argument("--check", type=float, metavar="TOLERANCE",
+                        help="exit with status 1 if a benchmark's ops/sec drops by more than this fraction")
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if not args.names or any(part in name for part in args.names)]
+    baseline = load_baseline(args.baseline)
+    results = {}
+    regressions = []
+    print(f"{'benchmark':<28}{'ops/sec':>12}{'vs base':>9}{'bytes/op':>11}{'blocks/op':>11}")
+    for name in names:
+        result = results[name] = run(name, args.n, args.repeat)
+        base = baseline.get(name)
+        ratio = result['ops_per_sec'] / base['ops_per_sec'] if base else None
+        if ratio is not None and args.check is not None and ratio < 1 - args.check:
+            regressions.append(name)
+        print(f"{name:<28}{result['ops_per_sec']:>12,}{f'{ratio:.2f}x' if ratio else '-':>9}"
+              f"{result['bytes_per_op']:>11}{result['blocks_per_op']:>11}")
+
+    if args.save:
+        saved = load_baseline(args.baseline)
+        saved.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump({
+                'python': sys.version.split()[0],
+                'seed': SEED,
+                'ops': args.n,
+                'results': dict(sorted(saved.items())),
+            }, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+
+    if regressions:
+        print(f"Slower than baseline by more than {args.check:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -2,20 +2,22 @@
 WebSocket client for the card game.
 """
 import asyncio
-import json
 import logging
-import os
 import websockets
 from common import protocol
-from datetime import datetime
+from common.codec import BINARY_SUBPROTOCOL, JSON_SUBPROTOCOL, JSON_CODEC, codec_for
+from urllib.parse import quote
 
 logger = logging.getLogger(__name__)
 
 class GameClient:
-    def __init__(self, server_uri='ws://localhost:8765'):
+    def __init__(self, server_uri='ws://localhost:8765', use_binary=True):
         self.server_uri = server_uri
+        self.use_binary = use_binary # Offer the compact binary encoding to the server
+        self.codec = JSON_CODEC # Encoding negotiated for the current connection
         self.websocket = None
         self.username = None
+        self.table = None # Table (room) id joined on the server
         self.hand = []
         self.current_turn = None
         self.game_started = False
@@ -24,6 +26,9 @@ class GameClient:
         self.top_card = None # Add state for top card
         self.current_suit = None # Add state for current suit (especially after 8)
         self.can_play_drawn_card = False # Flag if drawn card is playable
+        self.state_version = None # Version of the server state we have applied (None until a snapshot)
+        self.awaiting_snapshot = False # Set while a snapshot request is outstanding
+        self.hand_counts = {} # username -> number of cards held
     
     def set_ui_callback(self, callback):
         """Set the callback function for UI updates."""
@@ -34,48 +39,27 @@ class GameClient:
         if self.ui_callback:
             self.ui_callback(event_type, data)
     
-    async def connect(self, username):
-        """Connect to the server."""
+    async def connect(self, username, table=None):
+        """Connect to the server, optionally joining a specific table."""
         try:
-            # Define logs directory path
-            log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'client_logs') # Go up one level from client dir
-            
-            # Create logs directory if it doesn't exist
-            os.makedirs(log_dir, exist_ok=True)
-            
-            # Generate log filename based on current time, placing it in the logs directory
-            log_filename = datetime.now().strftime("client_log_%Y%m%d_%H%M%S.log")
-            log_filepath = os.path.join(log_dir, log_filename)
-            
-            # Configure logging to file
-            # Remove existing handlers if any to avoid duplicate logs
-            for handler in logging.root.handlers[:]:
-                logging.root.removeHandler(handler)
-            logging.basicConfig(
-                level=logging.INFO,
-                format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-                filename=log_filepath, # Use the full path
-                filemode='w' # Overwrite log file each time
-            )
-            
-            self.websocket = await websockets.connect(self.server_uri)
+            # Name the table in the URL too, so a sharded server can route on it
+            uri = f"{self.server_uri}/?table={quote(table)}" if table else self.server_uri
+            subprotocols = [BINARY_SUBPROTOCOL, JSON_SUBPROTOCOL] if self.use_binary else [JSON_SUBPROTOCOL]
+            self.websocket = await websockets.connect(uri, subprotocols=subprotocols)
+            self.codec = codec_for(self.websocket.subprotocol)
             self.username = username
-            logger.info(f"Connecting as {username} to {self.server_uri}")
-            logger.info(f"Logging to file: {log_filepath}")
+            self.table = table
+            logger.info("Connecting as %s to %s using %s encoding", username, self.server_uri, self.codec.subprotocol)
             
             # Send join message
-            await self.send_message(protocol.create_join_message(username))
+            await self.send_message(protocol.create_join_message(username, table))
             
             # Start the message receiver
             asyncio.create_task(self.receive_messages())
             
             return True
         except Exception as e:
-            # Log error before returning False, ensure logging is configured
-            if not logging.root.handlers:
-                 # Basic console config if file setup failed
-                 logging.basicConfig(level=logging.ERROR)
-            logger.error(f"Connection error: {e}")
+            logger.error("Connection error: %s", e)
             self.websocket = None # Ensure websocket is None on failure
             return False
     
@@ -83,8 +67,8 @@ class GameClient:
         """Send a message to the server."""
         if self.websocket and self.websocket.open:
             try:
-                await self.websocket.send(json.dumps(message))
-                logger.debug(f"Sent: {message}")
+                await self.websocket.send(self.codec.encode(message))
+                logger.debug("Sent: %s", message)
             except websockets.exceptions.ConnectionClosed:
                 logger.warning("Attempted to send message, but connection is closed.")
                 await self.handle_disconnection()
@@ -105,6 +89,82 @@ class GameClient:
         await self.send_message(protocol.create_draw_card_message())
         self.can_play_drawn_card = False # Reset flag when drawing
     
+    async def request_snapshot(self):
+        """Ask the server for the full game state (used to resync after a missed delta)."""
+        if not self.awaiting_snapshot:
+            self.awaiting_snapshot = True
+            await self.send_message(protocol.create_request_snapshot_message())
+
+    async def apply_state_delta(self, data):
+        """Apply a versioned state delta, or request a snapshot if versions don't line up."""
+        version = data.get("version")
+        if self.awaiting_snapshot:
+            return # The snapshot will bring us up to date
+        if self.state_version is not None and version <= self.state_version:
+            return # Already covered by a newer snapshot (e.g. a delayed spectator feed)
+        if self.state_version is None or version != self.state_version + 1:
+            logger.info("State version gap (have %s, got %s); requesting snapshot", self.state_version, version)
+            await self.request_snapshot()
+            return
+
+        self.state_version = version
+        changes = data.get("changes", {})
+        if "started" in changes:
+            self.game_started = changes["started"]
+        if "currentTurn" in changes:
+            self.current_turn = changes["currentTurn"]
+        if "topCard" in changes:
+            self.top_card = changes["topCard"]
+        if "currentSuit" in changes:
+            self.current_suit = changes["currentSuit"]
+        if "handCounts" in changes:
+            self.hand_counts.update(changes["handCounts"]) # Only changed entries are sent
+        if "players" in changes:
+            self.players = set(changes["players"])
+            self.hand_counts = {name: count for name, count in self.hand_counts.items() if name in self.players}
+
+        move = data.get("move")
+        if move:
+            # If it was our move, remove the card from our hand
+            if move["player"] == self.username:
+                if move["card"] in self.hand:
+                    self.hand.remove(move["card"])
+                else:
+                    logger.warning("Server reported move (%s) but card not found in local hand: %s", move['card'], self.hand)
+            self.update_ui("move_made", {
+                "action": protocol.MOVE_MADE,
+                "player": move["player"],
+                # The played card is the new top card, even if the delta doesn't say so
+                "move": {"card": move["card"], "topCard": self.top_card or move["card"], "currentSuit": self.current_suit},
+                "declared_suit": move.get("declaredSuit")
+            })
+
+        # A turn change during a running game (game start and end have their own messages)
+        if "currentTurn" in changes and "started" not in changes and self.game_started:
+            self.can_play_drawn_card = False # Reset flag on turn change
+            self.update_ui("turn_change", {
+                "action": protocol.TURN_CHANGE,
+                "currentTurn": self.current_turn,
+                "topCard": self.top_card,
+                "currentSuit": self.current_suit
+            })
+
+    def apply_snapshot(self, data):
+        """Replace local state with a full snapshot from the server."""
+        state = data.get("state", {})
+        self.state_version = data.get("version")
+        self.awaiting_snapshot = False
+        self.game_started = state.get("started", False)
+        self.current_turn = state.get("currentTurn")
+        self.top_card = state.get("topCard")
+        self.current_suit = state.get("currentSuit")
+        self.players = set(state.get("players", []))
+        self.hand_counts = dict(state.get("handCounts", {}))
+        if "hand" in state:
+            self.hand = state["hand"]
+        if self.game_started:
+            self.update_ui("update_game_state", state)
+
     async def request_player_list(self):
         """Send a request to the server for the current player list."""
         await self.send_message(protocol.create_list_players_message())
@@ -123,6 +183,8 @@ class GameClient:
         self.current_turn = None
         self.top_card = None
         self.current_suit = None
+        self.state_version = None
+        self.awaiting_snapshot = False
     
     async def handle_disconnection(self):
         """Handles cleanup and UI notification upon disconnection."""
@@ -130,102 +192,119 @@ class GameClient:
             logger.info("Connection to server closed")
             self.websocket = None
             self.game_started = False # Reset game state
+            self.state_version = None
+            self.awaiting_snapshot = False
             self.update_ui("disconnected")
     
+    async def handle_message(self, data):
+        """Process one message from the server."""
+        action = data.get("action")
+        
+        if action == protocol.PLAYER_JOINED:
+            self.players.add(data["player"])
+            self.update_ui("player_joined", data)
+        
+        elif action == protocol.GAME_STARTED:
+            self.game_started = True
+            self.current_turn = data["currentTurn"]
+            self.top_card = data.get("topCard")
+            self.current_suit = data.get("currentSuit")
+            self.update_ui("game_started", data)
+        
+        elif action == protocol.DEAL:
+            self.hand = data["hand"]
+            self.update_ui("deal", data)
+        
+        elif action == protocol.MOVE_MADE:
+            player = data["player"]
+            move_details = data.get("move", {})
+            card = move_details.get("card")
+            self.top_card = move_details.get("topCard")
+            self.current_suit = move_details.get("currentSuit")
+            declared_suit = move_details.get("declaredSuit")
+            
+            # If it was our move, remove the card from our hand
+            if player == self.username:
+                if card in self.hand:
+                    self.hand.remove(card)
+                else:
+                    logger.warning("Server reported move (%s) but card not found in local hand: %s", card, self.hand)
+            
+            # Pass declared suit info to UI
+            ui_data = data.copy()
+            ui_data['declared_suit'] = declared_suit
+            self.update_ui("move_made", ui_data)
+        
+        elif action == protocol.TURN_CHANGE:
+            self.current_turn = data["currentTurn"]
+            self.top_card = data.get("topCard")
+            self.current_suit = data.get("currentSuit")
+            self.can_play_drawn_card = False # Reset flag on turn change
+            self.update_ui("turn_change", data)
+        
+        elif action == protocol.DRAW_RESULT:
+            draw_result = data.get("drawResult", {})
+            drawn_card = draw_result.get("card")
+            if drawn_card:
+                self.hand.append(drawn_card)
+            self.can_play_drawn_card = draw_result.get("canPlay", False)
+            self.update_ui("draw_result", draw_result)
+        
+        elif action == protocol.PLAYER_LIST:
+            self.players = set(data["players"])
+            self.update_ui("player_list", data)
+        
+        elif action == protocol.GAME_OVER:
+            self.game_started = False
+            self.current_turn = None
+            self.top_card = None
+            self.current_suit = None
+            # Pass the full data (including reason) to the UI
+            self.update_ui("game_over", data)
+        
+        elif action == protocol.ERROR:
+            self.update_ui("error", data)
+        
+        elif action == protocol.PLAYER_LEFT:
+            player_left = data.get("player")
+            if player_left in self.players:
+                self.players.remove(player_left)
+            self.update_ui("player_left", data)
+        
+        elif action == protocol.STATE_DELTA:
+            await self.apply_state_delta(data)
+        
+        elif action == protocol.SNAPSHOT:
+            self.apply_snapshot(data)
+        
+        elif action == protocol.UPDATE_GAME_STATE:
+            game_state = data.get("gameState", {})
+            self.current_turn = game_state.get("currentTurn", self.current_turn)
+            self.top_card = game_state.get("topCard", self.top_card)
+            self.current_suit = game_state.get("currentSuit", self.current_suit)
+            if "hand" in game_state:
+                self.hand = game_state["hand"]
+            self.game_started = True # Assume if we get this, game is on
+            self.update_ui("update_game_state", game_state)
+    
     async def receive_messages(self):
         """Receive and process messages from the server."""
         try:
             async for message in self.websocket:
-                data = json.loads(message)
-                logger.info(f"Received: {data}")
-                
-                action = data.get("action")
-                
-                if action == protocol.PLAYER_JOINED:
-                    self.players.add(data["player"])
-                    self.update_ui("player_joined", data)
-                
-                elif action == protocol.GAME_STARTED:
-                    self.game_started = True
-                    self.current_turn = data["currentTurn"]
-                    self.top_card = data.get("topCard")
-                    self.current_suit = data.get("currentSuit")
-                    self.update_ui("game_started", data)
-                
-                elif action == protocol.DEAL:
-                    self.hand = data["hand"]
-                    self.update_ui("deal", data)
-                
-                elif action == protocol.MOVE_MADE:
-                    player = data["player"]
-                    move_details = data.get("move", {})
-                    card = move_details.get("card")
-                    self.top_card = move_details.get("topCard")
-                    self.current_suit = move_details.get("currentSuit")
-                    declared_suit = move_details.get("declaredSuit")
-                    
-                    # If it was our move, remove the card from our hand
-                    if player == self.username:
-                        if card in self.hand:
-                            self.hand.remove(card)
-                        else:
-                            logger.warning(f"Server reported move ({card}) but card not found in local hand: {self.hand}")
-                    
-                    # Pass declared suit info to UI
-                    ui_data = data.copy()
-                    ui_data['declared_suit'] = declared_suit
-                    self.update_ui("move_made", ui_data)
-                
-                elif action == protocol.TURN_CHANGE:
-                    self.current_turn = data["currentTurn"]
-                    self.top_card = data.get("topCard")
-                    self.current_suit = data.get("currentSuit")
-                    self.can_play_drawn_card = False # Reset flag on turn change
-                    self.update_ui("turn_change", data)
-                
-                elif action == protocol.DRAW_RESULT:
-                    draw_result = data.get("drawResult", {})
-                    drawn_card = draw_result.get("card")
-                    if drawn_card:
-                        self.hand.append(drawn_card)
-                    self.can_play_drawn_card = draw_result.get("canPlay", False)
-                    self.update_ui("draw_result", draw_result)
-                
-                elif action == protocol.PLAYER_LIST:
-                    self.players = set(data["players"])
-                    self.update_ui("player_list", data)
-                
-                elif action == protocol.GAME_OVER:
-                    self.game_started = False
-                    self.current_turn = None
-                    self.top_card = None
-                    self.current_suit = None
-                    # Pass the full data (including reason) to the UI
-                    self.update_ui("game_over", data)
-                
-                elif action == protocol.ERROR:
-                    self.update_ui("error", data)
-                
-                elif action == protocol.PLAYER_LEFT:
-                    player_left = data.get("player")
-                    if player_left in self.players:
-                        self.players.remove(player_left)
-                    self.update_ui("player_left", data)
+                data = self.codec.decode(message)
+                logger.info("Received: %s", data)
                 
-                elif action == protocol.UPDATE_GAME_STATE:
-                    game_state = data.get("gameState", {})
-                    self.current_turn = game_state.get("currentTurn", self.current_turn)
-                    self.top_card = game_state.get("topCard", self.top_card)
-                    self.current_suit = game_state.get("currentSuit", self.current_suit)
-                    if "hand" in game_state:
-                        self.hand = game_state["hand"]
-                    self.game_started = True # Assume if we get this, game is on
-                    self.update_ui("update_game_state", game_state)
+                if data.get("action") == protocol.BATCH:
+                    # One frame can carry every message from a single server action
+                    for batched in data.get("messages", []):
+                        await self.handle_message(batched)
+                else:
+                    await self.handle_message(data)
         
         except websockets.exceptions.ConnectionClosed:
             await self.handle_disconnection()
         except Exception as e:
-            logger.error(f"Error receiving messages: {e}", exc_info=True)
+            logger.error("Error receiving messages: %s", e, exc_info=True)
             self.update_ui("error", {"message": f"Receive loop error: {e}"})
             await self.handle_disconnection()
         finally:
@@ -0,0 +1,232 @@
+"""
+Headless load generator for the card game server.
+
+Runs many bot-played tables in one process, each seat a GameClient that plays
+a random legal card when it can and draws otherwise:
+    python -m client.loadgen --tables 250 --seats 4 --rounds 3
+
+When done it reports the game action throughput and the latency from sending
+an action to receiving its result: the move (MOVE_MADE or TURN_CHANGE) for
+plays, the draw result for draws.
+"""
+import argparse
+import asyncio
+import logging
+import math
+import random
+import time
+from .client import GameClient
+from common import logconfig
+
+logger = logging.getLogger(__name__)
+
+SUIT_NAMES = {'H': 'hearts', 'D': 'diamonds', 'C': 'clubs', 'S': 'spades'}
+PERCENTILES = (50, 95, 99)
+
+def card_value(card):
+    """Value part of a card string: 'KH' -> 'K', 'TS' -> 'T'."""
+    return card[:-1]
+
+def card_suit(card):
+    """Suit name of a card string: 'KH' -> 'hearts'."""
+    return SUIT_NAMES.get(card[-1])
+
+def playable_cards(hand, top_card, current_suit):
+    """Cards in hand that may be played on top_card: 8s, or a match on value or the effective suit."""
+    if not top_card:
+        return []
+    suit = current_suit or card_suit(top_card)
+    return [card for card in hand
+            if card_value(card) == '8' or card_value(card) == card_value(top_card) or card_suit(card) == suit]
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = {'move': [], 'draw': []}  # Seconds from sending an action to its result
+        self.errors = 0  # Actions the server rejected
+        self.games = 0  # Rounds played to the end
+        self.failed_connects = 0
+        self.started = None
+        self.finished = None
+
+    def record(self, action, latency):
+        self.latencies[action].append(latency)
+
+    def report(self):
+        """Text summary of throughput and latency percentiles."""
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        total = sum(len(values) for values in self.latencies.values())
+        lines = [
+            f"Elapsed: {elapsed:.2f}s, games finished: {self.games}, "
+            f"rejected actions: {self.errors}, failed connections: {self.failed_connects}",
+            f"Throughput: {total / elapsed if elapsed else 0:.1f} actions/s ({total} actions)",
+        ]
+        for action, values in self.latencies.items():
+            if not values:
+                continue
+            values = sorted(values)
+            points = ", ".join(f"p{p} {percentile(values, p) * 1000:.2f}ms" for p in PERCENTILES)
+            lines.append(f"{action}: {len(values)} actions, {points}, max {values[-1] * 1000:.2f}ms")
+        return "\n".join(lines)
+
+class Bot:
+    """One seat, played through a GameClient."""
+    def __init__(self, name, table, stats, server_uri, use_binary, rng, think_time=0.0):
+        self.name = name
+        self.table = table
+        self.stats = stats
+        self.rng = rng
+        self.think_time = think_time  # Seconds to wait before each action
+        self.client = GameClient(server_uri, use_binary=use_binary)
+        self.client.set_ui_callback(self.update_ui)
+        self.pending = None  # (action, time sent) while waiting for the result of our action
+        self.acting = False  # An action is being chosen or sent
+        self.must_draw = False  # Draw next: the server rejected our last play
+        self.game_over = asyncio.Event()
+        self.disconnected = False
+
+    async def connect(self):
+        return await self.client.connect(self.name, self.table)
+
+    def update_ui(self, event_type, data=None):
+        """GameClient callback: time our actions' results and act when it's our turn."""
+        if event_type == "move_made" or event_type == "turn_change":
+            if self.pending and self.pending[0] == 'move' and (event_type == "turn_change" or data.get("player") == self.name):
+                self._complete()
+        elif event_type == "draw_result":
+            if self.pending and self.pending[0] == 'draw':
+                self._complete()
+        elif event_type == "error":
+            if self.pending:
+                self.stats.errors += 1
+                self.must_draw = self.pending[0] == 'move'
+                self.pending = None
+        elif event_type == "game_over":
+            self.pending = None
+            self.game_over.set()
+            return
+        elif event_type == "disconnected":
+            self.disconnected = True
+            self.game_over.set()
+            return
+        if self.client.game_started and self.client.current_turn == self.name and not self.pending and not self.acting:
+            self.acting = True
+            asyncio.get_running_loop().create_task(self._act())
+
+    def _complete(self):
+        action, sent = self.pending
+        self.stats.record(action, time.perf_counter() - sent)
+        self.pending = None
+
+    async def _act(self):
+        try:
+            if self.think_time:
+                await asyncio.sleep(self.think_time)
+            client = self.client
+            if not client.game_started or client.current_turn != self.name or self.pending:
+                return
+            cards = [] if self.must_draw else playable_cards(client.hand, client.top_card, client.current_suit)
+            self.must_draw = False
+            if cards:
+                card = self.rng.choice(cards)
+                declared_suit = self.rng.choice(list(SUIT_NAMES.values())) if card_value(card) == '8' else None
+                self.pending = ('move', time.perf_counter())
+                await client.play_card(card, declared_suit)
+            else:
+                self.pending = ('draw', time.perf_counter())
+                await client.draw_card()
+        finally:
+            self.acting = False
+
+class LoadGenerator:
+    def __init__(self, server_uri='ws://localhost:8765', tables=10, seats=4, rounds=1, use_binary=True,
+                 connect_concurrency=100, think_time=0.0, seed=None, table_prefix="load"):
+        self.server_uri = server_uri
+        self.tables = tables
+        self.seats = seats
+        self.rounds = rounds  # Games played per table
+        self.use_binary = use_binary
+        self.connect_limit = asyncio.Semaphore(connect_concurrency)  # Connections being opened at once
+        self.think_time = think_time
+        self.rng = random.Random(seed)
+        self.table_prefix = table_prefix
+        self.stats = LoadStats()
+
+    async def run_table(self, index):
+        """Seat a table's bots, play its rounds, then disconnect them."""
+        table = f"{self.table_prefix}-{index}"
+        bots = [
+            Bot(f"{table}-{seat}", table, self.stats, self.server_uri, self.use_binary,
+                random.Random(self.rng.random()), self.think_time)
+            for seat in range(self.seats)
+        ]
+        try:
+            for bot in bots:
+                async with self.connect_limit:
+                    if not await bot.connect():
+                        self.stats.failed_connects += 1
+                        return
+            starter = bots[0].client
+            while len(starter.players) < self.seats:
+                await asyncio.sleep(0.01)
+
+            for _ in range(self.rounds):
+                for bot in bots:
+                    bot.game_over.clear()
+                await starter.start_game()
+                await asyncio.gather(*(bot.game_over.wait() for bot in bots))
+                if any(bot.disconnected for bot in bots):
+                    logger.warning("Table %s lost a connection; stopping it", table)
+                    return
+                self.stats.games += 1
+        finally:
+            for bot in bots:
+                await bot.client.disconnect()
+
+    async def run(self, timeout=None):
+        """Play every table and return the stats."""
+        self.stats.started = time.perf_counter()
+        tasks = [asyncio.create_task(self.run_table(i)) for i in range(self.tables)]
+        done, not_done = await asyncio.wait(tasks, timeout=timeout)
+        for task in not_done:
+            task.cancel()
+        if not_done:
+            logger.warning("%d tables did not finish within %ss", len(not_done), timeout)
+            await asyncio.gather(*not_done, return_exceptions=True)
+        for task in done:
+            if not task.cancelled() and task.exception():
+                logger.error("Table failed: %s", task.exception())
+        self.stats.finished = time.perf_counter()
+        return self.stats
+
+def main():
+    """Entry point for the load generator."""
+    parser = argparse.ArgumentParser(description="Play many bot games against a server and report latency.")
+    parser.add_argument("--uri", default="ws://localhost:8765", help="server WebSocket URI")
+    parser.add_argument("--tables", type=int, default=10)
+    parser.add_argument("--seats", type=int, default=4, help="bots per table")
+    parser.add_argument("--rounds", type=int, default=1, help="games per table")
+    parser.add_argument("--json", action="store_true", help="use the JSON encoding instead of binary")
+    parser.add_argument("--connect-concurrency", type=int, default=100, help="connections opened at once")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds each bot waits before acting")
+    parser.add_argument("--timeout", type=float, default=None, help="stop after this many seconds")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    logconfig.configure(level="WARNING")
+    generator = LoadGenerator(
+        server_uri=args.uri, tables=args.tables, seats=args.seats, rounds=args.rounds,
+        use_binary=not args.json, connect_concurrency=args.connect_concurrency,
+        think_time=args.think_time, seed=args.seed
+    )
+    stats = asyncio.run(generator.run(timeout=args.timeout))
+    print(stats.report())
+
+if __name__ == "__main__":
+    main()
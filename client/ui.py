@@ -3,12 +3,11 @@ Simple console UI for the card game client.
 """
 import asyncio
 import logging
+import os
+from datetime import datetime
 from .client import GameClient
+from common import logconfig
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 class ConsoleUI:
@@ -148,7 +147,7 @@ class ConsoleUI:
                 if self.client.websocket:
                     await self.client.disconnect()
             except Exception as e:
-                logger.error(f"Error in input loop: {e}")
+                logger.error("Error in input loop: %s", e)
                 if self.running:
                     self._print_prompt()
 
@@ -266,6 +265,11 @@ class ConsoleUI:
 
 async def main():
     """Main entry point for the client."""
+    # Log to a file so log lines don't interleave with the console game
+    log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'client_logs') # Go up one level from client dir
+    os.makedirs(log_dir, exist_ok=True)
+    log_filename = datetime.now().strftime("client_log_%Y%m%d_%H%M%S.log")
+    logconfig.configure(filename=os.path.join(log_dir, log_filename))
     ui = ConsoleUI()
     await ui.run()
 
@@ -0,0 +1,302 @@
+"""
+Wire encodings for protocol messages.
+
+Two encodings carry the same message dicts built in common.protocol:
+- JSON (text frames), the default and the one the browser client uses.
+- A compact binary encoding (binary frames): a 1-byte action opcode, presence
+  bytes for optional fields, then the fields in a fixed order per action. Cards
+  and suits are 1 byte each, counts are 1-2 bytes and strings are UTF-8 with a
+  2-byte length prefix.
+
+Several already-encoded messages can be combined into one batch frame
+(protocol.BATCH) with encode_batch, so shared parts are encoded only once.
+
+Clients pick an encoding through WebSocket subprotocol negotiation; a connection
+that negotiates no subprotocol uses JSON.
+"""
+import json
+import struct
+from . import protocol
+
+JSON_SUBPROTOCOL = "crazy8.json"
+BINARY_SUBPROTOCOL = "crazy8.bin"
+SUBPROTOCOLS = [BINARY_SUBPROTOCOL, JSON_SUBPROTOCOL]  # Preference order
+
+# Card and suit encodings match server.card: card id = suit index * 13 + value index
+_CARD_VALUES = "23456789TJQKA"
+_SUIT_CHARS = "HDCS"
+_SUIT_NAMES = ("hearts", "diamonds", "clubs", "spades")
+_CARD_STRINGS = [v + s for s in _SUIT_CHARS for v in _CARD_VALUES]
+_CARD_IDS = {card: i for i, card in enumerate(_CARD_STRINGS)}
+_SUIT_IDS = {suit: i for i, suit in enumerate(_SUIT_NAMES)}
+_NONE_BYTE = 0xFF
+_BATCH_OPCODE = 0xFF  # Batch frame: u16 count, then (u16 length, message frame) items
+_NONE_LENGTH = 0xFFFF
+_MISSING = object()
+
+# Field types
+STR = "str"  # UTF-8, u16 length prefix; None allowed
+CARD = "card"  # u8 card id; None allowed
+SUIT = "suit"  # u8 suit index; None allowed
+BOOL = "bool"  # u8
+U16 = "u16"
+U32 = "u32"
+STRS = "strs"  # u16 count + STR items
+CARDS = "cards"  # u8 count + CARD items
+SCORES = "scores"  # u16 count + (STR, u16) pairs
+
+def _field(path, kind, optional=False):
+    return (tuple(path.split(".")), kind, optional)
+
+# Field layout per action, in wire order. Optional fields are only present
+# in the message when their bit is set in the presence bytes (one bit per
+# optional field; a present optional field may still be None).
+SCHEMAS = {
+    protocol.JOIN: [_field("username", STR), _field("table", STR, optional=True)],
+    protocol.PLAYER_JOINED: [_field("player", STR), _field("playerCount", U16)],
+    protocol.PLAYER_LIST: [_field("players", STRS)],
+    protocol.PLAYER_LEFT: [_field("player", STR), _field("playerCount", U16)],
+    protocol.START_GAME: [],
+    protocol.GAME_STARTED: [_field("currentTurn", STR), _field("topCard", CARD), _field("currentSuit", SUIT)],
+    protocol.DEAL: [_field("hand", CARDS)],
+    protocol.MOVE: [_field("move.card", CARD), _field("move.declaredSuit", SUIT, optional=True)],
+    protocol.MOVE_MADE: [
+        _field("player", STR), _field("move.card", CARD), _field("move.topCard", CARD),
+        _field("move.currentSuit", SUIT), _field("move.declaredSuit", SUIT, optional=True)
+    ],
+    protocol.DRAW_CARD: [],
+    protocol.DRAW_RESULT: [
+        _field("drawResult.card", CARD), _field("drawResult.canPlay", BOOL),
+        _field("drawResult.deckEmpty", BOOL), _field("drawResult.gameBlocked", BOOL)
+    ],
+    protocol.TURN_CHANGE: [_field("currentTurn", STR), _field("topCard", CARD), _field("currentSuit", SUIT)],
+    protocol.ERROR: [_field("message", STR)],
+    protocol.GAME_OVER: [_field("winner", STR), _field("scores", SCORES), _field("blocked", BOOL), _field("reason", STR)],
+    protocol.LIST_PLAYERS: [],
+    protocol.UPDATE_GAME_STATE: [
+        _field("gameState.currentTurn", STR), _field("gameState.topCard", CARD),
+        _field("gameState.currentSuit", SUIT), _field("gameState.hand", CARDS, optional=True)
+    ],
+    protocol.CHAT_MESSAGE: [_field("sender", STR, optional=True), _field("message", STR)],
+    protocol.STATE_DELTA: [
+        _field("version", U32),
+        _field("changes.started", BOOL, optional=True), _field("changes.currentTurn", STR, optional=True),
+        _field("changes.topCard", CARD, optional=True), _field("changes.currentSuit", SUIT, optional=True),
+        _field("changes.players", STRS, optional=True), _field("changes.handCounts", SCORES, optional=True),
+        _field("move.player", STR, optional=True), _field("move.card", CARD, optional=True),
+        _field("move.declaredSuit", SUIT, optional=True)
+    ],
+    protocol.REQUEST_SNAPSHOT: [],
+    protocol.SNAPSHOT: [
+        _field("version", U32),
+        _field("state.started", BOOL), _field("state.currentTurn", STR), _field("state.topCard", CARD),
+        _field("state.currentSuit", SUIT), _field("state.players", STRS), _field("state.handCounts", SCORES),
+        _field("state.hand", CARDS, optional=True)
+    ],
+}
+
+# Opcodes are assigned in SCHEMAS order; only ever append new actions
+OPCODES = {action: i for i, action in enumerate(SCHEMAS)}
+ACTIONS = list(SCHEMAS)
+
+_U16 = struct.Struct("!H")
+_U32 = struct.Struct("!I")
+
+def _encode_str(value, out):
+    if value is None:
+        out += _U16.pack(_NONE_LENGTH)
+        return
+    data = str(value).encode("utf-8")
+    if len(data) >= _NONE_LENGTH:
+        raise ValueError("String too long for binary encoding")
+    out += _U16.pack(len(data))
+    out += data
+
+def _encode_value(kind, value, out):
+    if kind is STR:
+        _encode_str(value, out)
+    elif kind is CARD:
+        out.append(_NONE_BYTE if value is None else _CARD_IDS[value])
+    elif kind is SUIT:
+        out.append(_NONE_BYTE if value is None else _SUIT_IDS[value])
+    elif kind is BOOL:
+        out.append(1 if value else 0)
+    elif kind is U16:
+        out += _U16.pack(value)
+    elif kind is U32:
+        out += _U32.pack(value)
+    elif kind is STRS:
+        out += _U16.pack(len(value))
+        for item in value:
+            _encode_str(item, out)
+    elif kind is CARDS:
+        out.append(len(value))
+        out += bytes(_CARD_IDS[card] for card in value)
+    elif kind is SCORES:
+        out += _U16.pack(len(value))
+        for name, score in value.items():
+            _encode_str(name, out)
+            out += _U16.pack(score)
+
+def _decode_str(data, offset):
+    (length,) = _U16.unpack_from(data, offset)
+    offset += 2
+    if length == _NONE_LENGTH:
+        return None, offset
+    if offset + length > len(data):
+        raise ValueError("Truncated string")
+    return data[offset:offset + length].decode("utf-8"), offset + length
+
+def _decode_value(kind, data, offset):
+    if kind is STR:
+        return _decode_str(data, offset)
+    elif kind is CARD:
+        byte = data[offset]
+        return (None if byte == _NONE_BYTE else _CARD_STRINGS[byte]), offset + 1
+    elif kind is SUIT:
+        byte = data[offset]
+        return (None if byte == _NONE_BYTE else _SUIT_NAMES[byte]), offset + 1
+    elif kind is BOOL:
+        return bool(data[offset]), offset + 1
+    elif kind is U16:
+        return _U16.unpack_from(data, offset)[0], offset + 2
+    elif kind is U32:
+        return _U32.unpack_from(data, offset)[0], offset + 4
+    elif kind is STRS:
+        (count,) = _U16.unpack_from(data, offset)
+        offset += 2
+        items = []
+        for _ in range(count):
+            item, offset = _decode_str(data, offset)
+            items.append(item)
+        return items, offset
+    elif kind is CARDS:
+        count = data[offset]
+        offset += 1
+        if offset + count > len(data):
+            raise ValueError("Truncated card list")
+        return [_CARD_STRINGS[b] for b in data[offset:offset + count]], offset + count
+    elif kind is SCORES:
+        (count,) = _U16.unpack_from(data, offset)
+        offset += 2
+        scores = {}
+        for _ in range(count):
+            name, offset = _decode_str(data, offset)
+            scores[name] = _U16.unpack_from(data, offset)[0]
+            offset += 2
+        return scores, offset
+    raise ValueError(f"Unknown field type: {kind}")
+
+def _presence_size(schema):
+    """Number of presence bytes needed for a schema's optional fields."""
+    return (sum(1 for f in schema if f[2]) + 7) // 8
+
+class JsonCodec:
+    """Text frames carrying JSON objects."""
+    subprotocol = JSON_SUBPROTOCOL
+
+    def encode(self, message):
+        return json.dumps(message)
+
+    def encode_batch(self, frames):
+        """Combine already-encoded messages into one batch frame."""
+        return '{"action": "batch", "messages": [' + ", ".join(frames) + "]}"
+
+    def decode(self, frame):
+        message = json.loads(frame)
+        if not isinstance(message, dict):
+            raise ValueError("Expected a JSON object")
+        return message
+
+class BinaryCodec:
+    """Binary frames in the compact per-action layout described above."""
+    subprotocol = BINARY_SUBPROTOCOL
+
+    def encode(self, message):
+        action = message["action"]
+        if action == protocol.BATCH:
+            return self.encode_batch([self.encode(m) for m in message["messages"]])
+        schema = SCHEMAS.get(action)
+        if schema is None:
+            raise ValueError(f"No binary encoding for action: {action}")
+        out = bytearray((OPCODES[action],))
+        presence_size = _presence_size(schema)
+        out += bytes(presence_size)  # Presence bytes, filled in below
+
+        presence = 0
+        bit = 0
+        for path, kind, optional in schema:
+            value = message
+            for key in path:
+                value = value.get(key, _MISSING) if isinstance(value, dict) else _MISSING
+            if optional:
+                present = value is not _MISSING
+                presence |= present << bit
+                bit += 1
+                if not present:
+                    continue
+            elif value is _MISSING:
+                value = None
+            _encode_value(kind, value, out)
+
+        if presence_size:
+            out[1:1 + presence_size] = presence.to_bytes(presence_size, "little")
+        return bytes(out)
+
+    def encode_batch(self, frames):
+        """Combine already-encoded messages into one batch frame."""
+        out = bytearray((_BATCH_OPCODE,))
+        out += _U16.pack(len(frames))
+        for frame in frames:
+            out += _U16.pack(len(frame))
+            out += frame
+        return bytes(out)
+
+    def decode(self, frame):
+        """Decode a frame; raises ValueError if it is truncated or malformed."""
+        if isinstance(frame, str):
+            raise ValueError("Expected a binary frame")
+        try:
+            return self._decode(frame)
+        except (struct.error, IndexError, KeyError) as e:
+            raise ValueError(f"Malformed binary frame: {e}") from e
+
+    def _decode(self, frame):
+        if frame[0] == _BATCH_OPCODE:
+            (count,) = _U16.unpack_from(frame, 1)
+            offset = 3
+            messages = []
+            for _ in range(count):
+                (length,) = _U16.unpack_from(frame, offset)
+                offset += 2
+                messages.append(self._decode(frame[offset:offset + length]))
+                offset += length
+            return protocol.create_batch_message(messages)
+        action = ACTIONS[frame[0]]
+        schema = SCHEMAS[action]
+        presence_size = _presence_size(schema)
+        presence = int.from_bytes(frame[1:1 + presence_size], "little")
+        offset = 1 + presence_size
+
+        message = {"action": action}
+        bit = 0
+        for path, kind, optional in schema:
+            if optional:
+                present = (presence >> bit) & 1
+                bit += 1
+                if not present:
+                    continue
+            value, offset = _decode_value(kind, frame, offset)
+            target = message
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = value
+        return message
+
+JSON_CODEC = JsonCodec()
+BINARY_CODEC = BinaryCodec()
+_CODECS = {JSON_SUBPROTOCOL: JSON_CODEC, BINARY_SUBPROTOCOL: BINARY_CODEC}
+
+def codec_for(subprotocol):
+    """Return the codec for a negotiated subprotocol (JSON if none was negotiated)."""
+    return _CODECS.get(subprotocol, JSON_CODEC)
@@ -0,0 +1,110 @@
+"""
+Logging setup shared by the server, the cluster supervisor and the clients.
+
+configure() sends every log record through a queue to a background listener
+thread, which formats it and writes it out, so code on the event loop only
+pays for creating the record. Hot-path log calls pass %-style arguments
+instead of f-strings, so messages are only formatted (by the listener) for
+records that are actually emitted.
+
+Levels can be set per subsystem (logger name), and busy per-message loggers
+can be sampled to keep one record in N. Both can also be set through the
+environment:
+    CRAZY8_LOG_LEVEL=INFO
+    CRAZY8_LOG_LEVELS=server.messages=WARNING,server.spectators=DEBUG
+    CRAZY8_LOG_SAMPLE=server.messages=100
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener = None
+_sampled = []  # (logger, SampleFilter) pairs installed by configure()
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+       Records stay in this process, so they don't need to be made picklable first.
+    """
+    def prepare(self, record):
+        return record
+
+class SampleFilter(logging.Filter):
+    """Let one record in every `every` through. Warnings and errors always pass."""
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, int(every))
+        self.count = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        passed = self.count % self.every == 0
+        self.count += 1
+        return passed
+
+def _parse_settings(text):
+    """Parse 'name=value,name=value' into a dict."""
+    settings = {}
+    for item in (text or "").split(","):
+        name, sep, value = item.partition("=")
+        if sep and name.strip() and value.strip():
+            settings[name.strip()] = value.strip()
+    return settings
+
+def configure(level=None, levels=None, sample=None, filename=None, stream=None):
+    """Route this process's logging through a background writer thread.
+       level: root level (default CRAZY8_LOG_LEVEL or INFO).
+       levels: {logger name: level} overrides, on top of CRAZY8_LOG_LEVELS.
+       sample: {logger name: N} to keep one record in N, on top of CRAZY8_LOG_SAMPLE.
+       filename/stream: where to write (default stderr).
+       Calling it again replaces the previous setup.
+    """
+    global _listener
+    shutdown()
+
+    level = level or os.environ.get("CRAZY8_LOG_LEVEL", "INFO")
+    levels = {**_parse_settings(os.environ.get("CRAZY8_LOG_LEVELS")), **(levels or {})}
+    sample = {**_parse_settings(os.environ.get("CRAZY8_LOG_SAMPLE")), **(sample or {})}
+
+    if filename:
+        handler = logging.FileHandler(filename, mode='w')
+    else:
+        handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(_LazyQueueHandler(log_queue))
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    for name, name_level in levels.items():
+        logging.getLogger(name).setLevel(name_level.upper() if isinstance(name_level, str) else name_level)
+    for name, every in sample.items():
+        sampled_logger = logging.getLogger(name)
+        sample_filter = SampleFilter(every)
+        sampled_logger.addFilter(sample_filter)
+        _sampled.append((sampled_logger, sample_filter))
+
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+
+def shutdown():
+    """Write out any queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    while _sampled:
+        sampled_logger, sample_filter = _sampled.pop()
+        sampled_logger.removeFilter(sample_filter)
+
+atexit.register(shutdown)
@@ -21,10 +21,32 @@ GAME_OVER = "game_over"
 LIST_PLAYERS = "list_players" # Client request for the list
 UPDATE_GAME_STATE = "update_game_state" # Server sends general game state update
 CHAT_MESSAGE = "chat_message" # Client sends a chat message
+STATE_DELTA = "state_delta" # Server broadcasts changed public state fields, tagged with the state version
+REQUEST_SNAPSHOT = "request_snapshot" # Client asks for the full state (e.g., after missing a version)
+SNAPSHOT = "snapshot" # Server sends the full public state (plus the recipient's hand) at a version
+BATCH = "batch" # Server sends several messages from one game action in a single frame
+
+# Limits on client-supplied strings, in characters (well within the binary encoding's u16 string lengths)
+MAX_USERNAME_LENGTH = 32
+MAX_TABLE_LENGTH = 64
+MAX_CHAT_LENGTH = 500
+
+def text_error(name, value, max_length, required=True):
+    """Why a client-supplied string field is invalid (missing, not a string or too long), or None."""
+    if value is None or value == "":
+        return f"{name} is required." if required else None
+    if not isinstance(value, str):
+        return f"{name} must be a string."
+    if len(value) > max_length:
+        return f"{name} is too long (at most {max_length} characters)."
+    return None
 
 # Helper functions to create messages
-def create_join_message(username):
-    return {"action": JOIN, "username": username}
+def create_join_message(username, table=None):
+    message = {"action": JOIN, "username": username}
+    if table:
+        message["table"] = table # Table (room) id; server uses its default table if omitted
+    return message
 
 def create_player_joined_message(player, player_count):
     return {"action": PLAYER_JOINED, "player": player, "playerCount": player_count}
@@ -130,4 +152,34 @@ def create_update_game_state_message(current_turn, top_card, current_suit, hand=
 
 def create_chat_message(sender, message): #Here we define the chat message for our game
     """Client sends a chat message."""
-    return {"action": CHAT_MESSAGE, "sender": sender, "message": message}
\ No newline at end of file
+    return {"action": CHAT_MESSAGE, "sender": sender, "message": message}
+
+def create_state_delta_message(version, changes, move=None):
+    """Server broadcasts the public state fields that changed to reach `version`.
+
+    Clients apply a delta only on top of version - 1 and request a snapshot
+    when they detect a gap.
+    """
+    message = {
+        "action": STATE_DELTA,
+        "version": version,
+        "changes": changes # Dict of changed fields, e.g., {"topCard": '7H', "currentTurn": 'bob'}
+    }
+    if move:
+        message["move"] = move # Move that caused the change: {"player", "card", optional "declaredSuit"}
+    return message
+
+def create_request_snapshot_message():
+    """Client requests the full game state."""
+    return {"action": REQUEST_SNAPSHOT}
+
+def create_snapshot_message(version, state, hand=None):
+    """Server sends the full public state at `version`, optionally with the recipient's hand."""
+    state = dict(state)
+    if hand is not None:
+        state["hand"] = hand
+    return {"action": SNAPSHOT, "version": version, "state": state}
+
+def create_batch_message(messages):
+    """Server combines the messages produced by one game action into one frame."""
+    return {"action": BATCH, "messages": messages}
@@ -0,0 +1,93 @@
+"""
+Per-table actors.
+
+Each table's game is only ever changed by its TableActor: one task that takes
+commands (join, action, leave) off the table's queue and applies them one at a
+time, including everything a command sends. Connection handlers submit
+commands and wait for them to be applied, so every table sees a single,
+consistent order of events while different tables progress independently.
+The actor also keeps the table's queue depth and timing counters.
+"""
+import asyncio
+
+class TableActor:
+    def __init__(self, table_id, on_idle=None):
+        self.table_id = table_id
+        self.queue = asyncio.Queue()  # (command, args, label, future, time queued)
+        self.on_idle = on_idle  # Called with the actor when its queue drains; returns True to stop it
+        self.task = None
+        self.current = None  # Label of the command being applied, for the loop watchdog
+        self.processed = 0
+        self.total_wait = 0.0  # Seconds commands spent queued
+        self.max_wait = 0.0
+        self.total_run = 0.0  # Seconds spent applying commands
+        self.max_run = 0.0
+
+    def submit(self, command, *args, label=None):
+        """Queue command(*args) to run on the actor. Returns a future for its result.
+           label names the command in diagnostics (defaults to the command's name).
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if self.task is not None and self.task.done():
+            future.cancel()  # The actor was cancelled (server shutdown)
+            return future
+        self.queue.put_nowait((command, args, label or command.__name__, future, loop.time()))
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+        return future
+
+    async def _run(self):
+        """Apply queued commands in order until the actor is retired."""
+        try:
+            await self._apply_commands()
+        finally:
+            # Don't leave submitters waiting on an actor that is gone
+            while not self.queue.empty():
+                future = self.queue.get_nowait()[3]
+                future.cancel()
+
+    async def _apply_commands(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            command, args, label, future, queued_at = await self.queue.get()
+            started = loop.time()
+            self.current = label
+            try:
+                result = command(*args)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self.current = None
+            finished = loop.time()
+
+            self.processed += 1
+            self.total_wait += started - queued_at
+            self.max_wait = max(self.max_wait, started - queued_at)
+            self.total_run += finished - started
+            self.max_run = max(self.max_run, finished - started)
+
+            if self.queue.empty() and self.on_idle and self.on_idle(self):
+                return
+            # Give other tables' actors and connections a turn between commands
+            await asyncio.sleep(0)
+
+    def queue_depth(self):
+        """Number of commands waiting to be applied."""
+        return self.queue.qsize()
+
+    def stats(self):
+        """Counters for the web UI and monitoring."""
+        processed = self.processed or 1
+        return {
+            'queue_depth': self.queue.qsize(),
+            'processed': self.processed,
+            'avg_wait_ms': round(self.total_wait / processed * 1000, 3),
+            'max_wait_ms': round(self.max_wait * 1000, 3),
+            'avg_run_ms': round(self.total_run / processed * 1000, 3),
+            'max_run_ms': round(self.max_run * 1000, 3),
+        }
@@ -0,0 +1,320 @@
+"""
+Vectorised batch simulator for Crazy Eights rules analysis.
+
+Holds a batch of games as NumPy arrays (deck and discard pile orders, hand
+bitmasks, top card, declared suit, seat to act) and advances every unfinished
+game by one action per step, with the legality checks and the policy applied
+to the whole batch at once. The rules are the ones in Game: the same deal and
+starting card, 8s wild with a declared suit, drawing until you can play,
+reshuffling the discard pile into an empty deck, and blocked games won by the
+lowest hand value.
+
+simulate() can also record the first few games (their shuffles and actions)
+and verify_against_game() replays them through server.game.Game, checking
+every action and the final result, so the simulator stays faithful to the
+server's rules.
+
+    python -m server.batchsim --games 1000000 --players 4 --policy random --verify 200
+"""
+import argparse
+import time
+import numpy as np
+from .card import CARDS, NUM_CARDS, VALUES, VALUE_INDEX, CARD_POINTS, SUITS
+from .rules import LEGAL_MASKS
+from .game import Game
+
+NUM_VALUES = len(VALUES)
+NUM_SUITS = len(SUITS)
+EIGHT = VALUE_INDEX['8']
+DRAW = -1  # Action code for drawing; other codes are card id * 4 + declared suit (0 unless an 8)
+
+_ONE = np.uint64(1)
+_LEGAL = np.array(LEGAL_MASKS, dtype=np.uint64)  # [top card, suit index] -> playable card mask
+_CARD_SUIT = np.arange(NUM_CARDS) // NUM_VALUES
+_IS_EIGHT = np.arange(NUM_CARDS) % NUM_VALUES == EIGHT
+
+# Hands are handled one suit at a time: bits 13*s .. 13*s+12 of a mask are suit s,
+# and these tables answer questions about every possible 13-bit suit chunk.
+_SUIT_SHIFTS = np.arange(NUM_SUITS, dtype=np.uint64) * np.uint64(NUM_VALUES)
+_CHUNK_MASK = np.uint64((1 << NUM_VALUES) - 1)
+_CHUNK_BITS = (np.arange(1 << NUM_VALUES)[:, None] >> np.arange(NUM_VALUES)) & 1
+_POPCOUNT = _CHUNK_BITS.sum(axis=1)
+_CHUNK_POINTS = _CHUNK_BITS @ np.array(CARD_POINTS[:NUM_VALUES])  # Points are the same in every suit
+# _NTH_BIT[chunk, k]: value index of the chunk's k-th card (lowest first)
+_NTH_BIT = np.argmax(np.cumsum(_CHUNK_BITS, axis=1)[:, None, :] > np.arange(NUM_VALUES)[None, :, None], axis=2)
+# The greedy policy's favourite card in a chunk: highest points first, 8s last
+_GREEDY_RANK = np.where(np.arange(NUM_VALUES) == EIGHT, 1, np.array(CARD_POINTS[:NUM_VALUES]) + 2)
+_CHUNK_BEST = np.argmax(_CHUNK_BITS * _GREEDY_RANK, axis=1)
+_CHUNK_BEST_RANK = (_CHUNK_BITS * _GREEDY_RANK).max(axis=1)
+
+def _suit_chunks(masks):
+    """Split card masks (any shape) into their suits' 13-bit chunks: shape (..., 4)."""
+    return ((masks[..., None] >> _SUIT_SHIFTS) & _CHUNK_MASK).astype(np.int64)
+
+def hand_points(hands):
+    """Point totals of hand masks (any shape)."""
+    return _CHUNK_POINTS[_suit_chunks(hands)].sum(axis=-1)
+
+def _random_policy(playable, hands, rng):
+    """Pick a uniformly random playable card and a random suit to declare for an 8."""
+    rows = np.arange(len(playable))
+    chunks = _suit_chunks(playable)
+    counts = _POPCOUNT[chunks]
+    totals = np.cumsum(counts, axis=1)
+    pick = (rng.random(len(playable)) * totals[:, -1]).astype(np.int64)
+    suits = np.argmax(totals > pick[:, None], axis=1)
+    nth = pick - totals[rows, suits] + counts[rows, suits]
+    cards = suits * NUM_VALUES + _NTH_BIT[chunks[rows, suits], nth]
+    return cards, rng.integers(0, NUM_SUITS, len(playable))
+
+def _greedy_policy(playable, hands, rng):
+    """Shed the highest-value playable card, keeping 8s for last; an 8 declares the suit held most."""
+    rows = np.arange(len(playable))
+    chunks = _suit_chunks(playable)
+    suits = np.argmax(_CHUNK_BEST_RANK[chunks], axis=1)
+    cards = suits * NUM_VALUES + _CHUNK_BEST[chunks[rows, suits]]
+    return cards, np.argmax(_POPCOUNT[_suit_chunks(hands)], axis=1)
+
+POLICIES = {'random': _random_policy, 'greedy': _greedy_policy}
+
+class BatchResult:
+    """Outcome of a batch: per-game arrays, plus the recorded games if any."""
+    def __init__(self, num_players, winner, blocked, over, scores, actions, records):
+        self.num_players = num_players
+        self.winner = winner  # Seat that went out, or -1 for a blocked (or unfinished) game
+        self.blocked = blocked
+        self.over = over  # Whether the game finished (went out or blocked) within max_actions
+        self.scores = scores  # (games, players) points left in hand
+        self.actions = actions  # Actions taken per game
+        self.records = records  # Recorded games, for verify_against_game()
+
+    def win_shares(self):
+        """(games, players) share of each game's win: 1 for the player who went out,
+           split between everyone tied on the lowest score in a blocked game.
+           Games cut off at max_actions have no winner: their shares are all 0.
+        """
+        shares = np.zeros(self.scores.shape)
+        finished = self.winner >= 0
+        shares[np.nonzero(finished)[0], self.winner[finished]] = 1.0
+        lowest = self.scores == self.scores.min(axis=1, keepdims=True)
+        tied = lowest & self.blocked[:, None]
+        shares += tied / np.maximum(tied.sum(axis=1, keepdims=True), 1)
+        return shares
+
+def simulate(num_games, num_players, policy='random', seed=None, record=0, max_actions=2000):
+    """Play num_games games of num_players with one policy for every seat.
+       record: how many of the first games to record for verify_against_game().
+    """
+    if num_players < 2:
+        raise ValueError("Need at least 2 players to start")
+    rng = np.random.default_rng(seed)
+    choose = POLICIES[policy]
+    games = np.arange(num_games)
+    deal = 7 if num_players == 2 else 5
+
+    # Deck: cards are dealt from the end (index deck_len - 1), as Deck.deal does
+    deck = np.argsort(rng.random((num_games, NUM_CARDS)), axis=1).astype(np.int8)
+    records = [{'shuffles': [deck[g].tolist()], 'inserts': [], 'actions': []} for g in range(min(record, num_games))]
+    deck_len = np.full(num_games, NUM_CARDS, dtype=np.int64)
+    hands = np.zeros((num_games, num_players), dtype=np.uint64)
+    for seat in range(num_players):
+        for _ in range(deal):
+            deck_len -= 1
+            hands[:, seat] |= _ONE << deck[games, deck_len].astype(np.uint64)
+
+    # Turn up the first card; an 8 goes back into the deck at a random position
+    discard = np.zeros((num_games, NUM_CARDS), dtype=np.int8)
+    top = np.empty(num_games, dtype=np.int64)
+    pending = games
+    while len(pending):
+        deck_len[pending] -= 1
+        cards = deck[pending, deck_len[pending]].astype(np.int64)
+        eights = _IS_EIGHT[cards]
+        for g, card in zip(pending[eights], cards[eights]):
+            position = int(rng.integers(0, deck_len[g] + 1))
+            row = deck[g, :deck_len[g]].tolist()
+            row.insert(position, card)
+            deck[g, :deck_len[g] + 1] = row
+            deck_len[g] += 1
+            if g < len(records):
+                records[g]['inserts'].append(position)
+        top[pending[~eights]] = cards[~eights]
+        pending = pending[eights]
+    discard[:, 0] = top
+    discard_len = np.ones(num_games, dtype=np.int64)
+    current_suit = _CARD_SUIT[top].astype(np.int64)  # Game starts with the top card's suit "declared"
+
+    turn = np.zeros(num_games, dtype=np.int64)
+    over = np.zeros(num_games, dtype=bool)
+    winner = np.full(num_games, -1, dtype=np.int64)
+    blocked = np.zeros(num_games, dtype=bool)
+    actions = np.zeros(num_games, dtype=np.int64)
+
+    active = games
+    while len(active):
+        seats = turn[active]
+        suit_to_match = np.where(current_suit[active] >= 0, current_suit[active], _CARD_SUIT[top[active]])
+        legal = _LEGAL[top[active], suit_to_match]
+        hand = hands[active, seats]
+        playable = hand & legal
+        plays = playable != 0
+        actions[active] += 1
+
+        # Players holding a legal card play one
+        movers = active[plays]
+        if len(movers):
+            cards, suits = choose(playable[plays], hand[plays], rng)
+            mover_seats = seats[plays]
+            hands[movers, mover_seats] ^= _ONE << cards.astype(np.uint64)
+            discard[movers, discard_len[movers]] = cards
+            discard_len[movers] += 1
+            top[movers] = cards
+            current_suit[movers] = np.where(_IS_EIGHT[cards], suits, -1)
+            out = hands[movers, mover_seats] == 0
+            over[movers[out]] = True
+            winner[movers[out]] = mover_seats[out]
+            turn[movers[~out]] = (mover_seats[~out] + 1) % num_players
+            recorded = movers < len(records)
+            for g, card, suit in zip(movers[recorded], cards[recorded], suits[recorded]):
+                records[g]['actions'].append(int(card) * NUM_SUITS + (int(suit) if _IS_EIGHT[card] else 0))
+
+        # Everyone else draws (the turn stays with them)
+        drawers = active[~plays]
+        for g in drawers[drawers < len(records)]:
+            records[g]['actions'].append(DRAW)
+        empty = drawers[deck_len[drawers] == 0]
+        refill = empty[discard_len[empty] > 1]
+        stuck = empty[discard_len[empty] <= 1]
+        if len(refill):
+            # Reshuffle everything under the top card back into the deck
+            under = discard_len[refill] - 1
+            keys = rng.random((len(refill), NUM_CARDS))
+            keys[np.arange(NUM_CARDS) >= under[:, None]] = 2.0  # Sort the top card and unused slots last
+            deck[refill] = np.take_along_axis(discard[refill], np.argsort(keys, axis=1), axis=1)
+            deck_len[refill] = under
+            discard[refill, 0] = top[refill]
+            discard_len[refill] = 1
+            for g in refill[refill < len(records)]:
+                records[g]['shuffles'].append(deck[g, :deck_len[g]].tolist())
+        for g in stuck:
+            # Nothing to draw: the game is blocked if nobody can play, otherwise the turn passes
+            if not (hands[g] & legal[np.searchsorted(active, g)]).any():
+                over[g] = True
+                blocked[g] = True
+            else:
+                turn[g] = (turn[g] + 1) % num_players
+        drawing = drawers[deck_len[drawers] > 0]
+        deck_len[drawing] -= 1
+        hands[drawing, turn[drawing]] |= _ONE << deck[drawing, deck_len[drawing]].astype(np.uint64)
+
+        active = active[~over[active] & (actions[active] < max_actions)]
+
+    return BatchResult(num_players, winner, blocked, over, hand_points(hands), actions, records)
+
+class _ScriptedRandom:
+    """Stands in for a Game's RNG, replaying the shuffles and insert positions a simulated game used."""
+    def __init__(self, record):
+        self.shuffles = list(record['shuffles'])
+        self.inserts = list(record['inserts'])
+        self.order_shuffled = False
+
+    def shuffle(self, items):
+        if items and isinstance(items[0], str):
+            if self.order_shuffled:
+                raise AssertionError("Turn order shuffled twice")
+            self.order_shuffled = True  # Seats are already in turn order
+            items.sort(key=lambda username: int(username[1:]))
+            return
+        order = self.shuffles.pop(0)
+        if sorted(card.id for card in items) != sorted(order):
+            raise AssertionError("Simulated reshuffle has different cards than the game")
+        items[:] = [CARDS[card] for card in order]
+
+    def randint(self, low, high):
+        position = self.inserts.pop(0)
+        if not low <= position <= high:
+            raise AssertionError(f"Simulated insert position {position} outside {low}..{high}")
+        return position
+
+def verify_against_game(result):
+    """Replay every recorded game through server.game.Game and check that each action
+       is accepted and that the winner, blocked flag and scores match.
+       Returns the number of games checked; raises AssertionError on a mismatch.
+    """
+    for g, record in enumerate(result.records):
+        game = Game(rng=_ScriptedRandom(record))
+        names = [f"p{seat}" for seat in range(result.num_players)]
+        for name in names:
+            game.add_player(name, None)
+        success, error = game.start_game()
+        assert success, f"game {g}: start failed: {error}"
+        for number, action in enumerate(record['actions']):
+            player = game.get_current_player()
+            if action == DRAW:
+                success, error, data = game.draw_card(player)
+            else:
+                card, suit = CARDS[action // NUM_SUITS], SUITS[action % NUM_SUITS]
+                success, error, data = game.make_move(player, str(card), suit.value if card.value == '8' else None)
+            assert success, f"game {g}: action {number} ({action}) rejected: {error}"
+        if game.started:
+            assert result.winner[g] == -1 and not result.blocked[g], f"game {g}: simulated game ended, Game didn't"
+            continue
+        over = game.game_over_data
+        assert over['blocked'] == bool(result.blocked[g]), f"game {g}: blocked {over['blocked']} != {result.blocked[g]}"
+        assert [over['scores'][name] for name in names] == result.scores[g].tolist(), f"game {g}: scores differ"
+        if not over['blocked']:
+            assert over['winner'] == names[result.winner[g]], f"game {g}: winner {over['winner']} != p{result.winner[g]}"
+    return len(result.records)
+
+def main():
+    """Simulate a large number of games and report rule statistics."""
+    parser = argparse.ArgumentParser(description="Batch-simulate Crazy Eights games with NumPy.")
+    parser.add_argument("--games", type=int, default=1000000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="random")
+    parser.add_argument("--batch", type=int, default=100000, help="games simulated at once")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verify", type=int, default=100, help="games to replay through Game as a check")
+    parser.add_argument("--max-actions", type=int, default=2000, help="actions after which a game is cut off unfinished")
+    args = parser.parse_args()
+
+    seeds = np.random.SeedSequence(args.seed).spawn((args.games + args.batch - 1) // args.batch)
+    shares = np.zeros(args.players)
+    blocked = 0
+    unfinished = 0  # Cut off at max_actions; left out of the win rates and scores
+    total_actions = 0
+    winner_scores = []
+    loser_scores = []
+    verified = 0
+    started = time.perf_counter()
+    for i, seed in enumerate(seeds):
+        size = min(args.batch, args.games - i * args.batch)
+        result = simulate(size, args.players, args.policy, seed, record=args.verify if i == 0 else 0,
+                          max_actions=args.max_actions)
+        if i == 0:
+            check_started = time.perf_counter()
+            verified = verify_against_game(result)
+            started += time.perf_counter() - check_started  # Don't count the check in the throughput
+        win_shares = result.win_shares()
+        shares += win_shares.sum(axis=0)
+        blocked += int(result.blocked.sum())
+        unfinished += int((~result.over).sum())
+        total_actions += int(result.actions.sum())
+        winner_scores.append(result.scores[win_shares > 0])
+        loser_scores.append(result.scores[(win_shares == 0) & result.over[:, None]])
+    elapsed = time.perf_counter() - started
+
+    finished = max(args.games - unfinished, 1)
+    losers = np.concatenate(loser_scores)
+    print(f"{args.games} games ({args.players} players, {args.policy} policy) in {elapsed:.2f}s: "
+          f"{args.games / elapsed:,.0f} games/s, {total_actions / elapsed:,.0f} actions/s")
+    print(f"Verified {verified} games against Game")
+    print(f"Unfinished games (cut off, left out below): {unfinished}")
+    print(f"Blocked games: {blocked / finished:.3%}, average length {total_actions / args.games:.1f} actions")
+    print("Win rate by seat: " + ", ".join(f"{seat}: {share / finished:.2%}" for seat, share in enumerate(shares)))
+    print(f"Points left by losers: mean {losers.mean():.1f}, "
+          + ", ".join(f"p{p} {np.percentile(losers, p):.0f}" for p in (50, 90, 99)))
+    print(f"Points left by winners: mean {np.concatenate(winner_scores).mean():.2f} (non-zero only in blocked games)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Server-side bot players.
+
+Bots sit at tables like players but have no socket: they are seated to fill a
+table up to a number of seats when a game is started, and can take over the
+seat (and hand) of a player who disconnects mid-round so the round goes on.
+A bot acts through GameServer.handle_action on the table's actor with the same
+MOVE (with declaredSuit) and DRAW_CARD messages a client sends, so its moves
+are checked, applied and broadcast exactly like everyone else's.
+
+Bots choose moves with server.search in a process pool, within a per-move
+time budget, so searching never blocks the event loop serving other tables.
+With no time budget, or if the pool fails or runs late, a bot plays the greedy
+policy instead.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import random
+import time
+from common.codec import JSON_CODEC
+import common.protocol as protocol
+from .card import CARD_STRINGS, SUITS
+from .connection import DetachedConnection
+from .engine import PLAY, NO_SUIT
+from . import search
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEARCH_TIME = 0.25  # Seconds of search per move
+POOL_GRACE = 1.0  # Extra seconds to wait for a search before falling back to the greedy policy
+BOT_NAME = "Bot {}"
+
+def settings_from_env(environ=os.environ):
+    """GameServer bot keyword arguments from CRAZY8_BOT_SEATS, CRAZY8_BOT_REPLACE,
+       CRAZY8_BOT_SEARCH_TIME and CRAZY8_BOT_WORKERS.
+    """
+    settings = {}
+    if environ.get("CRAZY8_BOT_SEATS"):
+        settings['bot_seats'] = int(environ["CRAZY8_BOT_SEATS"])
+    if environ.get("CRAZY8_BOT_REPLACE"):
+        settings['bot_replace'] = environ["CRAZY8_BOT_REPLACE"].lower() in ("1", "true", "yes", "on")
+    if environ.get("CRAZY8_BOT_SEARCH_TIME"):
+        settings['bot_search_time'] = float(environ["CRAZY8_BOT_SEARCH_TIME"])
+    if environ.get("CRAZY8_BOT_WORKERS"):
+        settings['bot_workers'] = int(environ["CRAZY8_BOT_WORKERS"])
+    return settings
+
+class Bot:
+    """A bot's seat. Has the attributes of a server Client, so it can submit actions like one."""
+    def __init__(self, username, table_id):
+        self.id = id(self)  # Bound in the TableManager like a connection id
+        self.websocket = None
+        self.connection = DetachedConnection()  # Nothing to send to
+        self.codec = JSON_CODEC
+        self.username = username
+        self.table_id = table_id
+        self.task = None  # Playing the bot's turn, while it has one
+
+def to_message(action):
+    """Protocol message for an engine action."""
+    if action[0] == PLAY:
+        card, suit = action[1], action[2]
+        return protocol.create_move_message(CARD_STRINGS[card], SUITS[suit].value if suit != NO_SUIT else None)
+    return protocol.create_draw_card_message()
+
+class BotManager:
+    def __init__(self, game_server, seats=0, replace=False, search_time=DEFAULT_SEARCH_TIME, workers=None, seed=None):
+        self.game_server = game_server
+        self.seats = seats  # Fill tables up to this many players when a game starts (0: never)
+        self.replace = replace  # Let a bot play out the round for a player who disconnects
+        self.search_time = search_time  # Seconds of search per move; 0 plays the greedy policy
+        self.workers = workers or os.cpu_count() or 1
+        self.rng = random.Random(seed)
+        self.pool = None  # Created on the first search
+        self.bots = {}  # (table_id, username) -> Bot
+        self.searching = 0  # Searches submitted to the pool and not yet finished
+        self.decisions = 0
+        self.fallbacks = 0  # Searches that failed or ran late; the greedy policy moved instead
+        self.iterations = 0  # Search iterations run, over all searches
+        self.busy_seconds = 0.0  # Worker time spent searching
+        self.started = time.perf_counter()
+        self.closed = False  # Set on shutdown: no more turns are played or searched
+        game_server.tables.add_listener(self._on_table_event)
+
+    def is_bot(self, game, username):
+        player = game.players.get(username)
+        return player is not None and player.is_bot
+
+    def has_humans(self, game, besides=None):
+        """Whether anyone but bots (and besides) is seated or watching."""
+        return bool(game.spectators) or any(
+            not player.is_bot for username, player in game.players.items() if username != besides
+        )
+
+    def _seat(self, table_id, game, username):
+        bot = Bot(username, table_id)
+        player = game.players[username]
+        player.connection = bot.connection
+        player.websocket = None
+        player.is_connected = False  # Nothing is encoded or sent for the bot
+        player.is_bot = True
+        self.bots[(table_id, username)] = bot
+        self.game_server.tables.bind(bot.id, table_id)
+        return bot
+
+    def fill_seats(self, table_id, game):
+        """Seat bots until the table has self.seats players. Returns the bots' usernames."""
+        added = []
+        number = 1
+        while len(game.players) < self.seats:
+            username = BOT_NAME.format(number)
+            number += 1
+            if game.add_player(username, None):
+                self._seat(table_id, game, username)
+                added.append(username)
+        if added:
+            logger.info("Seated bots at table %s: %s", table_id, added)
+        return added
+
+    def take_over(self, table_id, game, username):
+        """Hand a disconnected player's seat and hand to a bot for the rest of the round."""
+        self._seat(table_id, game, username)
+        logger.info("A bot took over %s's seat at table %s", username, table_id)
+        self._on_table_event(table_id, "bot_seated")
+
+    def dismiss(self, table_id, game):
+        """Remove a table's bots (once no human is left). Returns their usernames."""
+        leaving = [bot for bot in self.bots.values() if bot.table_id == table_id]
+        for bot in leaving:
+            del self.bots[(table_id, bot.username)]
+            if bot.task is not None:
+                bot.task.cancel()
+        for bot in leaving:
+            game.remove_player(bot.username)
+            self.game_server.tables.unbind(bot.id)
+        return [bot.username for bot in leaving]
+
+    def _on_table_event(self, table_id, event):
+        """Table listener: start a bot's turn when play reaches it."""
+        game = self.game_server.tables.get(table_id)
+        if self.closed or game is None or not game.started:
+            return
+        username = game.get_current_player()
+        if not self.is_bot(game, username):
+            return
+        bot = self.bots.get((table_id, username))
+        if bot is not None and (bot.task is None or bot.task.done()):
+            bot.task = asyncio.get_running_loop().create_task(self._play_turn(bot))
+
+    async def _play_turn(self, bot):
+        """Act for the bot until play moves on (drawing keeps the turn)."""
+        try:
+            while True:
+                game = self.game_server.tables.get(bot.table_id)
+                if game is None or not game.started or game.get_current_player() != bot.username:
+                    return
+                version = game.version
+                message = to_message(await self.decide(search.observe(game, bot.username)))
+                await self.game_server.run_on_table(
+                    bot.table_id, self.game_server.handle_action, bot, message, label=f"bot {message['action']}"
+                )
+                if game.version == version and game.started and game.get_current_player() == bot.username:
+                    # Rejected (the table changed while the bot was thinking); drawing is always allowed
+                    await self.game_server.run_on_table(
+                        bot.table_id, self.game_server.handle_action, bot, protocol.create_draw_card_message(),
+                        label=f"bot {protocol.DRAW_CARD}"
+                    )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Bot %s at table %s failed: %s", bot.username, bot.table_id, e, exc_info=True)
+
+    async def decide(self, observation):
+        """Choose an engine action for an observation, searching in the pool if there is time."""
+        started = time.perf_counter()
+        self.decisions += 1
+        kind = "greedy"
+        action = None
+        candidates = search.candidate_actions(search.determinize(observation, self.rng))
+        if len(candidates) == 1:
+            action, kind = candidates[0], "forced"  # Nothing to search
+        elif self.search_time > 0:
+            loop = asyncio.get_running_loop()
+            self.searching += 1
+            try:
+                future = loop.run_in_executor(self._get_pool(), search.timed_search,
+                                              observation, self.search_time, self.rng.getrandbits(64))
+                action, iterations, seconds = await asyncio.wait_for(future, self.search_time + POOL_GRACE)
+                self.iterations += iterations
+                self.busy_seconds += seconds
+                kind = "search"
+            except asyncio.TimeoutError:
+                logger.warning("Bot search took over %.2fs; playing greedily", self.search_time + POOL_GRACE)
+                self.fallbacks += 1
+            except concurrent.futures.BrokenExecutor as e:
+                logger.error("Bot search pool failed: %s; restarting it", e)
+                self.fallbacks += 1
+                self.pool.shutdown(wait=False)
+                self.pool = None
+            except Exception as e:
+                logger.error("Bot search failed: %s", e, exc_info=True)
+                self.fallbacks += 1
+            finally:
+                self.searching -= 1
+        if action is None:
+            state = search.determinize(observation, self.rng)
+            action = search.greedy_policy(state)
+        self.game_server.metrics.bot_decision_seconds.observe(time.perf_counter() - started, kind)
+        return action
+
+    def _get_pool(self):
+        if self.pool is None:
+            # Spawned rather than forked: the server has other threads (logging, the loop watchdog)
+            self.pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self.pool
+
+    def utilization(self):
+        """Share of the pool's worker time spent searching since the manager started."""
+        elapsed = time.perf_counter() - self.started
+        return self.busy_seconds / (elapsed * self.workers) if elapsed > 0 else 0.0
+
+    def close(self):
+        """Stop the bots and the search pool."""
+        self.closed = True
+        for bot in self.bots.values():
+            if bot.task is not None:
+                bot.task.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def stats(self):
+        """Counters for the web UI and monitoring."""
+        return {
+            'bots': len(self.bots),
+            'seats': self.seats,
+            'replace_disconnected': self.replace,
+            'search_time': self.search_time,
+            'workers': self.workers,
+            'searching': self.searching,
+            'decisions': self.decisions,
+            'fallbacks': self.fallbacks,
+            'iterations': self.iterations,
+            'pool_utilization': round(self.utilization(), 4),
+        }
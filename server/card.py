@@ -1,5 +1,9 @@
 """
 Card and deck implementation for the card game.
+
+Cards are encoded as small ints (0-51, suit-major in Suit order). Every Card is
+one of 52 shared, immutable objects in CARDS, so dealing, parsing and printing
+cards never allocate; string, points, value and suit lookups are precomputed.
 """
 import random
 from enum import Enum
@@ -10,90 +14,125 @@ class Suit(Enum):
     CLUBS = "clubs"
     SPADES = "spades"
 
+SUITS = tuple(Suit) # Suit order used by the int encoding
+VALUES = ('2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A') # Keep '10' internally
+NUM_CARDS = len(SUITS) * len(VALUES)
+
+SUIT_INDEX = {suit: i for i, suit in enumerate(SUITS)}
+VALUE_INDEX = {value: i for i, value in enumerate(VALUES)}
+SUIT_CHARS = {Suit.HEARTS: 'H', Suit.DIAMONDS: 'D', Suit.CLUBS: 'C', Suit.SPADES: 'S'}
+SUITS_BY_NAME = {suit.value: suit for suit in SUITS} # e.g. 'hearts' -> Suit.HEARTS
+
+def _value_points(value):
+    """Point value of a card value for Crazy Eights scoring."""
+    if value == '8':
+        return 50
+    elif value in ['K', 'Q', 'J', '10']:
+        return 10
+    elif value == 'A':
+        return 1
+    return int(value) # 2 through 9
+
+# Per-card lookup tables, indexed by card id
+CARD_VALUES = tuple(value for suit in SUITS for value in VALUES)
+CARD_SUITS = tuple(suit for suit in SUITS for value in VALUES)
+CARD_POINTS = tuple(_value_points(value) for value in CARD_VALUES)
+# Use more standard representation like 'KH' (King of Hearts) or 'TS' (10 of Spades)
+CARD_STRINGS = tuple(
+    ('T' if value == '10' else value) + SUIT_CHARS[suit]
+    for value, suit in zip(CARD_VALUES, CARD_SUITS)
+)
+
+# Bitmasks over card ids (bit i set = card id i), for hand sets
+SUIT_MASKS = {suit: sum(1 << i for i in range(NUM_CARDS) if CARD_SUITS[i] is suit) for suit in SUITS}
+VALUE_MASKS = {value: sum(1 << i for i in range(NUM_CARDS) if CARD_VALUES[i] == value) for value in VALUES}
+
+def card_id(value, suit):
+    """Encode a value string and Suit as a card id (0-51)."""
+    return SUIT_INDEX[suit] * len(VALUES) + VALUE_INDEX[value]
+
 class Card:
-    def __init__(self, value, suit):
-        self.value = value # Keep value as string ('2', 'K', 'A', etc.)
-        self.suit = suit # Suit enum
+    """An immutable playing card. Use the shared instances rather than copies:
+       Card(value, suit) returns the pooled object for that card.
+    """
+    __slots__ = ('id', 'value', 'suit')
+
+    def __new__(cls, value, suit):
+        return CARDS[card_id(value, suit)]
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Card objects are immutable")
+
+    def __reduce__(self):
+        # Unpickle to the pooled instance so identity comparisons keep working
+        return card_from_id, (self.id,)
 
     def __str__(self):
-        # Use more standard representation like 'KH' (King of Hearts) or '8S' (8 of Spades)
-        value_map = {'10': 'T', 'J': 'J', 'Q': 'Q', 'K': 'K', 'A': 'A'}
-        display_value = value_map.get(self.value, self.value) # Use 'T' for 10, others as is
-        suit_map = {Suit.HEARTS: 'H', Suit.DIAMONDS: 'D', Suit.CLUBS: 'C', Suit.SPADES: 'S'}
-        return f"{display_value}{suit_map[self.suit]}"
+        return CARD_STRINGS[self.id]
+
+    def __repr__(self):
+        return f"Card({CARD_STRINGS[self.id]})"
 
     def to_dict(self):
         # Send the string representation over the network
-        return str(self)
+        return CARD_STRINGS[self.id]
 
     def get_points(self):
         """Get the point value of the card for Crazy Eights scoring."""
-        if self.value == '8':
-            return 50
-        elif self.value in ['K', 'Q', 'J', 'T']: # T represents 10
-            return 10
-        elif self.value == 'A':
-            return 1
-        else:
-            try:
-                return int(self.value) # 2 through 9
-            except ValueError:
-                return 0 # Should not happen with standard deck
+        return CARD_POINTS[self.id]
+
+def _build_card(index):
+    card = object.__new__(Card)
+    object.__setattr__(card, 'id', index)
+    object.__setattr__(card, 'value', CARD_VALUES[index])
+    object.__setattr__(card, 'suit', CARD_SUITS[index])
+    return card
+
+CARDS = tuple(_build_card(i) for i in range(NUM_CARDS)) # The flyweight pool, indexed by card id
+
+# Accept both 'TH' and '10H' spellings of tens
+_CARDS_BY_STR = {CARD_STRINGS[card.id]: card for card in CARDS}
+_CARDS_BY_STR.update({card.value + SUIT_CHARS[card.suit]: card for card in CARDS})
 
 class Deck:
-    def __init__(self):
+    def __init__(self, rng=random):
         self.cards = []
+        self.rng = rng  # Anything with shuffle(); the random module unless a game has its own RNG
         self.reset()
-    
+
     def reset(self):
         """Reset the deck with all 52 cards."""
-        self.cards = []
-        # Use 'T' for 10 internally for consistency with display? Or keep '10'? Let's keep '10' for now.
-        values = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-        for suit in Suit:
-            for value in values:
-                # Ensure suit is the Enum member, not the string
-                self.cards.append(Card(value, suit))
-    
+        self.cards = list(CARDS)
+
     def shuffle(self):
         """Shuffle the deck."""
-        random.shuffle(self.cards)
-    
+        self.rng.shuffle(self.cards)
+
     def deal(self, num_cards=1):
         """Deal a specified number of cards from the deck. Returns a list of Card objects."""
         if num_cards > len(self.cards):
             # If not enough cards, deal remaining ones
             num_cards = len(self.cards)
+        if num_cards <= 0:
+            return []
 
-        dealt_cards = []
-        for _ in range(num_cards):
-            if self.cards: # Check if deck is not empty
-                 dealt_cards.append(self.cards.pop())
-            else:
-                break # Stop if deck runs out
-
+        # Cards come off the end of the list, last card first
+        dealt_cards = self.cards[:-num_cards - 1:-1]
+        del self.cards[-num_cards:]
         return dealt_cards
 
     def is_empty(self):
         """Check if the deck (draw pile) is empty."""
         return len(self.cards) == 0
 
-# Add a function to parse card string back to Card object if needed (maybe in Game class)
+def card_from_id(index):
+    """Return the shared Card object for a card id (0-51)."""
+    return CARDS[index]
+
 def card_from_str(card_str):
-    """Convert a card string like 'KH' or '8S' back to a Card object."""
-    if not card_str or len(card_str) < 2:
+    """Convert a card string like 'KH' or '8S' back to a Card object.
+       Returns None for an invalid card string.
+    """
+    if not isinstance(card_str, str):
         return None
-
-    value_str = card_str[:-1]
-    suit_char = card_str[-1]
-
-    value_map_rev = {'T': '10', 'J': 'J', 'Q': 'Q', 'K': 'K', 'A': 'A'}
-    value = value_map_rev.get(value_str, value_str)
-
-    suit_map_rev = {'H': Suit.HEARTS, 'D': Suit.DIAMONDS, 'C': Suit.CLUBS, 'S': Suit.SPADES}
-    suit = suit_map_rev.get(suit_char)
-
-    if suit is None or value not in ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']:
-        return None # Invalid card string
-
-    return Card(value, suit)
+    return _CARDS_BY_STR.get(card_str)
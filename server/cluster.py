@@ -0,0 +1,199 @@
+"""
+Multi-process sharded server.
+
+A supervisor starts N worker processes, each running its own GameServer (and
+therefore its own event loop and GIL) on a private port. A lightweight front
+acceptor listens on the public port, reads the WebSocket upgrade request to find
+the table named in the URL (e.g. ws://host:8765/?table=t1), picks the worker that
+owns that table with a consistent hash ring, and then relays raw bytes between
+the client and that worker. The acceptor never decodes WebSocket frames or JSON,
+so all game work happens in the workers. A worker only lets a connection join
+the table it was routed by (DEFAULT_TABLE if the URL names none), so a table
+is never split across workers.
+"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import os
+from .table import DEFAULT_TABLE, table_from_path
+from common import logconfig
+
+logger = logging.getLogger(__name__)
+
+MAX_REQUEST_HEAD = 16 * 1024  # Largest upgrade request head the acceptor will buffer
+RELAY_CHUNK_SIZE = 64 * 1024
+
+class HashRing:
+    """Consistent hash ring mapping table ids onto worker nodes."""
+
+    def __init__(self, nodes, replicas=100):
+        self.replicas = replicas
+        self._keys = []  # Sorted hash positions on the ring
+        self._nodes = {}  # Hash position -> node
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+    def add_node(self, node):
+        """Place a node on the ring at `replicas` virtual positions."""
+        for i in range(self.replicas):
+            position = self._hash(f"{node}#{i}")
+            self._nodes[position] = node
+            bisect.insort(self._keys, position)
+
+    def remove_node(self, node):
+        """Take a node off the ring; its tables move to the neighbouring nodes."""
+        for i in range(self.replicas):
+            position = self._hash(f"{node}#{i}")
+            if self._nodes.pop(position, None) is not None:
+                del self._keys[bisect.bisect_left(self._keys, position)]
+
+    def node_for(self, key):
+        """Return the node that owns a key."""
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._nodes[self._keys[index]]
+
+def run_worker(host, port, web_port):
+    """Process entry point: run one GameServer shard until terminated."""
+    from .server import GameServer, serve
+    from .bots import settings_from_env
+    logconfig.configure()  # Each worker gets its own writer thread
+
+    async def run():
+        # Each shard logs (and after a restart, rebuilds) the tables it owns in its own directory
+        event_log = os.environ.get("CRAZY8_EVENT_LOG")
+        server = GameServer(host=host, port=port, web_port=web_port,
+                            event_log_dir=os.path.join(event_log, f"worker-{port}") if event_log else None,
+                            routed=True, **settings_from_env())
+        # Shuts down cleanly on the supervisor's terminate() (SIGTERM) as well as on Ctrl+C
+        await serve(server)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+class Supervisor:
+    def __init__(self, host='localhost', port=8765, web_port=5001, workers=None):
+        self.host = host
+        self.port = port
+        self.web_port = web_port
+        self.num_workers = workers or os.cpu_count() or 1
+        # Worker i serves WebSockets on port + 1 + i and its web UI on web_port + i
+        self.worker_ports = [port + 1 + i for i in range(self.num_workers)]
+        self.ring = HashRing(self.worker_ports)
+        self.processes = {}  # worker port -> multiprocessing.Process
+
+    def start_worker(self, index):
+        """Start (or restart) the worker process for a shard."""
+        worker_port = self.worker_ports[index]
+        process = multiprocessing.Process(
+            target=run_worker,
+            args=(self.host, worker_port, self.web_port + index),
+            name=f"game-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self.processes[worker_port] = process
+        logger.info("Started worker %s (pid %s) on port %s", index, process.pid, worker_port)
+
+    async def monitor_workers(self, interval=1.0):
+        """Restart any worker that exits so its shard of tables stays served."""
+        while True:
+            await asyncio.sleep(interval)
+            for index, worker_port in enumerate(self.worker_ports):
+                process = self.processes.get(worker_port)
+                if process is not None and not process.is_alive():
+                    logger.warning("Worker %s exited with code %s; restarting", index, process.exitcode)
+                    self.start_worker(index)
+
+    async def handle_connection(self, client_reader, client_writer):
+        """Route one client connection to the worker that owns its table."""
+        try:
+            request_head = await client_reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            client_writer.close()
+            return
+
+        request_line = request_head.split(b"\r\n", 1)[0].decode("latin-1")
+        parts = request_line.split(" ")
+        path = parts[1] if len(parts) >= 2 else "/"
+        table_id = table_from_path(path) or DEFAULT_TABLE
+        worker_port = self.ring.node_for(table_id)
+
+        try:
+            worker_reader, worker_writer = await asyncio.open_connection(self.host, worker_port)
+        except OSError as e:
+            logger.error("Worker on port %s unavailable for table %s: %s", worker_port, table_id, e)
+            client_writer.write(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await client_writer.drain()
+            client_writer.close()
+            return
+
+        logger.debug("Routing table %s to worker port %s", table_id, worker_port)
+        worker_writer.write(request_head)
+        await asyncio.gather(
+            self._relay(client_reader, worker_writer),
+            self._relay(worker_reader, client_writer)
+        )
+
+    @staticmethod
+    async def _relay(reader, writer):
+        """Copy bytes from one side of the connection to the other until EOF."""
+        try:
+            while True:
+                data = await reader.read(RELAY_CHUNK_SIZE)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def run(self):
+        """Start the workers and the front acceptor, then serve forever."""
+        for index in range(self.num_workers):
+            self.start_worker(index)
+
+        acceptor = await asyncio.start_server(
+            self.handle_connection, self.host, self.port, limit=MAX_REQUEST_HEAD
+        )
+        logger.info("Acceptor started at ws://%s:%s with %s workers", self.host, self.port, self.num_workers)
+        try:
+            await self.monitor_workers()
+        finally:
+            acceptor.close()
+            for process in self.processes.values():
+                process.terminate()
+            for process in self.processes.values():
+                process.join()
+            logger.info("Supervisor stopped.")
+
+def main():
+    """Entry point for the sharded server."""
+    parser = argparse.ArgumentParser(description="Run the game server sharded across worker processes.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765, help="public WebSocket port")
+    parser.add_argument("--web-port", type=int, default=5001, help="web UI port of the first worker")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    logconfig.configure()
+    supervisor = Supervisor(host=args.host, port=args.port, web_port=args.web_port, workers=args.workers)
+    try:
+        asyncio.run(supervisor.run())
+    except KeyboardInterrupt:
+        logger.info("Supervisor shutting down...")
+
+if __name__ == "__main__":
+    main()
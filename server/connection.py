@@ -0,0 +1,110 @@
+"""
+Per-connection outbound queues.
+
+Every client connection owns a bounded queue of encoded frames drained by its
+own writer task, so broadcasting only enqueues and never waits on a socket.
+When a queue fills up (the client can't keep up), the connection's overflow
+policy decides what happens: drop the oldest queued frame (fine for observers,
+who only need recent state) or disconnect the slow client (for seated players,
+who can't miss messages).
+"""
+import asyncio
+import logging
+import websockets
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+
+DEFAULT_QUEUE_SIZE = 256  # Frames
+SLOW_CONSUMER_CLOSE_CODE = 1008  # Policy violation
+
+class Connection:
+    def __init__(self, websocket, max_queue=DEFAULT_QUEUE_SIZE, overflow_policy=DISCONNECT):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.overflow_policy = overflow_policy
+        self.closed = False
+        self.dropped_frames = 0  # Frames discarded under the drop-oldest policy
+        self.writer_task = None
+
+    def start(self):
+        """Start the writer task that drains the queue onto the socket."""
+        if self.writer_task is None:
+            self.writer_task = asyncio.create_task(self._writer())
+
+    def send(self, frame):
+        """Queue a frame without waiting. Returns False if the frame was not queued."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            if self.overflow_policy == DROP_OLDEST:
+                self.queue.get_nowait()
+                self.dropped_frames += 1
+                self.queue.put_nowait(frame)
+            else:
+                logger.warning("Send queue full for connection %s; disconnecting slow client", id(self.websocket))
+                self.abort(reason="Send queue full")
+                return False
+        return True
+
+    def queue_depth(self):
+        """Number of frames waiting to be written."""
+        return self.queue.qsize()
+
+    async def _writer(self):
+        """Write queued frames in order until the connection closes."""
+        try:
+            while True:
+                frame = await self.queue.get()
+                await self.websocket.send(frame)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except Exception as e:
+            logger.error("Error writing to connection %s: %s", id(self.websocket), e)
+        finally:
+            self.closed = True
+
+    def abort(self, reason="Connection closed"):
+        """Stop sending and close the socket; the client's handler then cleans up."""
+        if self.closed:
+            return
+        self.closed = True
+        if self.writer_task:
+            self.writer_task.cancel()
+        asyncio.create_task(self.websocket.close(code=SLOW_CONSUMER_CLOSE_CODE, reason=reason))
+
+    async def close(self):
+        """Stop the writer task once the client's handler is done with the connection."""
+        self.closed = True
+        if self.writer_task:
+            self.writer_task.cancel()
+            try:
+                await self.writer_task
+            except asyncio.CancelledError:
+                pass
+
+class DetachedConnection:
+    """Connection for a seat with no socket: a bot, or a player yet to reconnect after a restart.
+       Frames sent to it are dropped.
+    """
+    def __init__(self):
+        self.websocket = None
+        self.overflow_policy = DISCONNECT
+        self.closed = False
+        self.dropped_frames = 0
+
+    def send(self, frame):
+        return True
+
+    def queue_depth(self):
+        return 0
+
+    def abort(self, reason="Connection closed"):
+        pass
+
+    async def close(self):
+        pass
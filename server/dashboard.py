@@ -0,0 +1,173 @@
+"""
+Live game state for web dashboards.
+
+Games report every state change (moves, draws, joins, leaves...) to their
+TableManager's listeners. The DashboardHub listens and keeps one immutable
+TableSnapshot per table: the dashboard state at a revision, already encoded
+as the /api/game-state JSON body and as a Server-Sent Event, with an ETag.
+A change retires the table's snapshot; the next reader builds the new one and
+every other reader (polling or streaming) reuses it until the next change.
+
+Once the current game action is done, the hub pushes each changed table's
+event to its stream subscribers. A subscription holds at most one pending
+event per table, so a slow dashboard skips stale states instead of piling
+them up, and dashboards watching many tables cost nothing while those tables
+are idle.
+"""
+import asyncio
+import json
+import os
+from datetime import datetime
+
+ALL_TABLES = "*"  # Subscribe to every table, including ones opened later
+
+def game_state(table_id, game):
+    """Dashboard view of one table (the /api/game-state payload)."""
+    players = {}
+    for username, player in game.players.items():
+        players[username] = {
+            'hand_size': len(player.hand),
+            'is_connected': player.is_connected,
+            'is_bot': player.is_bot
+        }
+
+    return {
+        'table': table_id,
+        'started': game.started,
+        'players': players,
+        'current_player': game.get_current_player(),
+        'player_order': game.player_order,
+        'deck_size': len(game.deck.cards),
+        'discard_size': len(game.discard_pile),
+        'top_card': str(game.get_top_discard_card()) if game.discard_pile else None,
+        'current_suit': game.current_suit.value if game.current_suit else None,
+        'state_version': game.version,
+        'spectators': list(game.spectators),
+        'timestamp': datetime.now().isoformat()  # When this state was captured
+    }
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+class TableSnapshot:
+    """Dashboard state of one table at one revision, with its encodings. Never modified."""
+    __slots__ = ('table_id', 'revision', 'state', 'etag', 'body', 'event')
+
+    def __init__(self, table_id, revision, state, etag):
+        self.table_id = table_id
+        self.revision = revision
+        self.state = state  # None when the table isn't open
+        self.etag = etag
+        self.body = json.dumps(state).encode("utf-8") if state is not None else None
+        if state is not None:
+            self.event = _sse("state", state)
+        else:
+            self.event = _sse("closed", {'table': table_id})
+
+class Subscription:
+    """One dashboard's view of the hub: the latest unsent event for each of its tables."""
+    def __init__(self, table_ids):
+        self.table_ids = table_ids
+        self.pending = {}  # table_id -> encoded event
+        self.ready = asyncio.Event()
+        self.closed = False
+
+    def push(self, table_id, event):
+        self.pending[table_id] = event
+        self.ready.set()
+
+    async def next_events(self, timeout):
+        """Wait for events. Returns a list of encoded events ([] on timeout), or None once closed."""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        if self.closed:
+            return None
+        self.ready.clear()
+        events, self.pending = list(self.pending.values()), {}
+        return events
+
+class DashboardHub:
+    def __init__(self, tables):
+        self.tables = tables
+        self.subscriptions = {}  # table_id or ALL_TABLES -> set of Subscriptions
+        self.snapshots = {}  # table_id -> TableSnapshot, until the table next changes
+        self.revision = 0  # Bumped for every snapshot built, across all tables
+        self.boot_id = os.urandom(4).hex()  # Keeps ETags from a previous server run from matching
+        self.dirty = set()  # Changed tables with subscribers, pushed once the current action is done
+        self.flush_scheduled = False
+        self.builds = 0
+        self.pushed_events = 0
+        tables.add_listener(self.table_changed)
+
+    def table_changed(self, table_id, event):
+        """TableManager listener: mark a table's state as changed."""
+        self.snapshots.pop(table_id, None)
+        if table_id not in self.subscriptions and ALL_TABLES not in self.subscriptions:
+            return
+        self.dirty.add(table_id)
+        if not self.flush_scheduled:
+            # Several changes in one game action go out as one event
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self):
+        self.flush_scheduled = False
+        dirty, self.dirty = self.dirty, set()
+        for table_id in dirty:
+            event = self.snapshot(table_id).event
+            for subscription in self.subscriptions.get(table_id, ()):
+                subscription.push(table_id, event)
+                self.pushed_events += 1
+            for subscription in self.subscriptions.get(ALL_TABLES, ()):
+                subscription.push(table_id, event)
+                self.pushed_events += 1
+
+    def snapshot(self, table_id):
+        """Return the current TableSnapshot for a table, building it only after a change."""
+        snapshot = self.snapshots.get(table_id)
+        if snapshot is None:
+            game = self.tables.get(table_id)
+            state = game_state(table_id, game) if game is not None else None
+            self.revision += 1
+            self.builds += 1
+            etag = f'"{self.boot_id}-{self.revision}"'
+            snapshot = TableSnapshot(table_id, self.revision, state, etag)
+            if game is not None:  # Don't keep entries for names of tables that aren't open
+                self.snapshots[table_id] = snapshot
+        return snapshot
+
+    def subscribe(self, table_ids):
+        """Start a subscription, primed with the current state of its tables."""
+        subscription = Subscription(table_ids)
+        for table_id in table_ids:
+            self.subscriptions.setdefault(table_id, set()).add(subscription)
+        current = [table_id for table_id, _ in self.tables] if ALL_TABLES in table_ids else table_ids
+        for table_id in current:
+            subscription.push(table_id, self.snapshot(table_id).event)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """End a subscription whose dashboard went away."""
+        for table_id in subscription.table_ids:
+            subscribers = self.subscriptions.get(table_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscriptions[table_id]
+
+    def close(self):
+        """End every subscription (on shutdown)."""
+        for subscribers in self.subscriptions.values():
+            for subscription in subscribers:
+                subscription.closed = True
+                subscription.ready.set()
+
+    def stats(self):
+        """Counters for the web UI and monitoring."""
+        return {
+            'subscriptions': len({s for subscribers in self.subscriptions.values() for s in subscribers}),
+            'snapshot_builds': self.builds,
+            'pushed_events': self.pushed_events,
+        }
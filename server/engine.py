@@ -0,0 +1,288 @@
+"""
+Headless Crazy Eights engine for in-process simulation.
+
+The same rules as Game.start_game, make_move, draw_card and end_game, on a
+compact state with no players, connections, listeners or messages: cards are
+ids (see server.card), hands are bitmasks, players are seats in turn order and
+every random choice comes from the state's own random.Random. Actions are
+small tuples applied with step(), which changes the state in place and
+returns what happened:
+
+    state = new_game(4, seed=7)
+    while not state.over:
+        step(state, choose(legal_actions(state)))
+
+Dealing consumes the RNG exactly as Game.start_game consumes the random
+module, so a state started with seed S deals the same cards, turn order and
+top card as a Game started right after random.seed(S) (seat i is
+game.player_order[i] when the game's players were added as seats 0..n-1).
+
+    python -m server.engine --games 100000 --players 4
+plays random games and prints throughput and balance statistics.
+
+This engine plays one game at a time in pure Python, a few thousand games
+a second per core: it is for search, bots and checking single games. For
+bulk statistics over millions of games use server.batchsim, which plays
+whole batches at once with NumPy and is checked against Game.
+"""
+import argparse
+import random
+import time
+from .card import NUM_CARDS, VALUES, VALUE_INDEX, VALUE_MASKS, CARD_POINTS, CARD_STRINGS, SUITS
+from .rules import LEGAL_MASKS
+
+NUM_VALUES = len(VALUES)
+EIGHT = VALUE_INDEX['8']
+NO_SUIT = -1  # current_suit when no suit was declared (the top card's suit applies)
+ALL_SUITS = tuple(range(len(SUITS)))
+
+# Lookups for step() and random_policy(), which run once per action and avoid calls and temporary lists
+_CARD_SUIT = tuple(card // NUM_VALUES for card in range(NUM_CARDS))
+_EIGHTS = VALUE_MASKS['8']
+
+# Actions
+PLAY = 0  # (PLAY, card id, declared suit index or NO_SUIT)
+DRAW = 1  # (DRAW,)
+DRAW_ACTION = (DRAW,)
+
+# step() results
+ILLEGAL = 0  # Rejected; the state is unchanged
+PLAYED = 1  # Card played, turn passed on
+DREW = 2  # Card drawn; same player's turn
+PASSED = 3  # Deck and discard pile exhausted; turn passed on
+WON = 4  # The player went out; game over
+BLOCKED = 5  # Nobody can play or draw; game over, lowest hand value wins
+
+def card_suit(card):
+    return card // NUM_VALUES
+
+def is_eight(card):
+    return card % NUM_VALUES == EIGHT
+
+def mask_cards(mask):
+    """Card ids in a hand bitmask, lowest first."""
+    cards = []
+    while mask:
+        low = mask & -mask
+        cards.append(low.bit_length() - 1)
+        mask ^= low
+    return cards
+
+def mask_points(mask):
+    """Crazy Eights point total of a hand bitmask."""
+    return sum(CARD_POINTS[card] for card in mask_cards(mask))
+
+class GameState:
+    """One game. Seats are numbered in turn order; the deck is dealt from its end."""
+    __slots__ = ('num_players', 'deck', 'discard', 'hands', 'turn', 'current_suit', 'rng',
+                 'over', 'winner', 'blocked', 'moves')
+
+    def __init__(self, num_players, rng):
+        self.num_players = num_players
+        self.deck = []  # Card ids; the last one is dealt next
+        self.discard = []  # Card ids; the last one is the top card
+        self.hands = [0] * num_players  # Seat -> hand bitmask
+        self.turn = 0  # Seat to act
+        self.current_suit = NO_SUIT  # Suit to match (declared after an 8), as Game.current_suit
+        self.rng = rng
+        self.over = False
+        self.winner = None  # Seat that went out, or None for a blocked game
+        self.blocked = False
+        self.moves = 0  # Actions applied
+
+    def copy(self):
+        """Independent copy, including the RNG, for search and what-if play."""
+        state = GameState.__new__(GameState)
+        state.num_players = self.num_players
+        state.deck = self.deck[:]
+        state.discard = self.discard[:]
+        state.hands = self.hands[:]
+        state.turn = self.turn
+        state.current_suit = self.current_suit
+        state.rng = random.Random()
+        state.rng.setstate(self.rng.getstate())
+        state.over = self.over
+        state.winner = self.winner
+        state.blocked = self.blocked
+        state.moves = self.moves
+        return state
+
+    def top_card(self):
+        return self.discard[-1] if self.discard else None
+
+    def suit_to_match(self):
+        """The declared suit, else the top card's suit."""
+        return self.current_suit if self.current_suit != NO_SUIT else _CARD_SUIT[self.discard[-1]]
+
+    def legal_mask(self):
+        """Bitmask of the cards that may be played now (by anyone holding them)."""
+        top = self.discard[-1]
+        suit = self.current_suit
+        return LEGAL_MASKS[top][suit if suit != NO_SUIT else _CARD_SUIT[top]]
+
+    def scores(self):
+        """Seat -> point total of the cards left in hand."""
+        return [mask_points(hand) for hand in self.hands]
+
+    def winners(self):
+        """Seats that won: the player who went out, or everyone tied on the lowest score when blocked."""
+        if not self.over:
+            return []
+        if not self.blocked:
+            return [self.winner]
+        scores = self.scores()
+        low = min(scores)
+        return [seat for seat, score in enumerate(scores) if score == low]
+
+    def __repr__(self):
+        hands = [" ".join(CARD_STRINGS[card] for card in mask_cards(hand)) for hand in self.hands]
+        top = CARD_STRINGS[self.discard[-1]] if self.discard else None
+        return f"GameState(turn={self.turn}, top={top}, suit={self.current_suit}, deck={len(self.deck)}, hands={hands})"
+
+def new_game(num_players, seed=None, rng=None):
+    """Shuffle, deal and turn up the first card, as Game.start_game does."""
+    if num_players < 2:
+        raise ValueError("Need at least 2 players to start")
+    state = GameState(num_players, rng or random.Random(seed))
+    rng = state.rng
+    deck = state.deck
+    deck.extend(range(NUM_CARDS))
+    rng.shuffle(deck)
+    rng.shuffle(list(range(num_players)))  # Game shuffles its turn order here; seats are already in turn order
+
+    deal = 7 if num_players == 2 else 5
+    for seat in range(num_players):
+        hand = 0
+        for _ in range(deal):
+            hand |= 1 << deck.pop()
+        state.hands[seat] = hand
+
+    while True:
+        card = deck.pop()
+        if is_eight(card):
+            # 8s can't start the discard pile; put it back at a random position
+            deck.insert(rng.randint(0, len(deck)) if deck else 0, card)
+        else:
+            state.discard.append(card)
+            state.current_suit = card_suit(card)
+            return state
+
+def legal_actions(state):
+    """Every action the player to act may take: each legal card (an 8 once per suit) and drawing."""
+    if state.over:
+        return []
+    actions = []
+    for card in mask_cards(state.hands[state.turn] & state.legal_mask()):
+        if is_eight(card):
+            actions.extend((PLAY, card, suit) for suit in ALL_SUITS)
+        else:
+            actions.append((PLAY, card, NO_SUIT))
+    actions.append(DRAW_ACTION)
+    return actions
+
+def step(state, action):
+    """Apply an action for the player to act. Returns PLAYED, DREW, PASSED, WON, BLOCKED or ILLEGAL."""
+    if state.over:
+        return ILLEGAL
+    seat = state.turn
+    hands = state.hands
+    discard = state.discard
+    if action[0] == PLAY:
+        card, declared = action[1], action[2]
+        bit = 1 << card
+        top = discard[-1]
+        suit = state.current_suit
+        if not (hands[seat] & bit & LEGAL_MASKS[top][suit if suit != NO_SUIT else _CARD_SUIT[top]]):
+            return ILLEGAL
+        if _EIGHTS & bit:
+            if declared == NO_SUIT:
+                return ILLEGAL  # Playing an 8 needs a declared suit
+        else:
+            declared = NO_SUIT
+        hand = hands[seat] ^ bit
+        hands[seat] = hand
+        discard.append(card)
+        state.current_suit = declared
+        state.moves += 1
+        if not hand:
+            state.over = True
+            state.winner = seat
+            return WON
+        state.turn = (seat + 1) % state.num_players
+        return PLAYED
+
+    if action[0] == DRAW:
+        state.moves += 1
+        deck = state.deck
+        if not deck:
+            if len(discard) > 1:
+                # Reshuffle everything under the top card back into the deck
+                top = discard.pop()
+                deck.extend(discard)
+                state.discard = [top]
+                state.rng.shuffle(deck)
+            else:
+                legal = state.legal_mask()
+                if not any(hand & legal for hand in hands):
+                    state.over = True
+                    state.blocked = True
+                    return BLOCKED
+                state.turn = (seat + 1) % state.num_players
+                return PASSED
+        hands[seat] |= 1 << deck.pop()
+        return DREW
+
+    return ILLEGAL
+
+def random_policy(state, rng):
+    """Play a random legal card (declaring a random suit for an 8); draw only when nothing is playable."""
+    top = state.discard[-1]
+    suit = state.current_suit
+    playable = state.hands[state.turn] & LEGAL_MASKS[top][suit if suit != NO_SUIT else _CARD_SUIT[top]]
+    if not playable:
+        return DRAW_ACTION
+    # The k-th lowest playable card, drawn from the RNG as rng.choice(mask_cards(playable)) would
+    for _ in range(rng.randrange(playable.bit_count())):
+        playable &= playable - 1
+    card = (playable & -playable).bit_length() - 1
+    return (PLAY, card, rng.randrange(len(SUITS)) if _EIGHTS >> card & 1 else NO_SUIT)
+
+def play_game(num_players, seed=None, policy=random_policy, policy_rng=None, max_moves=10000):
+    """Play one game to the end with a policy(state, rng) for every seat. Returns the final state."""
+    state = new_game(num_players, seed)
+    rng = policy_rng or random.Random(seed)
+    while not state.over and state.moves < max_moves:
+        step(state, policy(state, rng))
+    return state
+
+def main():
+    """Play random games and report throughput and balance statistics."""
+    parser = argparse.ArgumentParser(
+        description="Simulate Crazy Eights games with the headless engine, one at a time. "
+                    "For millions of games, python -m server.batchsim is an order of magnitude faster."
+    )
+    parser.add_argument("--games", type=int, default=100000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    wins = [0.0] * args.players
+    blocked = 0
+    moves = 0
+    seeds = random.Random(args.seed)
+    started = time.perf_counter()
+    for _ in range(args.games):
+        state = play_game(args.players, seed=seeds.getrandbits(64))
+        moves += state.moves
+        blocked += state.blocked
+        winners = state.winners()
+        for seat in winners:
+            wins[seat] += 1 / len(winners)  # Ties share the win
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.games} games in {elapsed:.2f}s: {args.games / elapsed:,.0f} games/s, {moves / elapsed:,.0f} actions/s")
+    print(f"Blocked games: {blocked / args.games:.2%}, average length {moves / args.games:.1f} actions")
+    print("Win rate by seat: " + ", ".join(f"{seat}: {count / args.games:.2%}" for seat, count in enumerate(wins)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,595 @@
+"""
+Append-only per-table event logs, for rebuilding tables after a restart.
+
+Every action that changes a table's game is appended to the table's log as
+one small binary record: a round's start (with its RNG seed and seating),
+moves, draws, reshuffles, players leaving, bots taking over seats and the
+round's end. Every snapshot_interval events the table's full state (hands,
+deck order, discard pile, turn, suit and RNG state) is logged too, so a table
+is rebuilt by replaying at most that many events after its latest snapshot.
+The same goes for replaying any logged round from any move number
+(replay_round()), finished or not: the EventLog keeps an index of where each
+round and snapshot is in the file, so a replay reads the file from the
+nearest snapshot on.
+
+Appending only queues the record. A writer thread writes whatever has queued
+up and fsyncs each file it touched once per batch (group commit): a burst of
+moves costs one fsync, and no action waits for the disk. The price is that a
+crash loses the batch being written, so a table comes back as of its last
+committed event.
+
+Record layout: crc32 (u32), payload length (u16), event type (u8), payload.
+The crc covers the type and payload; reading stops at the first torn or
+corrupt record, and recovery cuts the file back to the last good one.
+"""
+import bisect
+import logging
+import math
+import os
+import queue
+import random
+import struct
+import threading
+import time
+import zlib
+from urllib.parse import quote, unquote
+from .card import CARDS, NUM_CARDS, SUITS, SUIT_INDEX, SUITS_BY_NAME, card_from_str
+from .connection import DetachedConnection
+from .game import Game
+from .player import Player
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_INTERVAL = 64  # Events between a table's snapshots
+LOG_SUFFIX = ".log"
+
+# Event types
+START = 1  # seed, [(username, is_bot)] in seating order (before the turn order is shuffled)
+MOVE = 2  # username, card id, declared suit index or NO_SUIT
+DRAW = 3  # username
+RESHUFFLE = 4  # number of cards shuffled back into the deck (the DRAW that follows does it)
+LEAVE = 5  # username
+END = 6  # reason, if the round was ended from outside (a player quitting); '' otherwise
+BOT = 7  # username: a bot took over the seat
+SNAPSHOT = 8  # full game state, see snapshot_game()
+
+EVENT_NAMES = {START: "start", MOVE: "move", DRAW: "draw", RESHUFFLE: "reshuffle",
+               LEAVE: "leave", END: "end", BOT: "bot", SNAPSHOT: "snapshot"}
+
+NO_SUIT = 255
+_HEADER = struct.Struct('<IHB')  # crc32, payload length, event type
+_RNG_WORDS = 625  # Mersenne Twister state words in random.Random.getstate()
+_STOP = object()
+
+# Payload encoding
+
+def _pack_str(value):
+    data = value.encode('utf-8')
+    return struct.pack('<H', len(data)) + data
+
+def _pack_cards(cards):
+    return struct.pack('<B', len(cards)) + bytes(card.id for card in cards)
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def unpack(self, fmt):
+        values = struct.unpack_from(fmt, self.data, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return values
+
+    def u8(self):
+        return self.unpack('<B')[0]
+
+    def str(self):
+        length = self.unpack('<H')[0]
+        value = self.data[self.pos:self.pos + length].decode('utf-8')
+        self.pos += length
+        return value
+
+    def cards(self):
+        count = self.u8()
+        cards = [CARDS[card] for card in self.data[self.pos:self.pos + count]]
+        self.pos += count
+        return cards
+
+def seating(game):
+    """START fields for a game about to start: (username, is_bot) in seating order."""
+    return [(username, player.is_bot) for username, player in game.players.items()]
+
+def encode_event(event, *fields):
+    """Payload bytes of an event (see the event types for their fields)."""
+    if event == START:
+        seed, players = fields
+        return struct.pack('<QB', seed, len(players)) + b"".join(
+            _pack_str(username) + struct.pack('<B', is_bot) for username, is_bot in players)
+    if event == MOVE:
+        username, card, declared_suit = fields
+        suit = SUITS_BY_NAME.get(declared_suit.lower()) if declared_suit else None
+        return _pack_str(username) + struct.pack('<BB', card_from_str(card).id, SUIT_INDEX[suit] if suit else NO_SUIT)
+    if event in (DRAW, LEAVE, BOT, END):
+        return _pack_str(fields[0])
+    if event == RESHUFFLE:
+        return struct.pack('<B', fields[0])
+    raise ValueError(f"Unknown event type {event}")
+
+def decode_event(event, payload):
+    """Event fields from a payload: the inverse of encode_event(), plus SNAPSHOT (a Game)."""
+    reader = _Reader(payload)
+    if event == START:
+        seed, count = reader.unpack('<QB')
+        return (seed, [(reader.str(), bool(reader.u8())) for _ in range(count)])
+    if event == MOVE:
+        username = reader.str()
+        card, suit = reader.unpack('<BB')
+        return (username, CARDS[card], None if suit == NO_SUIT else SUITS[suit])
+    if event in (DRAW, LEAVE, BOT, END):
+        return (reader.str(),)
+    if event == RESHUFFLE:
+        return (reader.u8(),)
+    if event == SNAPSHOT:
+        return (restore_game(payload),)
+    raise ValueError(f"Unknown event type {event}")
+
+def snapshot_game(game):
+    """SNAPSHOT payload for a running game: seats, hands, deck, discard pile, turn, suit and RNG state."""
+    names = list(game.players)
+    parts = [struct.pack('<B', len(names))]
+    for username in names:
+        player = game.players[username]
+        parts.append(_pack_str(username) + struct.pack('<B', player.is_bot) + _pack_cards(player.hand))
+    parts.append(struct.pack('<B', len(game.player_order)) + bytes(names.index(u) for u in game.player_order))
+    parts.append(struct.pack('<BB', game.current_turn_index,
+                             SUIT_INDEX[game.current_suit] if game.current_suit else NO_SUIT))
+    parts.append(_pack_cards(game.deck.cards))
+    parts.append(_pack_cards(game.discard_pile))
+    version, words, gauss = game.rng.getstate()
+    parts.append(struct.pack(f'<B{_RNG_WORDS}IB', version, *words, gauss is not None))
+    if gauss is not None:
+        parts.append(struct.pack('<d', gauss))
+    return b"".join(parts)
+
+def restore_game(payload):
+    """A running Game rebuilt from a SNAPSHOT payload. Seats have no connections yet."""
+    reader = _Reader(payload)
+    game = Game(random.Random())
+    names = []
+    for _ in range(reader.u8()):
+        username = reader.str()
+        player = Player(username, DetachedConnection())
+        player.is_connected = False
+        player.is_bot = bool(reader.u8())
+        for card in reader.cards():
+            player.add_card(card)
+        game.players[username] = player
+        names.append(username)
+    order_count = reader.u8()
+    game.player_order = [names[i] for i in reader.unpack(f'<{order_count}B')]
+    game.current_turn_index, suit = reader.unpack('<BB')
+    game.current_suit = None if suit == NO_SUIT else SUITS[suit]
+    game.deck.cards = reader.cards()
+    game.discard_pile = reader.cards()
+    values = reader.unpack(f'<B{_RNG_WORDS}IB')
+    gauss = reader.unpack('<d')[0] if values[-1] else None
+    game.rng.setstate((values[0], tuple(values[1:-1]), gauss))
+    game.deck.rng = game.rng
+    game.started = True
+    return game
+
+def replay_event(game, event, fields):
+    """Apply a logged event to a game, as the server did. Returns the game
+       (a new one for START and SNAPSHOT). Raises ValueError if the game rejects it.
+    """
+    if event == START:
+        seed, players = fields
+        game = Game()
+        for username, is_bot in players:
+            game.add_player(username, DetachedConnection())
+            game.players[username].is_connected = False
+            game.players[username].is_bot = is_bot
+        success, error = game.start_game(seed)
+    elif event == SNAPSHOT:
+        return fields[0]
+    elif event == MOVE:
+        username, card, suit = fields
+        success, error, _ = game.make_move(username, str(card), suit.value if suit else None)
+    elif event == DRAW:
+        success, error, _ = game.draw_card(fields[0])
+    elif event == LEAVE:
+        success, error = game.remove_player(fields[0])[0], "not seated"
+    elif event == BOT:
+        game.players[fields[0]].is_bot = True
+        success = True
+    elif event == END:
+        if game.started:
+            game.end_game(reason=fields[0] or None)
+        success = True
+    else:  # RESHUFFLE: the DRAW after it reshuffles
+        success = True
+    if not success:
+        raise ValueError(f"Logged {EVENT_NAMES[event]} {fields} was rejected: {error}")
+    return game
+
+# Files
+
+def table_path(directory, table_id):
+    return os.path.join(directory, quote(table_id, safe='') + LOG_SUFFIX)
+
+def read_log(path):
+    """Every intact record in a log file, as (offset, event type, payload), and the
+       length of the intact part (shorter than the file after a torn write).
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    records = []
+    pos = 0
+    while pos + _HEADER.size <= len(data):
+        crc, length, event = _HEADER.unpack_from(data, pos)
+        end = pos + _HEADER.size + length
+        if end > len(data) or zlib.crc32(data[pos + 6:end]) != crc:
+            break
+        records.append((pos, event, data[pos + _HEADER.size:end]))
+        pos = end
+    return records, pos
+
+def rebuild(records):
+    """The running game at the end of a table's records, or None if its last round ended.
+       Replays from the last round's latest snapshot (or its start).
+       Returns (game, events replayed).
+    """
+    base = None
+    for i, (_, event, _) in enumerate(records):
+        if event == START or event == SNAPSHOT:
+            base = i
+    if base is None:
+        return None, 0
+    game = None
+    for _, event, payload in records[base:]:
+        game = replay_event(game, event, decode_event(event, payload))
+    if not game.started:
+        return None, len(records) - base
+    return game, len(records) - base
+
+# Replay
+
+def _is_step(event):
+    """Whether an event changes the game (snapshots and RESHUFFLE markers don't)."""
+    return event not in (START, SNAPSHOT, RESHUFFLE)
+
+class RoundIndex:
+    """Where one logged round's records are in its table's file."""
+    __slots__ = ('offset', 'end', 'moves', 'snapshots')
+
+    def __init__(self, offset):
+        self.offset = offset  # Of the round's START record
+        self.end = offset  # Just past its last committed record
+        self.moves = 0  # Events committed after the deal
+        self.snapshots = []  # (move, offset) of the round's SNAPSHOT records, in order
+
+    def add(self, offset, event, size):
+        """Index a committed record of the round."""
+        if event == SNAPSHOT:
+            self.snapshots.append((self.moves, offset))
+        elif _is_step(event):
+            self.moves += 1
+        self.end = offset + size
+
+    def seek_point(self, move):
+        """(offset, move) of the record to replay up to a move from: the latest snapshot
+           at or before it, or the round's START.
+        """
+        i = bisect.bisect_right(self.snapshots, (move, math.inf))
+        if i == 0:
+            return self.offset, 0
+        snapshot_move, offset = self.snapshots[i - 1]
+        return offset, snapshot_move
+
+    def copy(self):
+        index = RoundIndex(self.offset)
+        index.end = self.end
+        index.moves = self.moves
+        index.snapshots = list(self.snapshots)
+        return index
+
+def _index_record(rounds, offset, event, size):
+    """Add a committed record to a table's list of RoundIndex."""
+    if event == START:
+        rounds.append(RoundIndex(offset))
+    if rounds:
+        rounds[-1].add(offset, event, size)
+
+def read_records(path, offset, end):
+    """The records of a log file from offset up to end, as (offset, event type, payload),
+       read as they are iterated. Stops at a torn or corrupt record.
+    """
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while offset + _HEADER.size <= end:
+            head = f.read(_HEADER.size)
+            if len(head) < _HEADER.size:
+                return
+            crc, length, event = _HEADER.unpack(head)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(head[6:] + payload) != crc:
+                return
+            yield offset, event, payload
+            offset += _HEADER.size + length
+
+def replay(records, move=0, base_move=0):
+    """Replay a round from a move number: yields (move, event, fields, game), first for
+       the state at move (event and fields None), then after each later event. The game
+       is updated in place between yields. records start at the round's START or at a
+       SNAPSHOT taken after base_move events; past the end of the round, the first
+       state is its last.
+    """
+    game = None
+    current = base_move
+    seeking = True
+    for _, event, payload in records:
+        if game is None:
+            game = replay_event(None, event, decode_event(event, payload))
+            fields = None
+        elif not _is_step(event):
+            continue
+        else:
+            fields = decode_event(event, payload)
+            game = replay_event(game, event, fields)
+            current += 1
+        if current < move:
+            continue
+        if seeking:
+            seeking = False
+            yield current, None, None, game
+        else:
+            yield current, event, fields, game
+    if seeking and game is not None:
+        yield current, None, None, game
+
+def replay_round(path, index, move=0):
+    """replay() of a logged round from its RoundIndex, reading its file only from the
+       latest snapshot at or before move: seeking replays at most snapshot_interval
+       events, however long the round or the table's log.
+    """
+    offset, base_move = index.seek_point(move)
+    return replay(read_records(path, offset, index.end), move, base_move)
+
+def describe_event(event, fields):
+    """JSON-friendly view of a logged event."""
+    if event == START:
+        return {'event': EVENT_NAMES[event], 'seed': fields[0],
+                'players': [{'username': username, 'is_bot': is_bot} for username, is_bot in fields[1]]}
+    if event == MOVE:
+        username, card, suit = fields
+        return {'event': EVENT_NAMES[event], 'player': username, 'card': str(card),
+                'declared_suit': suit.value if suit else None}
+    if event == END:
+        return {'event': EVENT_NAMES[event], 'reason': fields[0] or None}
+    if event == RESHUFFLE:
+        return {'event': EVENT_NAMES[event], 'cards': fields[0]}
+    return {'event': EVENT_NAMES[event], 'player': fields[0]}
+
+def replay_state(game):
+    """Full state of a replayed game, hands and deck order included."""
+    return {
+        'started': game.started,
+        'players': {username: [str(card) for card in player.hand] for username, player in game.players.items()},
+        'bots': [username for username, player in game.players.items() if player.is_bot],
+        'player_order': list(game.player_order),
+        'current_turn_index': game.current_turn_index,
+        'current_player': game.get_current_player(),
+        'current_suit': game.current_suit.value if game.current_suit else None,
+        'top_card': str(game.get_top_discard_card()) if game.discard_pile else None,
+        'deck': [str(card) for card in game.deck.cards],  # Drawn from the end
+        'discard_pile': [str(card) for card in game.discard_pile],
+        'game_over': None if game.started else game.game_over_data,
+    }
+
+class EventLog:
+    def __init__(self, directory, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL, commit_delay=0.0):
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        # Seconds the writer waits after the first record of a batch for more to arrive.
+        # Without it, batches are whatever queued up during the previous write and fsync.
+        self.commit_delay = commit_delay
+        self.queue = queue.SimpleQueue()  # (table_id, record bytes or None to close the file), or _STOP
+        self.since_snapshot = {}  # table_id -> events logged since the table's last snapshot
+        self.files = {}  # table_id -> [open log file, its size]; used by the writer thread only
+        self.torn = {}  # table_id -> size to cut its file back to before writing to it again
+        self.rounds = {}  # table_id -> [RoundIndex] of its committed records; see find_round()
+        self.index_lock = threading.Lock()  # Updated by the writer thread, read by replays
+        self.thread = None
+        self.appended = 0  # Records queued
+        self.committed = 0  # Records written and fsynced
+        self.commits = 0  # Write-and-fsync batches
+        self.fsyncs = 0
+        self.bytes_written = 0
+        self.commit_seconds = 0.0
+        self.max_commit_seconds = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self):
+        """Start the writer thread."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._writer, name="event-log-writer", daemon=True)
+            self.thread.start()
+
+    def stop(self, timeout=5.0):
+        """Commit everything queued, then stop the writer and close the files."""
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join(timeout)
+            self.thread = None
+
+    def append(self, table_id, game, event, *fields):
+        """Queue an event for a table, then a snapshot if one is due. Called on the table's actor."""
+        try:
+            payload = encode_event(event, *fields)
+        except (struct.error, ValueError) as e:
+            # Never fail the game action being logged; the round just can't be rebuilt past here
+            logger.error("Could not log %s event for table %s: %s", EVENT_NAMES.get(event, event), table_id, e)
+            return
+        self._queue_record(table_id, event, payload)
+        count = 0 if event in (START, END) else self.since_snapshot.get(table_id, 0) + 1
+        # Not after a RESHUFFLE: the game already holds the DRAW logged next
+        if count >= self.snapshot_interval and game.started and event != RESHUFFLE:
+            self._queue_record(table_id, SNAPSHOT, snapshot_game(game))
+            count = 0
+        self.since_snapshot[table_id] = count
+
+    def _queue_record(self, table_id, event, payload):
+        body = struct.pack('<B', event) + payload
+        self.queue.put((table_id, struct.pack('<IH', zlib.crc32(body), len(payload)) + body))
+        self.appended += 1
+
+    def close_table(self, table_id):
+        """Close a table's file once everything queued for it is committed."""
+        self.since_snapshot.pop(table_id, None)
+        self.queue.put((table_id, None))
+
+    def _writer(self):
+        """Writer thread: write and fsync records in batches until stopped."""
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            if self.commit_delay:
+                time.sleep(self.commit_delay)
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            started = time.perf_counter()
+            pending = {}  # table_id -> [records] in order
+            closing = []
+            records = 0
+            for item in batch:
+                if item is _STOP:
+                    stopping = True
+                    continue
+                table_id, record = item
+                if record is None:
+                    closing.append(table_id)
+                else:
+                    pending.setdefault(table_id, []).append(record)
+                    records += 1
+            for table_id, table_records in pending.items():
+                entry = self.files.get(table_id)
+                try:
+                    if entry is None:
+                        path = table_path(self.directory, table_id)
+                        if table_id in self.torn:
+                            os.truncate(path, self.torn[table_id])
+                            del self.torn[table_id]
+                        # Unbuffered, so nothing is left over to be flushed after a failed write
+                        f = open(path, 'ab', buffering=0)
+                        entry = self.files[table_id] = [f, os.fstat(f.fileno()).st_size]
+                    f, offset = entry
+                    data = b"".join(table_records)
+                    view = memoryview(data)
+                    while view:
+                        view = view[f.write(view):]
+                    os.fsync(f.fileno())
+                    self.fsyncs += 1
+                    self.bytes_written += len(data)
+                except OSError as e:
+                    logger.error("Could not write the event log of table %s: %s", table_id, e)
+                    if entry is not None:
+                        self._roll_back(table_id, entry)
+                    continue
+                entry[1] += len(data)
+                with self.index_lock:
+                    rounds = self.rounds.setdefault(table_id, [])
+                    for record in table_records:
+                        _index_record(rounds, offset, record[_HEADER.size - 1], len(record))
+                        offset += len(record)
+            for table_id in closing:
+                entry = self.files.pop(table_id, None)
+                if entry is not None:
+                    entry[0].close()
+            if records:
+                elapsed = time.perf_counter() - started
+                self.commits += 1
+                self.committed += records
+                self.commit_seconds += elapsed
+                self.max_commit_seconds = max(self.max_commit_seconds, elapsed)
+        for f, _ in self.files.values():
+            f.close()
+        self.files = {}
+
+    def _roll_back(self, table_id, entry):
+        """Cut a failed write off the end of a table's file, so the records after it
+           don't follow torn bytes (which recovery would drop along with them).
+        """
+        f, size = entry
+        try:
+            os.ftruncate(f.fileno(), size)
+        except OSError as e:
+            logger.error("Could not roll back the event log of table %s: %s", table_id, e)
+            self.torn[table_id] = size  # Truncated when the file is next opened
+            del self.files[table_id]
+            f.close()
+
+    def recover(self):
+        """Rebuild every table whose last round was still running. Returns {table_id: Game}.
+           Call before start(); cuts torn records off the end of the files and indexes
+           every logged round for replays.
+        """
+        tables = {}
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(LOG_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            table_id = unquote(name[:-len(LOG_SUFFIX)])
+            records, intact = read_log(path)
+            if intact < os.path.getsize(path):
+                logger.warning("Event log of table %s ends in a torn record; dropping %s bytes", table_id, os.path.getsize(path) - intact)
+                with open(path, 'r+b') as f:
+                    f.truncate(intact)
+            rounds = []
+            for offset, event, payload in records:
+                _index_record(rounds, offset, event, _HEADER.size + len(payload))
+            with self.index_lock:
+                self.rounds[table_id] = rounds
+            try:
+                game, replayed = rebuild(records)
+            except ValueError as e:
+                logger.error("Could not rebuild table %s: %s", table_id, e)
+                continue
+            if game is not None:
+                tables[table_id] = game
+                self.since_snapshot[table_id] = replayed - 1
+                logger.info("Rebuilt table %s from its event log (%s events replayed)", table_id, replayed)
+        return tables
+
+    def path(self, table_id):
+        return table_path(self.directory, table_id)
+
+    def find_round(self, table_id, number):
+        """(number of rounds logged for a table, RoundIndex of round number or None).
+           Rounds are numbered from 1; negative numbers count back from the latest.
+           The index is a copy, covering the round's records committed so far.
+        """
+        with self.index_lock:
+            rounds = self.rounds.get(table_id, [])
+            if number > 0 and number <= len(rounds):
+                return len(rounds), rounds[number - 1].copy()
+            if number < 0 and -number <= len(rounds):
+                return len(rounds), rounds[number].copy()
+            return len(rounds), None
+
+    def stats(self):
+        """Counters for the web UI and monitoring."""
+        commits = self.commits or 1
+        return {
+            'appended': self.appended,
+            'committed': self.committed,
+            'pending': self.appended - self.committed,
+            'commits': self.commits,
+            'fsyncs': self.fsyncs,
+            'bytes_written': self.bytes_written,
+            'avg_batch': round(self.committed / commits, 2),
+            'avg_commit_ms': round(self.commit_seconds / commits * 1000, 3),
+            'max_commit_ms': round(self.max_commit_seconds * 1000, 3),
+        }
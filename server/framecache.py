@@ -0,0 +1,49 @@
+"""
+Serialize-once cache of encoded frames for one game table.
+
+Messages that depend only on the table's public state (state deltas, the
+public snapshot, the player list) are the same bytes for every recipient
+using the same encoding. The cache keeps one encoded frame per
+(state version, message kind, encoding) so late joiners, observers and
+repeated broadcasts reuse it instead of encoding again. Only the current
+version is kept: entries are evicted as soon as the version moves on.
+"""
+class FrameCache:
+    def __init__(self):
+        self.version = None  # State version the cached frames belong to
+        self.frames = {}  # (message kind, subprotocol) -> encoded frame
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def encode(self, version, kind, codec, message):
+        """Return the frame for message, encoding it only if this (version, kind, encoding)
+           has not been encoded yet. message must depend only on the public state at version.
+        """
+        if version != self.version:
+            if self.version is not None and version < self.version:
+                # Queued before the state moved on; encode it but keep the newer entries
+                self.misses += 1
+                return codec.encode(message)
+            self.evictions += len(self.frames)
+            self.frames = {}
+            self.version = version
+
+        key = (kind, codec.subprotocol)
+        frame = self.frames.get(key)
+        if frame is None:
+            self.misses += 1
+            frame = self.frames[key] = codec.encode(message)
+        else:
+            self.hits += 1
+        return frame
+
+    def stats(self):
+        """Counters for the web UI and monitoring."""
+        return {
+            "version": self.version,
+            "entries": len(self.frames),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
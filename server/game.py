@@ -1,28 +1,90 @@
 """
 Game logic for the card game.
 """
-import asyncio
-import json
 import random
-from .card import Deck, Card, Suit, card_from_str
+from .card import Deck, Card, Suit, SUITS_BY_NAME, card_from_str
 from .player import Player
+from .framecache import FrameCache
+from common.codec import JSON_CODEC
+from . import rules
 
 class Game:
-    def __init__(self):
+    def __init__(self, rng=None):
+        self.rng = rng or random  # Source of shuffles; pass a seeded random.Random to make a game reproducible
         self.players = {}  # username -> Player object
-        self.deck = Deck()
+        self.deck = Deck(self.rng)
         self.started = False
         self.current_turn_index = 0
         self.player_order = []  # List of usernames in turn order
         self.discard_pile = []  # Stores Card objects
         self.current_suit = None  # For when an 8 is played
         self.game_over_data = None  # Stores winner and scores
-
-    def add_player(self, username, websocket):
+        self.version = 0  # Public state version, bumped each time changes are published
+        self._published_state = {}  # Public state as of self.version
+        self.frame_cache = FrameCache()  # Encoded state-only messages for the current version
+        self.spectators = {}  # username -> Player watching the running round; not seated or scored
+        self.spectator_feed = None  # SpectatorFeed fanning public messages out to spectators
+        self.listeners = []  # Called with an event name after each state change
+
+    def add_listener(self, callback):
+        """Register callback(event), called after each change to the game state."""
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def _notify(self, event):
+        for callback in self.listeners:
+            callback(event)
+
+    def add_player(self, username, connection, codec=JSON_CODEC):
         """Add a player to the game."""
-        if username in self.players:
+        if username in self.players or username in self.spectators:
+            return False
+        self.players[username] = Player(username, connection, codec)
+        self._notify("player_joined")
+        return True
+
+    def add_spectator(self, username, connection, codec=JSON_CODEC):
+        """Add someone watching the running round. Spectators don't change the public state."""
+        if username in self.players or username in self.spectators:
+            return False
+        self.spectators[username] = Player(username, connection, codec)
+        self._notify("spectator_joined")
+        return True
+
+    def remove_spectator(self, username):
+        """Remove a spectator. Returns True if they were watching."""
+        if self.spectators.pop(username, None) is None:
+            return False
+        self._notify("spectator_left")
+        return True
+
+    def seat_spectators(self):
+        """Once no round is running, turn spectators into players for the next one.
+           Returns the usernames that were seated.
+        """
+        if self.started or not self.spectators:
+            return []
+        seated = list(self.spectators)
+        self.players.update(self.spectators)
+        self.spectators = {}
+        self._notify("spectators_seated")
+        return seated
+
+    def reattach_player(self, username, connection, codec=JSON_CODEC):
+        """Give a seat that has no connection (restored after a restart) back to its player.
+           Returns True if the player was reattached.
+        """
+        player = self.players.get(username)
+        if player is None or player.is_connected or player.is_bot:
             return False
-        self.players[username] = Player(username, websocket)
+        player.connection = connection
+        player.websocket = connection.websocket
+        player.codec = codec
+        player.is_connected = True
+        self._notify("player_reconnected")
         return True
 
     def remove_player(self, username):
@@ -47,15 +109,21 @@ class Game:
             if self.started and len(self.player_order) < 2 and original_player_count >= 2:
                 self.end_game(blocked=True)
 
+            self._notify("player_left")
             return True, player_was_current
         return False, False
 
-    def start_game(self):
-        """Start the game, shuffle and deal cards according to Crazy Eights rules."""
+    def start_game(self, seed=None):
+        """Start the game, shuffle and deal cards according to Crazy Eights rules.
+           With a seed, the game's RNG is reseeded first, so the round can be replayed from it.
+        """
         if len(self.players) < 2:
             return False, "Need at least 2 players to start"
         if self.started:
             return False, "Game already in progress"
+        if seed is not None:
+            self.rng = random.Random(seed)
+            self.deck.rng = self.rng
 
         self.started = True
         self.deck.reset()
@@ -65,10 +133,10 @@ class Game:
         self.game_over_data = None
 
         for player in self.players.values():
-            player.hand = []
+            player.clear_hand()
 
         self.player_order = list(self.players.keys())
-        random.shuffle(self.player_order)
+        self.rng.shuffle(self.player_order)
         self.current_turn_index = 0
 
         num_cards_to_deal = 7 if len(self.players) == 2 else 5
@@ -82,15 +150,58 @@ class Game:
                 return False, "Deck exhausted during initial deal setup (rare)."
             top_card = self.deck.deal(1)[0]
             if top_card.value == '8':
-                insert_pos = random.randint(0, len(self.deck.cards)) if not self.deck.is_empty() else 0
+                insert_pos = self.rng.randint(0, len(self.deck.cards)) if not self.deck.is_empty() else 0
                 self.deck.cards.insert(insert_pos, top_card)
             else:
                 self.discard_pile.append(top_card)
                 self.current_suit = top_card.suit
                 break
 
+        self._notify("game_started")
         return True, None
 
+    def public_state(self):
+        """Return the public (non-hand) game state as sent to clients.
+           The last round's top card and suit stay visible until the next deal,
+           so the delta for a game-winning move still carries the card it left on top.
+        """
+        top_card = self.get_top_discard_card()
+        return {
+            "started": self.started,
+            "currentTurn": self.get_current_player(),
+            "topCard": str(top_card) if top_card else None,
+            "currentSuit": self.current_suit.value if self.current_suit else None,
+            "players": list(self.players),
+            "handCounts": {username: len(player.hand) for username, player in self.players.items()}
+        }
+
+    def publish_state(self):
+        """Diff the public state against the last published version.
+           Returns (version, changes); the version is only bumped if something changed.
+           Dict fields (handCounts) only carry their changed entries.
+        """
+        state = self.public_state()
+        published = self._published_state
+        changes = {}
+        for key, value in state.items():
+            old_value = published.get(key)
+            if key in published and old_value == value:
+                continue
+            if isinstance(value, dict) and isinstance(old_value, dict):
+                # Only send changed entries; removed entries follow from "players"
+                value = {k: v for k, v in value.items() if old_value.get(k) != v}
+                if not value:
+                    continue
+            changes[key] = value
+        if changes:
+            self.version += 1
+            self._published_state = state
+        return self.version, changes
+
+    def get_snapshot(self):
+        """Return (version, state) for the last published public state."""
+        return self.version, self._published_state
+
     def get_top_discard_card(self):
         """Get the top card of the discard pile."""
         return self.discard_pile[-1] if self.discard_pile else None
@@ -131,20 +242,12 @@ class Game:
         if not top_card:
             return False, "Discard pile is empty (error)"
 
-        # Card is always playable if it's an 8
-        if card.value == '8':
-            return True, None
-
-        # Check if the card matches the rank of the top card
-        if card.value == top_card.value:
-            return True, None
-
-        # Check if the card matches the current suit (either declared after an 8 or the suit of the top card)
-        effective_suit = self.current_suit if self.current_suit else top_card.suit
-        if card.suit == effective_suit:
+        # An 8, a card matching the top card's rank, or one matching the current suit
+        # (declared after an 8, otherwise the top card's suit) may be played
+        if rules.is_legal(card, top_card, self.current_suit):
             return True, None
 
-        # If none of the above conditions are met, the move is invalid
+        effective_suit = rules.effective_suit(top_card, self.current_suit)
         return False, f"Card {card_str} doesn't match rank ({top_card.value}) or suit ({effective_suit.value})"
 
     def make_move(self, username, card_str, declared_suit_str=None):
@@ -165,8 +268,7 @@ class Game:
 
         if card.value == '8':
             if declared_suit_str:
-                suit_map = {'hearts': Suit.HEARTS, 'diamonds': Suit.DIAMONDS, 'clubs': Suit.CLUBS, 'spades': Suit.SPADES}
-                declared_suit_enum = suit_map.get(declared_suit_str.lower())
+                declared_suit_enum = SUITS_BY_NAME.get(declared_suit_str.lower())
                 if declared_suit_enum:
                     # Set self.current_suit ONLY for the declared suit after an 8
                     self.current_suit = declared_suit_enum
@@ -186,7 +288,13 @@ class Game:
 
         if not player.hand:
             self.end_game(winner=username)
-            return True, None, {"game_over": self.game_over_data}
+            self._notify("move")
+            return True, None, {
+                "game_over": self.game_over_data,
+                "played_card": str(card),
+                "player_who_played": username,
+                "declared_suit": declared_suit_enum.value if declared_suit_enum else None
+            }
 
         next_player = self.advance_turn()
         # The current_suit to report is the one set above (declared suit or None)
@@ -200,6 +308,7 @@ class Game:
             # Send the declared suit value string if an 8 was played
             "declared_suit": declared_suit_enum.value if declared_suit_enum else None
         }
+        self._notify("move")
         return True, None, move_result
 
     def draw_card(self, username):
@@ -218,35 +327,30 @@ class Game:
                 can_anyone_play = False
                 top_card = self.get_top_discard_card()
                 if top_card:
-                    required_suit = self.current_suit if self.current_suit else top_card.suit
-                    required_value = top_card.value
-                    for p_name, p_obj in self.players.items():
-                        if p_obj.can_play(required_value, required_suit):
-                            can_anyone_play = True
-                            break
+                    legal = rules.legal_mask(top_card, self.current_suit)
+                    can_anyone_play = any(p_obj.hand_mask & legal for p_obj in self.players.values())
 
                 if not can_anyone_play:
                     self.end_game(blocked=True)
+                    self._notify("draw")
                     return True, None, {"game_over": self.game_over_data, "draw_result": {"card": None, "deck_empty": True, "game_blocked": True}}
                 else:
                     next_player = self.advance_turn()
+                    self._notify("draw")
                     return True, "Deck empty, cannot draw. Turn passed.", {"next_player": next_player, "top_card": str(self.get_top_discard_card()), "current_suit": self.current_suit.value if self.current_suit else None, "draw_result": {"card": None, "deck_empty": True}}
 
         drawn_card = self.deck.deal(1)[0]
         player.add_card(drawn_card)
 
         top_card = self.get_top_discard_card()
-        can_play_drawn = False
-        if top_card:
-            effective_suit = self.current_suit if self.current_suit else top_card.suit
-            if drawn_card.value == '8' or drawn_card.value == top_card.value or drawn_card.suit == effective_suit:
-                can_play_drawn = True
+        can_play_drawn = bool(top_card) and rules.is_legal(drawn_card, top_card, self.current_suit)
 
         draw_result = {
             "card": str(drawn_card),
             "can_play": can_play_drawn,
             "deck_empty": self.deck.is_empty()
         }
+        self._notify("draw")
         return True, None, {"draw_result": draw_result}
 
     def reshuffle_discard_pile(self):
@@ -306,30 +410,4 @@ class Game:
         }
         # Reset turn index?
         self.current_turn_index = 0
-
-    async def broadcast(self, message, exclude_username=None):
-        """Send a message to all connected players, optionally excluding one."""
-        json_message = json.dumps(message)
-        tasks = []
-        for username, player in self.players.items():
-            if username != exclude_username and player.is_connected:
-                tasks.append(
-                    asyncio.create_task(
-                        player.websocket.send(json_message)
-                    )
-                )
-        if tasks:
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
-                    target_username = list(self.players.keys())[i]
-                    print(f"Error broadcasting to {target_username}: {result}")
-
-    async def send_to_player(self, username, message):
-        """Send a message to a specific player."""
-        player = self.players.get(username)
-        if player and player.is_connected:
-            try:
-                await player.websocket.send(json.dumps(message))
-            except Exception as e:
-                print(f"Error sending message to {username}: {e}")
+        self._notify("game_over")
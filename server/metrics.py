@@ -0,0 +1,225 @@
+"""
+Server metrics in the Prometheus text exposition format.
+
+A Registry holds counters, gauges and histograms and renders them for the web
+UI's /metrics route. Recording is a dict update (plus a bisect for histograms)
+on the event loop; everything else, including gauges and counters read from
+other components' stats(), is computed only when /metrics is scraped.
+
+GameMetrics defines the game server's metrics: inbound messages and action
+latency per action type, time spent in the game's rules and in building and
+queueing outbound frames, server-side bots' decision latency and search pool
+use, event log commits, and gauges for connections, tables, players,
+spectators and queue depths.
+"""
+import bisect
+import common.protocol as protocol
+
+# Seconds; game actions normally take well under a millisecond
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# Client actions get their own label values; anything else is counted as "other"
+CLIENT_ACTIONS = frozenset({
+    protocol.JOIN, protocol.START_GAME, protocol.MOVE, protocol.DRAW_CARD,
+    protocol.LIST_PLAYERS, protocol.REQUEST_SNAPSHOT, protocol.CHAT_MESSAGE,
+})
+
+def action_label(action):
+    """Label value for a client action, so unknown actions can't add label values without bound."""
+    return action if action in CLIENT_ACTIONS else "other"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=(), collect=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # Optional callable returning the current value, or {label values tuple: value},
+        # read at scrape time instead of values recorded here
+        self.collect = collect
+        self.values = {}  # label values tuple -> value
+
+    def _current(self):
+        if self.collect is None:
+            return self.values
+        result = self.collect()
+        return result if isinstance(result, dict) else {(): result}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for labels, value in sorted(self._current().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        # Each series is [per-bucket counts (the last is +Inf), sum, count]
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}  # name -> metric, in registration order
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=(), collect=None):
+        return self.register(Counter(name, help, labelnames, collect))
+
+    def gauge(self, name, help, labelnames=(), collect=None):
+        return self.register(Gauge(name, help, labelnames, collect))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        """All metrics in the text exposition format."""
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+class GameMetrics(Registry):
+    def __init__(self, game_server):
+        super().__init__()
+        self.game_server = game_server
+
+        # Recorded by the server as it handles messages
+        self.messages = self.counter(
+            "crazy8_messages_received_total", "Messages received from clients, by action.", ["action"])
+        self.action_seconds = self.histogram(
+            "crazy8_action_seconds", "Time from receiving an action to having applied it, including the wait for the table's actor.", ["action"])
+        self.game_seconds = self.histogram(
+            "crazy8_game_call_seconds", "Time spent in the game's rules (start_game, make_move, draw_card).", ["call"])
+        self.send_seconds = self.histogram(
+            "crazy8_send_seconds", "Time spent encoding and queueing an action's outbound frames, by action.", ["action"])
+        self.loop_lag = self.histogram(
+            "crazy8_event_loop_lag_seconds", "How late the event loop ran the watchdog's heartbeat.")
+        self.bot_decision_seconds = self.histogram(
+            "crazy8_bot_decision_seconds", "Time for a bot to choose a move, by how it chose (search, greedy, or forced when only one move was possible).", ["kind"])
+
+        # Read from the server and its components when scraped
+        self.gauge("crazy8_connections", "Open client connections.",
+                   collect=lambda: len(game_server.clients))
+        self.gauge("crazy8_tables", "Open tables.",
+                   collect=lambda: len(game_server.tables))
+        self.gauge("crazy8_players", "Players seated at tables.",
+                   collect=lambda: sum(len(game.players) for _, game in game_server.tables))
+        self.gauge("crazy8_spectators", "Spectators watching tables.",
+                   collect=lambda: sum(len(game.spectators) for _, game in game_server.tables))
+        self.gauge("crazy8_actor_queue_depth", "Commands waiting on table actors, over all tables.",
+                   collect=lambda: sum(actor.queue_depth() for actor in game_server.actors.values()))
+        self.gauge("crazy8_actor_queue_depth_max", "Commands waiting on the busiest table actor.",
+                   collect=lambda: max((actor.queue_depth() for actor in game_server.actors.values()), default=0))
+        self.gauge("crazy8_send_queue_depth", "Frames waiting in connection send queues, over all connections.",
+                   collect=lambda: sum(client.connection.queue_depth() for client in game_server.clients.values()))
+        self.gauge("crazy8_send_queue_depth_max", "Frames waiting in the fullest connection send queue.",
+                   collect=lambda: max((client.connection.queue_depth() for client in game_server.clients.values()), default=0))
+        self.gauge("crazy8_spectator_pending", "Entries waiting in spectator feeds, over all tables.",
+                   collect=lambda: self._sum_feeds("pending"))
+        # Kept per table, so these drop when a table closes: gauges rather than counters
+        self.gauge("crazy8_spectator_frames", "Frames delivered to spectators by the open tables' feeds.",
+                   collect=lambda: self._sum_feeds("delivered_frames"))
+        self.gauge("crazy8_frame_cache_lookups", "Frame cache lookups by the open tables, by result.", ["result"],
+                   collect=self._frame_cache_totals)
+        self.counter("crazy8_dashboard_events_total", "State events pushed to dashboard streams.",
+                     collect=lambda: game_server.dashboard.pushed_events)
+        self.counter("crazy8_dashboard_snapshot_builds_total", "Dashboard snapshots built.",
+                     collect=lambda: game_server.dashboard.builds)
+        self.counter("crazy8_event_loop_stalls_total", "Times the event loop was blocked past the watchdog's threshold.",
+                     collect=lambda: game_server.watchdog.stalls)
+        self.gauge("crazy8_bots", "Bots seated at tables.",
+                   collect=lambda: len(game_server.bots.bots))
+        self.gauge("crazy8_bot_searches_running", "Bot searches submitted to the search pool and not finished.",
+                   collect=lambda: game_server.bots.searching)
+        self.gauge("crazy8_bot_pool_workers", "Worker processes in the bot search pool.",
+                   collect=lambda: game_server.bots.workers)
+        self.counter("crazy8_bot_pool_busy_seconds_total", "Worker time spent searching; its rate over the worker count is the pool's utilisation.",
+                     collect=lambda: game_server.bots.busy_seconds)
+        self.gauge("crazy8_bot_pool_utilization", "Share of the search pool's worker time spent searching since the server started.",
+                   collect=lambda: game_server.bots.utilization())
+        self.counter("crazy8_bot_search_iterations_total", "Search iterations run by bots.",
+                     collect=lambda: game_server.bots.iterations)
+        self.counter("crazy8_bot_fallbacks_total", "Bot moves played greedily because a search failed or ran late.",
+                     collect=lambda: game_server.bots.fallbacks)
+        self.counter("crazy8_event_log_records_total", "Event log records written and fsynced.",
+                     collect=lambda: self._event_log_stat("committed"))
+        self.gauge("crazy8_event_log_pending", "Event log records queued and not yet committed.",
+                   collect=lambda: self._event_log_stat("pending"))
+        self.counter("crazy8_event_log_commits_total", "Event log group commits (one fsync per table file written).",
+                     collect=lambda: self._event_log_stat("commits"))
+        self.counter("crazy8_event_log_bytes_total", "Bytes written to event logs.",
+                     collect=lambda: self._event_log_stat("bytes_written"))
+        self.counter("crazy8_event_log_commit_seconds_total", "Time the event log writer spent writing and fsyncing.",
+                     collect=lambda: game_server.event_log.commit_seconds if game_server.event_log else 0)
+        self.gauge("crazy8_dashboard_subscriptions", "Open dashboard event streams.",
+                   collect=lambda: game_server.dashboard.stats()['subscriptions'])
+
+    def _event_log_stat(self, field):
+        event_log = self.game_server.event_log
+        return event_log.stats()[field] if event_log else 0
+
+    def _sum_feeds(self, field):
+        return sum(game.spectator_feed.stats()[field] for _, game in self.game_server.tables if game.spectator_feed)
+
+    def _frame_cache_totals(self):
+        hits = misses = 0
+        for _, game in self.game_server.tables:
+            hits += game.frame_cache.hits
+            misses += game.frame_cache.misses
+        return {("hit",): hits, ("miss",): misses}
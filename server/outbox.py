@@ -0,0 +1,92 @@
+"""
+Outbound message batching for a game table.
+
+One game action (start, move, draw, leave...) usually produces several
+messages: public broadcasts plus private messages such as hands. An Outbox
+collects them and, on flush, sends each recipient a single frame holding
+every message meant for them, in order. Each message is encoded once per
+codec and recipients that get the same messages share the same frame.
+Messages queued with a kind depend only on the public state, so their
+encodings come from the game's frame cache and are shared across actions.
+
+Spectators only get their private messages (replies to their own requests)
+from the Outbox; broadcasts reach them through the table's SpectatorFeed
+after the seated players' frames have been queued.
+"""
+class Outbox:
+    def __init__(self, game):
+        self.game = game
+        # (message, recipient username or None for everyone, excluded username, cache key or None)
+        self.entries = []
+
+    def _cache_key(self, kind):
+        # Pin the version now: the state may be published again before the flush
+        return (self.game.version, kind) if kind and self.game is not None else None
+
+    def broadcast(self, message, exclude_username=None, kind=None):
+        """Queue a message for every connected player, optionally excluding one.
+           Pass a kind for messages that depend only on the public state.
+        """
+        self.entries.append((message, None, exclude_username, self._cache_key(kind)))
+
+    def send(self, username, message, kind=None):
+        """Queue a message for one player."""
+        self.entries.append((message, username, None, self._cache_key(kind)))
+
+    def build_frames(self, entries):
+        """Return {username: frame} for every recipient of the given entries.
+           Seated players get everything meant for them; spectators only private messages.
+        """
+        encoded = {}  # (entry index, codec) -> encoded message
+        shared = {}  # (entry indices, codec) -> frame, reused by recipients with the same messages
+        frames = {}
+        members = [(username, player, False) for username, player in self.game.players.items()]
+        if self.game.spectators:
+            addressed = {entry[1] for entry in entries if entry[1] in self.game.spectators}
+            members += [(username, self.game.spectators[username], True) for username in addressed]
+        for username, player, spectator in members:
+            if not player.is_connected:
+                continue
+            indices = tuple(
+                i for i, (message, recipient, exclude, key) in enumerate(entries)
+                if recipient == username or (recipient is None and not spectator and username != exclude)
+            )
+            if not indices:
+                continue
+
+            codec = player.codec
+            frame = shared.get((indices, codec))
+            if frame is None:
+                parts = []
+                for i in indices:
+                    part = encoded.get((i, codec))
+                    if part is None:
+                        message, _, _, key = entries[i]
+                        if key is None:
+                            part = codec.encode(message)
+                        else:
+                            part = self.game.frame_cache.encode(key[0], key[1], codec, message)
+                        encoded[(i, codec)] = part
+                    parts.append(part)
+                # A lone message goes out as itself; several share one batch frame
+                frame = parts[0] if len(parts) == 1 else codec.encode_batch(parts)
+                shared[(indices, codec)] = frame
+            frames[username] = frame
+        return frames
+
+    def flush(self):
+        """Queue every recipient's combined frame on its connection, then hand the
+           broadcasts to the spectator feed.
+        """
+        entries, self.entries = self.entries, []
+        if not entries or self.game is None:
+            return
+        for username, frame in self.build_frames(entries).items():
+            member = self.game.players.get(username) or self.game.spectators[username]
+            member.connection.send(frame)
+
+        feed = self.game.spectator_feed
+        if feed is not None and self.game.spectators:
+            for message, recipient, exclude, key in entries:
+                if recipient is None:
+                    feed.publish(message, exclude, key)
@@ -2,68 +2,81 @@
 Player representation for the card game.
 """
 
-from .card import Card
+from common.codec import JSON_CODEC
+from .card import Card, CARD_POINTS, CARD_STRINGS, card_from_str
+from . import rules
 
 class Player:
-    def __init__(self, username, websocket):
+    def __init__(self, username, connection, codec=JSON_CODEC):
         self.username = username
-        self.websocket = websocket
-        self.hand = []  # List of cards
+        self.connection = connection  # Connection with the player's outbound send queue
+        self.websocket = connection.websocket if connection else None
+        self.codec = codec  # Wire encoding negotiated for this player's connection
+        self.hand = []  # List of cards, in the order they were received
+        self.hand_mask = 0  # Bit i is set when card id i is in the hand
+        self.hand_value = 0  # Running Crazy Eights point total of the hand
         self.is_connected = True
+        self.is_bot = False  # Played by the server (see server.bots)
     
     def add_card(self, card: Card):
         """Add a card object to the player's hand."""
         self.hand.append(card)
+        self.hand_mask |= 1 << card.id
+        self.hand_value += CARD_POINTS[card.id]
+    
+    def clear_hand(self):
+        """Empty the player's hand."""
+        self.hand = []
+        self.hand_mask = 0
+        self.hand_value = 0
+    
+    def _find_card(self, card_str: str) -> Card | None:
+        """Return the Card for a card string if it is in the hand, else None."""
+        card = card_from_str(card_str)
+        # Only the canonical spelling (e.g. 'TH', not '10H') names a card in the hand
+        if card is None or not (self.hand_mask >> card.id) & 1 or CARD_STRINGS[card.id] != card_str:
+            return None
+        return card
     
     def remove_card(self, card_str: str) -> Card | None:
         """Remove a card from the player's hand based on its string representation.
            Returns the removed Card object or None if not found.
         """
-        for i, card in enumerate(self.hand):
-            if str(card) == card_str:
-                return self.hand.pop(i)
-        return None
+        card = self._find_card(card_str)
+        if card is None:
+            return None
+        self.hand.remove(card)
+        self.hand_mask &= ~(1 << card.id)
+        self.hand_value -= CARD_POINTS[card.id]
+        return card
     
     def has_card(self, card_str: str) -> bool:
         """Check if player has the specified card (by string)."""
-        return any(str(card) == card_str for card in self.hand)
+        return self._find_card(card_str) is not None
     
     def get_card_from_str(self, card_str: str) -> Card | None:
         """Find and return the Card object corresponding to the string representation.
            Returns None if the card is not in the hand.
         """
-        for card in self.hand:
-            if str(card) == card_str:
-                return card
-        return None
+        return self._find_card(card_str)
     
     def get_hand_as_strings(self) -> list[str]:
         """Return the player's hand as a list of strings."""
-        return [str(card) for card in self.hand]
+        return [CARD_STRINGS[card.id] for card in self.hand]
     
     def calculate_hand_value(self) -> int:
         """Calculate the total point value of the cards in the hand (Crazy Eights scoring)."""
-        total_value = 0
-        for card in self.hand:
-            total_value += card.get_points()
-        return total_value
+        return self.hand_value
     
-    def can_play(self, top_card_value: str, required_suit: object) -> bool:
+    def can_play(self, top_card: Card, current_suit: object = None) -> bool:
         """Check if the player has any playable card.
 
         Args:
-            top_card_value: The value string of the top discard card (e.g., 'K', '7').
-            required_suit: The Suit enum member that must be matched (could be the
-                           top card's suit or a declared suit after an 8).
+            top_card: The top Card of the discard pile.
+            current_suit: The Suit declared after an 8, or None to match the
+                          top card's own suit.
 
         Returns:
             True if the player has at least one playable card, False otherwise.
         """
-        for card in self.hand:
-            # An 8 is always playable
-            if card.value == '8':
-                return True
-            # Check if card matches the required suit or the top card's value
-            if card.suit == required_suit or card.value == top_card_value:
-                return True
-        return False
+        return bool(self.hand_mask & rules.legal_mask(top_card, current_suit))
@@ -0,0 +1,29 @@
+"""
+Crazy Eights move legality as precomputed lookup tables.
+
+A game's play state is fully described by the top discard card and the
+effective suit (the suit declared after an 8, otherwise the top card's suit).
+LEGAL_MASKS[top_card_id][suit_index] is the bitmask of card ids that may be
+played in that state, so checking a card, a hand or a whole table is a single
+AND against a hand mask (see Player.hand_mask).
+"""
+from .card import NUM_CARDS, SUITS, SUIT_INDEX, CARD_VALUES, SUIT_MASKS, VALUE_MASKS
+
+# 8s are wild; otherwise a card must match the top card's value or the effective suit
+LEGAL_MASKS = tuple(
+    tuple(VALUE_MASKS['8'] | VALUE_MASKS[CARD_VALUES[top]] | SUIT_MASKS[suit] for suit in SUITS)
+    for top in range(NUM_CARDS)
+)
+
+def effective_suit(top_card, current_suit=None):
+    """The suit that must be matched: the declared suit after an 8, else the top card's suit."""
+    return current_suit if current_suit else top_card.suit
+
+def legal_mask(top_card, current_suit=None):
+    """Bitmask of the cards that may be played on top_card."""
+    suit = current_suit if current_suit else top_card.suit
+    return LEGAL_MASKS[top_card.id][SUIT_INDEX[suit]]
+
+def is_legal(card, top_card, current_suit=None):
+    """Check if a single card may be played on top_card."""
+    return bool((legal_mask(top_card, current_suit) >> card.id) & 1)
@@ -0,0 +1,179 @@
+"""
+Move search for server-side bots.
+
+A bot sees what a seated player sees: its own hand, every card played so far
+(the discard pile), how many cards each opponent holds and the deck size. The
+search is information-set Monte Carlo tree search: each iteration deals the
+unseen cards at random into the opponents' hands and the deck (a
+determinization), walks one shared tree of actions on that deal with the
+engine's rules, choosing among the actions legal in it by UCB, plays the game
+out randomly and credits each action with the share of the win its player got.
+The most visited first action is played.
+
+Everything here is plain data and server.engine calls, so search() can run in
+a worker process; Observation is built on the server from the live Game.
+"""
+import math
+import random
+import time
+from .card import NUM_CARDS, CARD_POINTS, SUIT_INDEX
+from . import engine
+from .engine import GameState, PLAY, NO_SUIT, DRAW_ACTION, legal_actions, step
+
+EXPLORATION = 0.7  # UCB exploration constant; rewards are win shares in 0..1
+MAX_ROLLOUT_MOVES = 400  # A playout still running after this is scored as if blocked
+
+class Observation:
+    """What one seated player knows. Seats are in turn order starting with the observer."""
+    __slots__ = ('hand', 'hand_counts', 'discard', 'deck_size', 'current_suit')
+
+    def __init__(self, hand, hand_counts, discard, deck_size, current_suit):
+        self.hand = hand  # Observer's hand bitmask
+        self.hand_counts = hand_counts  # Cards held per seat (seat 0 is the observer)
+        self.discard = discard  # Card ids, the top card last
+        self.deck_size = deck_size
+        self.current_suit = current_suit  # Suit index declared after an 8, or NO_SUIT
+
+    def __getstate__(self):
+        return (self.hand, self.hand_counts, self.discard, self.deck_size, self.current_suit)
+
+    def __setstate__(self, state):
+        self.hand, self.hand_counts, self.discard, self.deck_size, self.current_suit = state
+
+def observe(game, username):
+    """Observation of a running Game by one of its seated players."""
+    order = game.player_order
+    seat = order.index(username)
+    seats = order[seat:] + order[:seat]
+    return Observation(
+        hand=game.players[username].hand_mask,
+        hand_counts=tuple(len(game.players[name].hand) for name in seats),
+        discard=tuple(card.id for card in game.discard_pile),
+        deck_size=len(game.deck.cards),
+        current_suit=SUIT_INDEX[game.current_suit] if game.current_suit else NO_SUIT,
+    )
+
+def determinize(observation, rng):
+    """A GameState consistent with the observation: unseen cards dealt at random."""
+    seen = observation.hand
+    for card in observation.discard:
+        seen |= 1 << card
+    unseen = [card for card in range(NUM_CARDS) if not (seen >> card) & 1]
+    rng.shuffle(unseen)
+
+    counts = observation.hand_counts
+    state = GameState(len(counts), rng)
+    state.hands[0] = observation.hand
+    for seat in range(1, len(counts)):
+        hand = 0
+        for _ in range(counts[seat]):
+            hand |= 1 << unseen.pop()
+        state.hands[seat] = hand
+    state.deck = unseen  # Whatever is left; its size matches the observed deck size
+    state.discard = list(observation.discard)
+    state.current_suit = observation.current_suit
+    return state
+
+def win_shares(state):
+    """Seat -> share of the win: 1 for going out, split among the lowest scores otherwise."""
+    if state.over and not state.blocked:
+        return [1.0 if seat == state.winner else 0.0 for seat in range(state.num_players)]
+    scores = state.scores()
+    low = min(scores)
+    winners = scores.count(low)
+    return [1.0 / winners if score == low else 0.0 for score in scores]
+
+def candidate_actions(state):
+    """The actions worth searching: every legal play, or drawing when there is none.
+       (Game also lets a player draw while holding a playable card, which almost never pays.)
+    """
+    actions = legal_actions(state)
+    return actions[:-1] if len(actions) > 1 else actions
+
+def greedy_policy(state, rng=None):
+    """Shed the highest-value playable card, keeping 8s for last and declaring the suit
+       held most; draw only when nothing is playable.
+    """
+    hand = state.hands[state.turn]
+    playable = engine.mask_cards(hand & state.legal_mask())
+    if not playable:
+        return DRAW_ACTION
+    plain = [card for card in playable if not engine.is_eight(card)]
+    if plain:
+        return (PLAY, max(plain, key=lambda card: CARD_POINTS[card]), NO_SUIT)
+    rest = engine.mask_cards(hand & ~(1 << playable[0]))
+    counts = [0] * len(engine.ALL_SUITS)
+    for card in rest:
+        counts[engine.card_suit(card)] += 1
+    return (PLAY, playable[0], counts.index(max(counts)))
+
+class _Node:
+    __slots__ = ('parent', 'action', 'seat', 'children', 'visits', 'reward', 'available')
+
+    def __init__(self, parent=None, action=None, seat=None):
+        self.parent = parent
+        self.action = action  # Action that led here
+        self.seat = seat  # Seat that took it; rewards are from its point of view
+        self.children = {}  # action -> _Node
+        self.visits = 0
+        self.reward = 0.0
+        self.available = 1  # Iterations in which the action was legal
+
+    def ucb(self):
+        return self.reward / self.visits + EXPLORATION * math.sqrt(math.log(self.available) / self.visits)
+
+def search(observation, time_budget, seed=None, max_iterations=None):
+    """Choose an action for the observer (seat 0) within time_budget seconds.
+       Returns (action, iterations run); a forced action is returned without searching.
+    """
+    rng = random.Random(seed)
+    forced = candidate_actions(determinize(observation, rng))
+    if len(forced) == 1:
+        return forced[0], 0
+    root = _Node()
+    deadline = time.perf_counter() + time_budget
+    iterations = 0
+    while iterations == 0 or (time.perf_counter() < deadline and
+                              (max_iterations is None or iterations < max_iterations)):
+        iterations += 1
+        state = determinize(observation, rng)
+        node = root
+
+        # Selection and expansion, among the actions legal in this deal
+        while not state.over:
+            actions = candidate_actions(state)
+            untried = []
+            for action in actions:
+                child = node.children.get(action)
+                if child is None:
+                    untried.append(action)
+                else:
+                    child.available += 1
+            seat = state.turn
+            if untried:
+                action = rng.choice(untried)
+                step(state, action)
+                node.children[action] = node = _Node(node, action, seat)
+                break
+            node = max((node.children[action] for action in actions), key=_Node.ucb)
+            step(state, node.action)
+
+        # Playout
+        while not state.over and state.moves < MAX_ROLLOUT_MOVES:
+            step(state, engine.random_policy(state, rng))
+
+        shares = win_shares(state)
+        while node is not None:
+            node.visits += 1
+            if node.seat is not None:
+                node.reward += shares[node.seat]
+            node = node.parent
+
+    best = max(root.children.values(), key=lambda child: child.visits)
+    return best.action, iterations
+
+def timed_search(observation, time_budget, seed=None):
+    """search() for a worker process: returns (action, iterations, seconds spent)."""
+    started = time.perf_counter()
+    action, iterations = search(observation, time_budget, seed)
+    return action, iterations, time.perf_counter() - started
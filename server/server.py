@@ -2,331 +2,622 @@
 WebSocket server for the card game.
 """
 import asyncio
-import json
 import logging
+import os
+import random
+import signal
+import time
 import websockets
-import threading
-from .game import Game
+from .connection import Connection, DEFAULT_QUEUE_SIZE, DISCONNECT, DROP_OLDEST
+from .outbox import Outbox
+from .actor import TableActor
+from .table import TableManager, DEFAULT_TABLE, table_from_path
 import common.protocol as protocol
+from common.codec import SUBPROTOCOLS, codec_for
+from common import logconfig
+from .dashboard import DashboardHub
+from .metrics import GameMetrics, action_label
+from .bots import BotManager, DEFAULT_SEARCH_TIME, settings_from_env
+from . import eventlog
+from .eventlog import EventLog
+from .watchdog import LoopWatchdog
 from .webui import WebUI
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
+message_logger = logging.getLogger("server.messages")  # One record per inbound frame; sample or silence it here
+
+class Client:
+    """One connection's state, read and updated by its table's actor while applying its commands."""
+    def __init__(self, websocket, connection, codec):
+        self.id = id(websocket)
+        self.websocket = websocket
+        self.connection = connection
+        self.codec = codec
+        self.username = None  # Set once the client has joined a table
 
 class GameServer:
-    def __init__(self, host='localhost', port=8765, web_port=5001):
+    def __init__(self, host='localhost', port=8765, web_port=5001, send_queue_size=DEFAULT_QUEUE_SIZE,
+                 spectator_delay=0.0, spectator_sample_interval=0.0, bot_seats=0, bot_replace=False,
+                 bot_search_time=DEFAULT_SEARCH_TIME, bot_workers=None, event_log_dir=None, routed=False):
         self.host = host
         self.port = port
         self.web_port = web_port
-        self.game = Game()
-        self.clients = {}
+        self.send_queue_size = send_queue_size  # Max frames queued per connection
+        # Behind the cluster acceptor, which picked this worker by the connection URL's table
+        # (or DEFAULT_TABLE): a connection may only join that table, or it would be split across workers
+        self.routed = routed
+        # Spectators can see the game delayed and/or as periodic snapshots instead of every delta
+        self.tables = TableManager(spectator_delay, spectator_sample_interval)
+        self.clients = {}  # client_id -> Client
+        self.actors = {}  # table_id -> TableActor applying that table's commands
+        self.dashboard = DashboardHub(self.tables)  # Pushes table state changes to web dashboards
+        self.metrics = GameMetrics(self)  # Served from the web UI's /metrics
+        # Reports loop lag, and what was running when the loop stalls
+        self.watchdog = LoopWatchdog(describe=self.current_activity, on_lag=self.metrics.loop_lag.observe)
+        # Server-side players: fill seats when a game starts, stand in for players who disconnect
+        self.bots = BotManager(self, seats=bot_seats, replace=bot_replace, search_time=bot_search_time, workers=bot_workers)
+        # Every table's actions go to its event log (if enabled), so tables survive a restart
+        self.event_log = EventLog(event_log_dir) if event_log_dir else None
+        if self.event_log:
+            self.tables.add_listener(self._on_table_event)
         self.webui = WebUI(self)
     
     async def handle_client(self, websocket):
         """Handle a client connection."""
         client_id = id(websocket)
-        self.clients[client_id] = websocket
-        logger.info(f"New connection from {client_id}")
-        username = None
+        codec = codec_for(websocket.subprotocol)
+        # All frames to this client go through its bounded send queue, in order
+        connection = Connection(websocket, max_queue=self.send_queue_size)
+        connection.start()
+        client = Client(websocket, connection, codec)
+        self.clients[client_id] = client
+        logger.info("New connection from %s", client_id)
         
         try:
             async for message in websocket:
-                data = json.loads(message)
-                logger.info(f"Received from {username or 'new client'}: {data}")
-
-                action = data.get("action")
-
-                if action == protocol.JOIN:
-                    username = data["username"]
-                    success = self.game.add_player(username, websocket)
-                    if success:
-                        logger.info(f"Player {username} joined")
-                        player_count = len(self.game.players)
-
-                        # Send player joined notification to all players
-                        await self.game.broadcast(
-                            protocol.create_player_joined_message(username, player_count)
-                        )
+                received = time.perf_counter()
+                try:
+                    data = codec.decode(message)
+                except ValueError as e:
+                    connection.send(codec.encode(protocol.create_error_message(f"Malformed message: {e}")))
+                    continue
+                message_logger.info("Received from %s: %s", client.username or 'new client', data)
+                action = action_label(data.get("action"))
+                self.metrics.messages.inc(action)
 
-                        # Send the full player list to the new player
-                        all_players = list(self.game.players.keys())
-                        await self.game.send_to_player(
-                            username,
-                            protocol.create_player_list_message(all_players)
-                        )
+                if data.get("action") == protocol.JOIN:
+                    if client.username:
+                        connection.send(codec.encode(
+                            protocol.create_error_message(f"Already joined as {client.username}")
+                        ))
+                        continue
 
-                        # If game is already in progress, send current state (without hand)
-                        if self.game.started:
-                            top_card = self.game.get_top_discard_card()
-                            await self.game.send_to_player(
-                                username,
-                                protocol.create_update_game_state_message(
-                                    current_turn=self.game.get_current_player(),
-                                    top_card=str(top_card) if top_card else None,
-                                    current_suit=self.game.current_suit.value if self.game.current_suit else None
-                                )
-                            )
-                            await self.game.send_to_player(username, protocol.create_error_message("Game already in progress. You are observing."))
+                    error = (protocol.text_error("username", data.get("username"), protocol.MAX_USERNAME_LENGTH) or
+                             protocol.text_error("table", data.get("table"), protocol.MAX_TABLE_LENGTH, required=False))
+                    if error:
+                        connection.send(codec.encode(protocol.create_error_message(error)))
+                        continue
 
-                    else:
-                        await websocket.send(json.dumps(
-                            protocol.create_error_message(f"Username {username} already taken or invalid")
+                    # A table named in the connection URL pins the connection to it,
+                    # which is what the cluster acceptor routes on.
+                    url_table = table_from_path(websocket.path)
+                    if self.routed:
+                        url_table = url_table or DEFAULT_TABLE
+                    if url_table and data.get("table") and data["table"] != url_table:
+                        connection.send(codec.encode(
+                            protocol.create_error_message(f"Table {data['table']} does not match connection table {url_table}")
                         ))
-                        username = None
+                        continue
 
-                elif not username:
-                    await websocket.send(json.dumps(
+                    table_id = data.get("table") or url_table or DEFAULT_TABLE
+                    await self.run_on_table(table_id, self.join, client, data, table_id)
+                    self.metrics.action_seconds.observe(time.perf_counter() - received, action)
+
+                elif not client.username:
+                    connection.send(codec.encode(
                         protocol.create_error_message("You must join first.")
                     ))
-                    continue
 
-                elif action == protocol.START_GAME:
-                    success, error = self.game.start_game()
-                    if success:
-                        logger.info(f"Game started by {username}")
-                        current_turn = self.game.get_current_player()
-                        top_card = self.game.get_top_discard_card()
-                        current_suit = self.game.current_suit
-
-                        # Send game started to all players
-                        await self.game.broadcast(
-                            protocol.create_game_started_message(
-                                current_turn,
-                                str(top_card),
-                                current_suit.value if current_suit else None
-                            )
-                        )
+                else:
+                    # The table's actor applies this action in order with everyone else's
+                    await self.run_on_table(self.tables.table_for(client_id), self.handle_action, client, data, label=action)
+                    self.metrics.action_seconds.observe(time.perf_counter() - received, action)
+        
+        except websockets.exceptions.ConnectionClosedOK:
+            logger.info("Client %s disconnected normally.", client_id)
+        except websockets.exceptions.ConnectionClosedError as e:
+            logger.warning("Client %s connection closed with error: %s", client_id, e)
+        except Exception as e:
+            logger.error("Error handling client %s: %s", client_id, e, exc_info=True)
+        finally:
+            table_id = self.tables.table_for(client_id)
+            if client.username and table_id is not None:
+                await self.run_on_table(table_id, self.leave, client)
 
-                        # Send private hand to each player
-                        for player_name, player in self.game.players.items():
-                            hand = player.get_hand_as_strings()
-                            await self.game.send_to_player(
-                                player_name,
-                                protocol.create_deal_message(hand)
-                            )
-                    else:
-                        await websocket.send(json.dumps(
-                            protocol.create_error_message(error or "Failed to start game")
-                        ))
+            await connection.close()
 
-                elif action == protocol.MOVE:
-                    move_data = data.get("move", {})
-                    card_str = move_data.get("card")
-                    declared_suit_str = move_data.get("declaredSuit")
+            if client_id in self.clients:
+                del self.clients[client_id]
+                logger.info("Client websocket %s removed.", client_id)
 
-                    if not card_str:
-                        await websocket.send(json.dumps(protocol.create_error_message("Invalid move format.")))
-                        continue
+    async def run_on_table(self, table_id, command, *args, label=None):
+        """Apply command(*args) on the table's actor, in order with the table's other commands."""
+        actor = self.actors.get(table_id)
+        if actor is None:
+            actor = self.actors[table_id] = TableActor(table_id, on_idle=self._actor_idle)
+        return await actor.submit(command, *args, label=label)
+
+    def current_activity(self):
+        """The table command being applied, if any (e.g. 'move on table main'). Called from the watchdog thread."""
+        for actor in list(self.actors.values()):
+            label = actor.current
+            if label is not None:
+                return f"{label} on table {actor.table_id}"
+        return None
+
+    def _actor_idle(self, actor):
+        """Retire a table's actor once the table has closed."""
+        if self.tables.get(actor.table_id) is None and self.actors.get(actor.table_id) is actor:
+            del self.actors[actor.table_id]
+            return True
+        return False
+
+    def _on_table_event(self, table_id, event):
+        if event == "closed":
+            self.event_log.close_table(table_id)
+
+    def log_event(self, table_id, game, event, *fields):
+        """Append a game event to the table's event log, if there is one."""
+        if self.event_log is not None:
+            self.event_log.append(table_id, game, event, *fields)
+
+    def restore_tables(self):
+        """Reopen the tables whose rounds were running when the server stopped, from their event logs.
+           Their players take their seats back by joining with the same username.
+        """
+        for table_id, game in self.event_log.recover().items():
+            self.tables.restore(table_id, game)
+            game.publish_state()
+            for username, player in game.players.items():
+                if player.is_bot:
+                    self.bots.take_over(table_id, game, username)
+
+    def join(self, client, data, table_id):
+        """Seat (or, mid-round, add as a spectator) a client at a table. Runs on the table's actor."""
+        connection, codec, client_id = client.connection, client.codec, client.id
+        username = data["username"]
+        game = self.tables.get_or_create(table_id)
+        outbox = Outbox(game)
+        # While a round is running, newcomers watch it as spectators until it ends
+        spectating = game.started
+        if spectating and game.reattach_player(username, connection, codec):
+            # A seat restored after a restart, waiting for its player
+            client.username = username
+            self.tables.bind(client_id, table_id)
+            logger.info("Player %s rejoined table %s", username, table_id)
+            outbox.send(
+                username,
+                protocol.create_player_list_message(list(game.players.keys())),
+                kind=protocol.PLAYER_LIST
+            )
+            self.send_snapshot(outbox, username)
+            outbox.flush()
+            return
+        if spectating:
+            success = game.add_spectator(username, connection, codec)
+        else:
+            success = game.add_player(username, connection, codec)
+        if success and spectating:
+            client.username = username
+            self.tables.bind(client_id, table_id)
+            logger.info("Spectator %s is watching table %s", username, table_id)
+            # Spectators can skip stale frames rather than be disconnected
+            connection.overflow_policy = DROP_OLDEST
+            outbox.send(
+                username,
+                protocol.create_player_list_message(list(game.players.keys())),
+                kind=protocol.PLAYER_LIST
+            )
+            outbox.send(username, protocol.create_error_message("Game already in progress. You are observing."))
+            # The snapshot goes through the spectator feed, in order with what follows
+            game.spectator_feed.watch(username)
+        elif success:
+            client.username = username
+            self.tables.bind(client_id, table_id)
+            logger.info("Player %s joined table %s", username, table_id)
+            player_count = len(game.players)
+
+            # Send player joined notification to all players
+            outbox.broadcast(
+                protocol.create_player_joined_message(username, player_count)
+            )
+            # Existing players get a delta; the new player starts from a snapshot
+            self.broadcast_state(outbox, exclude_username=username)
+
+            # Send the full player list to the new player
+            all_players = list(game.players.keys())
+            outbox.send(
+                username,
+                protocol.create_player_list_message(all_players),
+                kind=protocol.PLAYER_LIST
+            )
+            self.send_snapshot(outbox, username)
+
+        else:
+            connection.send(codec.encode(
+                protocol.create_error_message(f"Username {username} already taken or invalid")
+            ))
+            self.tables.discard_if_empty(table_id)
+
+        started = time.perf_counter()
+        outbox.flush()
+        self.metrics.send_seconds.observe(time.perf_counter() - started, protocol.JOIN)
+
+    def handle_action(self, client, data):
+        """Apply one action from a seated client or spectator. Runs on the table's actor."""
+        connection, codec, username = client.connection, client.codec, client.username
+        action = data.get("action")
+        table_id = self.tables.table_for(client.id)
+        game = self.tables.get(table_id)
+        # Everything this action sends goes out as one frame per recipient
+        outbox = Outbox(game)
+
+        if username in game.spectators and action in (protocol.START_GAME, protocol.MOVE, protocol.DRAW_CARD):
+            connection.send(codec.encode(
+                protocol.create_error_message("You are observing this game.")
+            ))
 
-                    success, error, result_data = self.game.make_move(username, card_str, declared_suit_str)
+        elif action == protocol.START_GAME:
+            if not game.started:
+                for bot_name in self.bots.fill_seats(table_id, game):
+                    outbox.broadcast(protocol.create_player_joined_message(bot_name, len(game.players)))
+            seating = eventlog.seating(game)
+            seed = random.getrandbits(64) if self.event_log else None  # Logged, so the round can be rebuilt
+            started = time.perf_counter()
+            success, error = game.start_game(seed)
+            self.metrics.game_seconds.observe(time.perf_counter() - started, "start_game")
+            if success:
+                logger.info("Game started by %s", username)
+                self.log_event(table_id, game, eventlog.START, seed, seating)
+                # Everyone at the table is seated now and must not miss frames
+                for player in game.players.values():
+                    player.connection.overflow_policy = DISCONNECT
+                current_turn = game.get_current_player()
+                top_card = game.get_top_discard_card()
+                current_suit = game.current_suit
+
+                # Send game started to all players
+                outbox.broadcast(
+                    protocol.create_game_started_message(
+                        current_turn,
+                        str(top_card),
+                        current_suit.value if current_suit else None
+                    )
+                )
+
+                self.broadcast_state(outbox)
+
+                # Send private hand to each player
+                for player_name, player in game.players.items():
+                    hand = player.get_hand_as_strings()
+                    outbox.send(
+                        player_name,
+                        protocol.create_deal_message(hand)
+                    )
+            else:
+                connection.send(codec.encode(
+                    protocol.create_error_message(error or "Failed to start game")
+                ))
+
+        elif action == protocol.MOVE:
+            move_data = data.get("move", {})
+            card_str = move_data.get("card")
+            declared_suit_str = move_data.get("declaredSuit")
+
+            if not card_str:
+                connection.send(codec.encode(protocol.create_error_message("Invalid move format.")))
+                return
+
+            started = time.perf_counter()
+            success, error, result_data = game.make_move(username, card_str, declared_suit_str)
+            self.metrics.game_seconds.observe(time.perf_counter() - started, "make_move")
+
+            if success:
+                self.log_event(table_id, game, eventlog.MOVE, username, card_str, declared_suit_str)
+                if "game_over" in result_data:
+                    self.log_event(table_id, game, eventlog.END, "")
+                if declared_suit_str:
+                    logger.info("Move made by %s: %s (declared %s)", username, card_str, declared_suit_str)
+                else:
+                    logger.info("Move made by %s: %s", username, card_str)
+                # One delta carries the move, the new top card/suit and the next turn
+                move = {"player": result_data["player_who_played"], "card": result_data["played_card"]}
+                if result_data.get("declared_suit"):
+                    move["declaredSuit"] = result_data["declared_suit"]
+                self.broadcast_state(outbox, move=move)
+
+                if "game_over" in result_data:
+                    game_over_info = result_data["game_over"]
+                    outbox.broadcast(
+                        protocol.create_game_over_message(
+                            winner=game_over_info["winner"],
+                            scores=game_over_info["scores"],
+                            blocked=game_over_info["blocked"]
+                        )
+                    )
+                    logger.info("Game over! Winner: %s", game_over_info['winner'])
+                    self.seat_spectators(outbox)
+                else:
+                    # Log turn change to terminal
+                    logger.info("Turn changing to: %s", result_data['next_player'])
+            else:
+                connection.send(codec.encode(
+                    protocol.create_error_message(error or "Invalid move")
+                ))
 
-                    if success:
-                        logger.info(f"Move made by {username}: {card_str} {f'(declared {declared_suit_str})' if declared_suit_str else ''}")
-                        if "game_over" in result_data:
-                            game_over_info = result_data["game_over"]
-                            await self.game.broadcast(
+        elif action == protocol.DRAW_CARD:
+            # Drawing from an empty deck shuffles the discard pile (all but the top card) back in
+            reshuffled = 0 if game.deck.cards else max(len(game.discard_pile) - 1, 0)
+            started = time.perf_counter()
+            success, error, result_data = game.draw_card(username)
+            self.metrics.game_seconds.observe(time.perf_counter() - started, "draw_card")
+
+            if success:
+                if reshuffled:
+                    self.log_event(table_id, game, eventlog.RESHUFFLE, reshuffled)
+                self.log_event(table_id, game, eventlog.DRAW, username)
+                if "game_over" in result_data:
+                    self.log_event(table_id, game, eventlog.END, "")
+                draw_info = result_data.get("draw_result")
+                if draw_info:
+                    logger.info("%s drew: %s", username, draw_info.get('card'))
+                    outbox.send(
+                        username,
+                        protocol.create_draw_result_message(
+                            drawn_card=draw_info.get("card"),
+                            can_play=draw_info.get("can_play", False),
+                            deck_empty=draw_info.get("deck_empty", False),
+                            game_blocked=draw_info.get("game_blocked", False)
+                        )
+                    )
+                    self.broadcast_state(outbox)
+
+                    if draw_info.get("game_blocked", False):
+                        game_over_info = result_data.get("game_over")
+                        if game_over_info:
+                            outbox.broadcast(
                                 protocol.create_game_over_message(
                                     winner=game_over_info["winner"],
                                     scores=game_over_info["scores"],
                                     blocked=game_over_info["blocked"]
                                 )
                             )
-                            logger.info(f"Game over! Winner: {game_over_info['winner']}")
-                        else:
-                            await self.game.broadcast(
-                                protocol.create_move_made_message(
-                                    player=result_data["player_who_played"],
-                                    card=result_data["played_card"],
-                                    top_card=result_data["top_card"],
-                                    current_suit=result_data["current_suit"],
-                                    declared_suit=result_data.get("declared_suit")
-                                )
-                            )
-                            
-                            # Log turn change to terminal
-                            logger.info(f"Turn changing to: {result_data['next_player']}")
-                            
-                            await self.game.broadcast(
-                                protocol.create_turn_change_message(
-                                    current_turn=result_data["next_player"],
-                                    top_card=result_data["top_card"],
-                                    current_suit=result_data["current_suit"]
-                                )
-                            )
-                    else:
-                        await websocket.send(json.dumps(
-                            protocol.create_error_message(error or "Invalid move")
-                        ))
+                            logger.info("Game blocked! Winner/Lowest: %s", game_over_info['winner'])
+                            self.seat_spectators(outbox)
 
-                elif action == protocol.DRAW_CARD:
-                    success, error, result_data = self.game.draw_card(username)
-
-                    if success:
-                        draw_info = result_data.get("draw_result")
-                        if draw_info:
-                            logger.info(f"{username} drew: {draw_info.get('card')}")
-                            await self.game.send_to_player(
-                                username,
-                                protocol.create_draw_result_message(
-                                    drawn_card=draw_info.get("card"),
-                                    can_play=draw_info.get("can_play", False),
-                                    deck_empty=draw_info.get("deck_empty", False),
-                                    game_blocked=draw_info.get("game_blocked", False)
-                                )
-                            )
+                elif "next_player" in result_data:
+                    logger.info("%s tried to draw, but deck empty. Turn passed.", username)
+                    outbox.send(username, protocol.create_error_message(error))
+                    
+                    logger.info("Turn changing to: %s", result_data['next_player'])
+                    self.broadcast_state(outbox)
 
-                            if draw_info.get("game_blocked", False):
-                                game_over_info = result_data.get("game_over")
-                                if game_over_info:
-                                    await self.game.broadcast(
-                                        protocol.create_game_over_message(
-                                            winner=game_over_info["winner"],
-                                            scores=game_over_info["scores"],
-                                            blocked=game_over_info["blocked"]
-                                        )
-                                    )
-                                    logger.info(f"Game blocked! Winner/Lowest: {game_over_info['winner']}")
-
-                        elif "next_player" in result_data:
-                            logger.info(f"{username} tried to draw, but deck empty. Turn passed.")
-                            await self.game.send_to_player(username, protocol.create_error_message(error))
-                            
-                            logger.info(f"Turn changing to: {result_data['next_player']}")
-                            
-                            await self.game.broadcast(
-                                protocol.create_turn_change_message(
-                                    current_turn=result_data["next_player"],
-                                    top_card=result_data["top_card"],
-                                    current_suit=result_data["current_suit"]
-                                )
-                            )
+            else:
+                connection.send(codec.encode(
+                    protocol.create_error_message(error or "Cannot draw card")
+                ))
 
-                    else:
-                        await websocket.send(json.dumps(
-                            protocol.create_error_message(error or "Cannot draw card")
-                        ))
+        elif action == protocol.LIST_PLAYERS:
+            player_names = list(game.players.keys())
+            outbox.send(
+                username,
+                protocol.create_player_list_message(player_names),
+                kind=protocol.PLAYER_LIST
+            )
+            logger.info("Sent player list to %s: %s", username, player_names)
 
-                elif action == protocol.LIST_PLAYERS:
-                    player_names = list(self.game.players.keys())
-                    await self.game.send_to_player(
-                        username,
-                        protocol.create_player_list_message(player_names)
-                    )
-                    logger.info(f"Sent player list to {username}: {player_names}")
-                
-                elif action == protocol.CHAT_MESSAGE: #Here we handle chat messages on server
-                    chat_message = data.get("message")
-                    if chat_message:
-                        logger.info(f"Chat message from {username}: {chat_message}")
-                        await self.game.broadcast(
-                            protocol.create_chat_message(username, chat_message),
-                            exclude_username=username
-                        )
-                    else:
-                        await websocket.send(json.dumps(
-                            protocol.create_error_message("Invalid chat message format.")
-                        ))
+        elif action == protocol.REQUEST_SNAPSHOT:
+            self.send_snapshot(outbox, username)
         
-        except websockets.exceptions.ConnectionClosedOK:
-            logger.info(f"Client {client_id} disconnected normally.")
-        except websockets.exceptions.ConnectionClosedError as e:
-            logger.warning(f"Client {client_id} connection closed with error: {e}")
-        except Exception as e:
-            logger.error(f"Error handling client {client_id}: {e}", exc_info=True)
-        finally:
-            if username:
-                logger.info(f"Player {username} disconnecting...")
-                was_started = self.game.started  # Check if game was running *before* removing player
-                removed, was_current_player = self.game.remove_player(username)
-
-                if removed:
-                    logger.info(f"Removed player {username} from game state")
-                    player_count = len(self.game.players)
-
-                    # Notify remaining players about the departure
-                    if self.game.players:
-                        await self.game.broadcast(
-                            protocol.create_player_left_message(username, player_count),
-                            exclude_username=username
-                        )
+        elif action == protocol.CHAT_MESSAGE: #Here we handle chat messages on server
+            chat_message = data.get("message")
+            error = chat_message and protocol.text_error("message", chat_message, protocol.MAX_CHAT_LENGTH)
+            if error:
+                connection.send(codec.encode(protocol.create_error_message(error)))
+            elif chat_message:
+                logger.info("Chat message from %s: %s", username, chat_message)
+                outbox.broadcast(
+                    protocol.create_chat_message(username, chat_message),
+                    exclude_username=username
+                )
+            else:
+                connection.send(codec.encode(
+                    protocol.create_error_message("Invalid chat message format.")
+                ))
 
-                    # Check if the game should end because the player quit mid-game
-                    # Use was_started to see if game was running before removal
-                    if was_started and not self.game.game_over_data:  # Check if game hasn't already ended (e.g., by player count < 2 in remove_player)
-                        logger.info(f"Game was in progress. Ending game because player {username} quit.")
-                        # End the game with a specific reason
-                        self.game.end_game(reason=f"Player {username} quit")
-                        # The game_over_data is now set by end_game
-
-                    # Broadcast game over if it ended (either by player count < 2 in remove_player OR explicit quit above)
-                    if self.game.game_over_data:
-                        # Ensure the reason is included in the message
-                        reason = self.game.game_over_data.get("reason", "Game ended")
-                        logger.info(f"Broadcasting game over. Reason: {reason}")
-                        await self.game.broadcast(
-                            protocol.create_game_over_message(
-                                winner=self.game.game_over_data["winner"],
-                                scores=self.game.game_over_data["scores"],
-                                blocked=self.game.game_over_data["blocked"],
-                                reason=reason  # Pass reason to protocol function
-                            ),
-                            exclude_username=username  # Exclude the player who just left
-                        )
-                        # Reset game_over_data after broadcasting? Or let start_game handle reset?
-                        # Let start_game handle reset.
-
-                    # If game didn't end, but was started and the current player left, advance turn
-                    # This condition should now only be met if the game didn't end due to the quit
-                    elif was_started and was_current_player:
-                        next_player = self.game.get_current_player()
-                        top_card = self.game.get_top_discard_card()
-                        current_suit = self.game.current_suit
-                        logger.info(f"Player {username} left on their turn. New turn: {next_player}")
-                        
-                        # Log turn change to terminal when player leaves during their turn
-                        logger.info(f"Turn changing to: {next_player}")
-
-                        
-                        await self.game.broadcast(
-                            protocol.create_turn_change_message(
-                                current_turn=next_player,
-                                top_card=str(top_card) if top_card else None,
-                                current_suit=current_suit.value if current_suit else None
-                            ),
-                            exclude_username=username
-                        )
+        started = time.perf_counter()
+        outbox.flush()
+        self.metrics.send_seconds.observe(time.perf_counter() - started, action_label(action))
+
+    def leave(self, client):
+        """Remove a disconnected client from its table. Runs on the table's actor."""
+        client_id, username = client.id, client.username
+        game = self.tables.game_for(client_id)
+        if username and game and username in game.spectators:
+            game.remove_spectator(username)
+            game.spectator_feed.unwatch(username)
+            logger.info("Spectator %s stopped watching", username)
+        elif username and game and self.bots.replace and game.started and self.bots.has_humans(game, besides=username):
+            # Keep the round going: a bot plays out the player's hand
+            table_id = self.tables.table_for(client_id)
+            self.bots.take_over(table_id, game, username)
+            self.log_event(table_id, game, eventlog.BOT, username)
+            outbox = Outbox(game)
+            outbox.broadcast(protocol.create_chat_message("Server", f"{username} disconnected; a bot is playing their hand."))
+            outbox.flush()
+        elif username and game:
+            logger.info("Player %s disconnecting...", username)
+            was_started = game.started  # Check if game was running *before* removing player
+            removed, was_current_player = game.remove_player(username)
+            outbox = Outbox(game)
+
+            if removed:
+                logger.info("Removed player %s from game state", username)
+                if was_started:
+                    self.log_event(self.tables.table_for(client_id), game, eventlog.LEAVE, username)
+                player_count = len(game.players)
+
+                # Notify remaining players about the departure
+                if game.players:
+                    outbox.broadcast(
+                        protocol.create_player_left_message(username, player_count),
+                        exclude_username=username
+                    )
+
+                # Check if the game should end because the player quit mid-game
+                # Use was_started to see if game was running before removal
+                if was_started and not game.game_over_data:  # Check if game hasn't already ended (e.g., by player count < 2 in remove_player)
+                    logger.info("Game was in progress. Ending game because player %s quit.", username)
+                    # End the game with a specific reason
+                    game.end_game(reason=f"Player {username} quit")
+                    # The game_over_data is now set by end_game
+                if was_started and game.game_over_data:
+                    self.log_event(self.tables.table_for(client_id), game, eventlog.END, game.game_over_data["reason"])
+
+                # Publish the new player list (and any turn change or game end) as one delta
+                if game.players:
+                    self.broadcast_state(outbox, exclude_username=username)
+
+                # Broadcast game over if it ended (either by player count < 2 in remove_player OR explicit quit above)
+                if game.game_over_data:
+                    # Ensure the reason is included in the message
+                    reason = game.game_over_data.get("reason", "Game ended")
+                    logger.info("Broadcasting game over. Reason: %s", reason)
+                    outbox.broadcast(
+                        protocol.create_game_over_message(
+                            winner=game.game_over_data["winner"],
+                            scores=game.game_over_data["scores"],
+                            blocked=game.game_over_data["blocked"],
+                            reason=reason  # Pass reason to protocol function
+                        ),
+                        exclude_username=username  # Exclude the player who just left
+                    )
+                    self.seat_spectators(outbox)
+                    # Reset game_over_data after broadcasting? Or let start_game handle reset?
+                    # Let start_game handle reset.
+
+                # If game didn't end, but was started and the current player left, advance turn
+                # This condition should now only be met if the game didn't end due to the quit
+                elif was_started and was_current_player:
+                    next_player = game.get_current_player()
+                    logger.info("Player %s left on their turn. New turn: %s", username, next_player)
+                    
+                    # Log turn change to terminal when player leaves during their turn
+                    # (the state delta above already told the table)
+                    logger.info("Turn changing to: %s", next_player)
+
+                outbox.flush()
+
+        table_id = self.tables.unbind(client_id)
+        if table_id is not None and game is not None and self.tables.get(table_id) is game and not self.bots.has_humans(game):
+            dismissed = self.bots.dismiss(table_id, game)
+            logger.info("Only bots are left at table %s; removed them: %s", table_id, dismissed)
+        if table_id is not None and self.tables.get(table_id) is None:
+            logger.info("Table %s is empty and was closed.", table_id)
+
+    def broadcast_state(self, outbox, move=None, exclude_username=None):
+        """Queue the game's unpublished public state changes as one versioned delta."""
+        version, changes = outbox.game.publish_state()
+        if changes:
+            outbox.broadcast(
+                protocol.create_state_delta_message(version, changes, move),
+                exclude_username=exclude_username,
+                kind=protocol.STATE_DELTA
+            )
+
+    def send_snapshot(self, outbox, username):
+        """Queue the full public state at the current version, plus the player's hand.
+           Players not seated in the round (late joiners, observers) hold no cards, so
+           they all get the same cached public snapshot frame.
+        """
+        game = outbox.game
+        if username in game.spectators:
+            # Keep spectators' snapshots in order with (and as delayed as) their feed
+            game.spectator_feed.send_snapshot(username)
+            return
+        version, state = game.get_snapshot()
+        player = game.players.get(username)
+        if player and username in game.player_order:
+            hand = player.get_hand_as_strings()
+            outbox.send(username, protocol.create_snapshot_message(version, state, hand))
+        else:
+            outbox.send(username, protocol.create_snapshot_message(version, state), kind=protocol.SNAPSHOT)
+
+    def seat_spectators(self, outbox):
+        """Once a round is over, seat the table's spectators as players for the next one."""
+        game = outbox.game
+        seated = game.seat_spectators()
+        if not seated:
+            return
+        logger.info("Seating spectators for the next round: %s", seated)
+        for username in seated:
+            game.spectator_feed.unwatch(username)
+        # The player list changed; the newly seated may have missed delayed frames, so resync them
+        self.broadcast_state(outbox)
+        for username in seated:
+            self.send_snapshot(outbox, username)
 
-            if client_id in self.clients:
-                del self.clients[client_id]
-                logger.info(f"Client websocket {client_id} removed.")
-    
     async def start_server(self):
         """Start the WebSocket server."""
+        if self.event_log:
+            # Rebuild interrupted tables before anyone can join them
+            self.restore_tables()
+            self.event_log.start()
         server = await websockets.serve(
-            self.handle_client, self.host, self.port
+            self.handle_client, self.host, self.port,
+            subprotocols=SUBPROTOCOLS
         )
-        logger.info(f"Server started at ws://{self.host}:{self.port}")
+        logger.info("Server started at ws://%s:%s", self.host, self.port)
+        self.watchdog.start()
         
-        # Start the web UI in a separate thread
-        self.webui.start(host=self.host, port=self.web_port, debug=False)
-        logger.info(f"Web UI started at http://{self.host}:{self.web_port}")
+        # The web UI shares this event loop, so its handlers never race game actions
+        await self.webui.start(host=self.host, port=self.web_port)
         
         return server
 
-async def main():
-    """Main entry point for the server."""
-    server = GameServer()
+    async def stop_server(self, server):
+        """Shut down the server started by start_server()."""
+        if self.event_log:
+            # Commit the log before the sockets close, so the players dropped by the
+            # shutdown aren't logged as leaving and get their seats back after a restart
+            self.event_log.stop()
+        self.watchdog.stop()  # Closing every socket holds the loop up; that's not a stall
+        self.bots.close()
+        server.close()
+        await server.wait_closed()
+        await self.webui.stop()
+
+async def serve(server):
+    """Run a GameServer until SIGINT or SIGTERM, then shut it down."""
     ws_server = await server.start_server()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C cancels serve() instead, and the finally below still runs
     try:
-        await asyncio.Future()  # Run forever
-    except KeyboardInterrupt:
+        await stop.wait()
         logger.info("Server shutting down...")
-        ws_server.close()
-        await ws_server.wait_closed()
+    finally:
+        await server.stop_server(ws_server)
         logger.info("Server stopped.")
 
+async def main():
+    """Main entry point for the server."""
+    logconfig.configure()
+    await serve(GameServer(event_log_dir=os.environ.get("CRAZY8_EVENT_LOG"), **settings_from_env()))
+
 if __name__ == "__main__":
     asyncio.run(main())
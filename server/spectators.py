@@ -0,0 +1,163 @@
+"""
+Spectator fan-out for a game table.
+
+People who join a table while a round is running watch it as spectators. They
+are kept out of Game.players, so they never take part in turns or scoring, and
+they are fed by their own pipeline instead of the seated players' Outbox path:
+public messages are queued on the table's SpectatorFeed and a background task
+fans them out after the seated players have been served, yielding to the event
+loop between chunks of spectators so a large audience never delays a turn.
+
+The feed can optionally:
+- delay everything spectators see by a fixed number of seconds, and
+- sample state changes: instead of every state delta, spectators get a public
+  snapshot at most once per sample interval.
+"""
+import asyncio
+import logging
+from collections import deque
+import common.protocol as protocol
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 256  # Spectators served between yields to the event loop
+
+class SpectatorFeed:
+    def __init__(self, game, delay=0.0, sample_interval=0.0, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.game = game
+        self.delay = delay  # Seconds added before spectators see anything
+        self.sample_interval = sample_interval  # Min seconds between state samples; 0 sends every delta
+        self.chunk_size = chunk_size
+        # Entries are (sequence, due time, message, recipient or None for all, excluded username, cache key)
+        self.pending = deque()
+        self.sequence = 0
+        self.watching_since = {}  # username -> first entry sequence the spectator should get
+        self.last_sample = float("-inf")  # When the last state sample was taken
+        self.sample_timer = None  # Takes the next sample once the interval is up
+        self.wakeup = asyncio.Event()
+        self.task = None
+        self.delivered_frames = 0
+        self.sampled_out = 0  # State deltas folded into a later sampled snapshot
+
+    def watch(self, username):
+        """Start feeding a new spectator: everything queued from now on, starting with a snapshot."""
+        self.watching_since[username] = self.sequence
+        self.send_snapshot(username)
+
+    def unwatch(self, username):
+        """Stop tracking a spectator that left or was seated."""
+        self.watching_since.pop(username, None)
+
+    def send_snapshot(self, username):
+        """Queue the current public snapshot for one spectator, in order with the feed."""
+        version, state = self.game.get_snapshot()
+        self._enqueue(protocol.create_snapshot_message(version, state), username, None, (version, protocol.SNAPSHOT))
+
+    def publish(self, message, exclude_username=None, cache_key=None):
+        """Queue a public message for every spectator.
+           cache_key is (state version, message kind) for messages that depend only on public state.
+        """
+        if not self.game.spectators:
+            return
+        if self.sample_interval and cache_key and cache_key[1] == protocol.STATE_DELTA:
+            self._sample()
+            return
+        self._enqueue(message, None, exclude_username, cache_key)
+
+    def _sample(self):
+        """Sample a state change: take a snapshot now if the interval is up, otherwise
+           leave it to the sample taken when the interval ends.
+        """
+        loop = asyncio.get_running_loop()
+        if loop.time() - self.last_sample >= self.sample_interval:
+            self._take_sample()
+            return
+        self.sampled_out += 1
+        if self.sample_timer is None:
+            self.sample_timer = loop.call_at(self.last_sample + self.sample_interval, self._take_sample)
+
+    def _take_sample(self):
+        """Queue a snapshot of the current public state; it goes out after the usual delay."""
+        self.sample_timer = None
+        self.last_sample = asyncio.get_running_loop().time()
+        if self.game.spectators:
+            version, state = self.game.get_snapshot()
+            self._enqueue(protocol.create_snapshot_message(version, state), None, None, (version, protocol.SNAPSHOT))
+
+    def _enqueue(self, message, recipient, exclude_username, cache_key):
+        loop = asyncio.get_running_loop()
+        self.pending.append((self.sequence, loop.time() + self.delay, message, recipient, exclude_username, cache_key))
+        self.sequence += 1
+        self.wakeup.set()
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        """Deliver queued entries in order once they are due."""
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.pending:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            entry = self.pending[0]
+            wait = entry[1] - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            # Let seated players' handlers run before spectators are served
+            await asyncio.sleep(0)
+            self.pending.popleft()
+            try:
+                await self._fan_out(entry)
+            except Exception as e:
+                logger.error("Error sending to spectators: %s", e, exc_info=True)
+
+    async def _fan_out(self, entry):
+        sequence, _, message, recipient, exclude_username, cache_key = entry
+        if recipient is not None:
+            spectator = self.game.spectators.get(recipient)
+            targets = [(recipient, spectator)] if spectator else []
+        else:
+            targets = list(self.game.spectators.items())
+
+        frames = {}  # codec -> encoded message
+        served = 0
+        for username, spectator in targets:
+            if username == exclude_username or not spectator.is_connected:
+                continue
+            if sequence < self.watching_since.get(username, 0):
+                continue  # Queued before this spectator's snapshot
+            frame = frames.get(spectator.codec)
+            if frame is None:
+                if cache_key is None:
+                    frame = spectator.codec.encode(message)
+                else:
+                    frame = self.game.frame_cache.encode(cache_key[0], cache_key[1], spectator.codec, message)
+                frames[spectator.codec] = frame
+            spectator.connection.send(frame)
+            self.delivered_frames += 1
+            served += 1
+            if served % self.chunk_size == 0:
+                await asyncio.sleep(0)
+
+    def close(self):
+        """Stop the feed once its table is gone."""
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.sample_timer:
+            self.sample_timer.cancel()
+            self.sample_timer = None
+        self.pending.clear()
+
+    def stats(self):
+        """Counters for the web UI and monitoring."""
+        return {
+            "spectators": len(self.game.spectators),
+            "pending": len(self.pending),
+            "delivered_frames": self.delivered_frames,
+            "sampled_out": self.sampled_out,
+            "delay": self.delay,
+            "sample_interval": self.sample_interval,
+        }
@@ -0,0 +1,95 @@
+"""
+Table (room) management so one server process can host many games.
+"""
+from urllib.parse import parse_qs, urlsplit
+from .game import Game
+from .spectators import SpectatorFeed
+
+DEFAULT_TABLE = "main"  # Table used by clients that don't name one
+
+def table_from_path(path):
+    """Return the table id named in a connection URL (e.g. '/?table=t1'), or None."""
+    if not path:
+        return None
+    values = parse_qs(urlsplit(path).query).get("table")
+    return values[0] if values and values[0] else None
+
+class TableManager:
+    def __init__(self, spectator_delay=0.0, spectator_sample_interval=0.0):
+        self.tables = {}  # table_id -> Game object
+        self.connections = {}  # client_id -> table_id
+        self.spectator_delay = spectator_delay  # Passed to each table's SpectatorFeed
+        self.spectator_sample_interval = spectator_sample_interval
+        self.listeners = []  # Called with (table_id, event) for every table's state changes
+
+    def add_listener(self, callback):
+        """Register callback(table_id, event) for changes at any table, including
+           'opened' and 'closed' when tables come and go.
+        """
+        self.listeners.append(callback)
+
+    def _notify(self, table_id, event):
+        for callback in self.listeners:
+            callback(table_id, event)
+
+    def get_or_create(self, table_id):
+        """Return the game for a table, creating the table if needed."""
+        game = self.tables.get(table_id)
+        if game is None:
+            game = self.restore(table_id, Game())
+        return game
+
+    def restore(self, table_id, game):
+        """Open a table with an existing game (e.g. one rebuilt from its event log)."""
+        game.spectator_feed = SpectatorFeed(
+            game, delay=self.spectator_delay, sample_interval=self.spectator_sample_interval
+        )
+        game.add_listener(lambda event, table_id=table_id: self._notify(table_id, event))
+        self.tables[table_id] = game
+        self._notify(table_id, "opened")
+        return game
+
+    def get(self, table_id):
+        """Return the game for a table, or None if the table doesn't exist."""
+        return self.tables.get(table_id)
+
+    def bind(self, client_id, table_id):
+        """Record that a connection is seated at (or watching) a table."""
+        self.connections[client_id] = table_id
+
+    def table_for(self, client_id):
+        """Return the table id a connection is seated at, or None."""
+        return self.connections.get(client_id)
+
+    def game_for(self, client_id):
+        """Return the game a connection is seated at, or None."""
+        table_id = self.connections.get(client_id)
+        if table_id is None:
+            return None
+        return self.tables.get(table_id)
+
+    def unbind(self, client_id):
+        """Forget a connection and clean up its table if it is now empty.
+           Returns the table id the connection was seated at, or None.
+        """
+        table_id = self.connections.pop(client_id, None)
+        if table_id is not None:
+            self.discard_if_empty(table_id)
+        return table_id
+
+    def discard_if_empty(self, table_id):
+        """Remove a table once nobody is seated at or watching it. Returns True if removed."""
+        game = self.tables.get(table_id)
+        if game is not None and not game.players and not game.spectators:
+            del self.tables[table_id]
+            if game.spectator_feed:
+                game.spectator_feed.close()
+            self._notify(table_id, "closed")
+            return True
+        return False
+
+    def __len__(self):
+        return len(self.tables)
+
+    def __iter__(self):
+        return iter(self.tables.items())
@@ -0,0 +1,98 @@
+"""
+Event loop lag watchdog.
+
+Every table shares one asyncio loop, so any slow synchronous code (a big
+shuffle, a blocking write, a busy dashboard render...) stalls all of them.
+The watchdog measures it two ways:
+- a heartbeat task on the loop sleeps for a fixed interval and records how
+  late it wakes up (the loop's scheduling lag), and
+- a background thread checks that the heartbeat keeps coming. When it stops
+  for longer than the threshold, the thread logs the loop thread's current
+  stack, together with the table command being applied, while the loop is
+  still blocked, which points at the code that is stalling the server.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 0.1  # Seconds between heartbeats
+DEFAULT_THRESHOLD = 0.25  # Seconds without a heartbeat before a stall is reported
+
+class LoopWatchdog:
+    def __init__(self, interval=DEFAULT_INTERVAL, threshold=DEFAULT_THRESHOLD, describe=None, on_lag=None):
+        self.interval = interval
+        self.threshold = threshold
+        self.describe = describe  # Called from the watchdog thread; returns what the loop is busy with, or None
+        self.on_lag = on_lag  # Called on the loop with each heartbeat's lag in seconds
+        self.loop_thread_id = None
+        self.last_beat = time.monotonic()
+        self.reported_beat = None  # Heartbeat after which the current stall was reported
+        self.heartbeat_task = None
+        self.thread = None
+        self.stopping = threading.Event()
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+
+    def start(self):
+        """Start the heartbeat on the running loop and the watchdog thread."""
+        if self.heartbeat_task is not None:
+            return
+        self.loop_thread_id = threading.get_ident()
+        self.last_beat = time.monotonic()
+        self.stopping.clear()
+        self.heartbeat_task = asyncio.create_task(self._heartbeat())
+        self.thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the heartbeat and the watchdog thread."""
+        self.stopping.set()
+        if self.heartbeat_task:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            previous_beat, self.last_beat = self.last_beat, time.monotonic()
+            if self.reported_beat == previous_beat:
+                logger.warning("Event loop unblocked; the heartbeat ran %.3fs late", lag)
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            if self.on_lag:
+                self.on_lag(lag)
+
+    def _watch(self):
+        # Check a few times per threshold so a stall is caught while it is happening
+        while not self.stopping.wait(self.threshold / 4):
+            beat = self.last_beat
+            blocked_for = time.monotonic() - beat - self.interval
+            if blocked_for < self.threshold or beat == self.reported_beat:
+                continue
+            self.reported_beat = beat
+            self.stalls += 1
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "(unavailable)\n"
+            activity = self.describe() if self.describe else None
+            logger.warning("Event loop blocked for %.3fs while applying %s. Loop thread stack:\n%s",
+                           blocked_for, activity or "no table command", stack.rstrip())
+
+    def stats(self):
+        """Counters for the web UI and monitoring."""
+        return {
+            'last_lag_ms': round(self.last_lag * 1000, 3),
+            'max_lag_ms': round(self.max_lag * 1000, 3),
+            'stalls': self.stalls,
+        }
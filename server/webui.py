@@ -1,93 +1,293 @@
 """
-Flask web interface for the card game server.
+Web interface for the card game server.
+
+Served by aiohttp on the same event loop as the WebSocket server, so request
+handlers read game state between game actions rather than from another thread.
 """
-import os
-from flask import Flask, render_template, redirect, url_for, request, jsonify, session
-from datetime import datetime
+import asyncio
+import concurrent.futures
+import itertools
 import json
-import threading
+import os
 import logging
+from datetime import datetime
+from aiohttp import web
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from .table import DEFAULT_TABLE
+from .dashboard import ALL_TABLES
+from . import eventlog
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+KEEPALIVE_INTERVAL = 15  # Seconds between SSE comments on an idle stream
+REPLAY_BATCH = 64  # /api/replay lines built per trip to a worker thread
+REPLAY_WORKERS = 4  # Threads reading and replaying logs for /api/replay
+
+def url_for(endpoint, filename=None):
+    """Template helper with the same call style as Flask's: url_for('static', filename='x.css')."""
+    if endpoint == 'static':
+        return f"/static/{filename}"
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+def _replay_lines(path, index, header, move, count):
+    """The /api/replay response lines for a round: the header, then states from the seek position."""
+    for _, event, payload in eventlog.read_records(path, index.offset, index.end):
+        header['start'] = eventlog.describe_event(event, eventlog.decode_event(event, payload))
+        break
+    yield json.dumps(header).encode('utf-8') + b"\n"
+    states = eventlog.replay_round(path, index, move)
+    try:
+        for sent, (number, event, fields, game) in enumerate(states):
+            if count is not None and sent > count:
+                break
+            line = {
+                'move': number,
+                'event': eventlog.describe_event(event, fields) if event else None,
+                'state': eventlog.replay_state(game)
+            }
+            yield json.dumps(line).encode('utf-8') + b"\n"
+    finally:
+        states.close()
+
+def _next_lines(lines):
+    return list(itertools.islice(lines, REPLAY_BATCH))
+
 class WebUI:
     def __init__(self, game_server=None):
-        """Initialize the Flask application for the web UI"""
-        self.app = Flask(
-            __name__,
-            template_folder='../templates',
-            static_folder='../static'
+        """Initialize the aiohttp application for the web UI"""
+        self.app = web.Application()
+        self.templates = Environment(
+            loader=FileSystemLoader(TEMPLATE_DIR),
+            autoescape=select_autoescape(['html'])
         )
-        self.app.secret_key = os.environ.get('SECRET_KEY', os.urandom(24))
+        self.templates.globals['url_for'] = url_for
         self.game_server = game_server
+        self.runner = None
+        self.pages = {}  # table_id -> (ETag, rendered index page) for the table's current snapshot
+        self.replay_pool = concurrent.futures.ThreadPoolExecutor(REPLAY_WORKERS, thread_name_prefix="replay")
         self.setup_routes()
-        
+
     def setup_routes(self):
-        """Set up the Flask routes"""
-        
-        @self.app.route('/')
-        def index():
-            """Home page - shows game status and connected players"""
-            
-            players = list(self.game_server.game.players.keys())
-            is_started = self.game_server.game.started
-            current_player = self.game_server.game.get_current_player()
-            top_card = self.game_server.game.get_top_discard_card()
-            current_suit = self.game_server.game.current_suit
-            
-            game_info = {
-                'started': is_started,
-                'players': players,
-                'current_player': current_player,
-                'top_card': str(top_card) if top_card else None,
-                'current_suit': current_suit.value if current_suit and is_started else None,
-                'player_count': len(players)
-            }
-            
-            return render_template('index.html', game=game_info)
-        
-        
-        @self.app.route('/api/game-state')
-        def game_state_api():
-            """API endpoint to get the current game state as JSON"""
-            if not self.game_server:
-                return jsonify({'error': 'Game server not initialized'})
-            
-            players = {}
-            for username, player in self.game_server.game.players.items():
-                players[username] = {
-                    'hand_size': len(player.hand),
-                    'is_connected': player.is_connected
-                }
-            
-            game_info = {
-                'started': self.game_server.game.started,
-                'players': players,
-                'current_player': self.game_server.game.get_current_player(),
-                'player_order': self.game_server.game.player_order,
-                'deck_size': len(self.game_server.game.deck.cards),
-                'discard_size': len(self.game_server.game.discard_pile),
-                'top_card': str(self.game_server.game.get_top_discard_card()) if self.game_server.game.discard_pile else None,
-                'current_suit': self.game_server.game.current_suit.value if self.game_server.game.current_suit else None,
-                'timestamp': datetime.now().isoformat()
+        """Set up the HTTP routes"""
+        self.app.router.add_get('/', self.index)
+        self.app.router.add_get('/api/game-state', self.game_state_api)
+        self.app.router.add_get('/api/game-state/stream', self.game_state_stream)
+        self.app.router.add_get('/api/tables', self.tables_api)
+        self.app.router.add_get('/api/replay', self.replay_api)
+        self.app.router.add_get('/metrics', self.metrics)
+        self.app.router.add_static('/static', STATIC_DIR)
+
+    async def index(self, request):
+        """Home page - shows game status and connected players"""
+        table_id = request.query.get('table', DEFAULT_TABLE)
+        snapshot = self._get_snapshot(table_id)
+        if snapshot is None or snapshot.state is None:
+            self.pages.pop(table_id, None)
+            return web.Response(text=self._render_index(None), content_type='text/html')
+        if self._not_modified(request, snapshot.etag):
+            return web.Response(status=304, headers={'ETag': snapshot.etag})
+
+        # Render at most once per table snapshot
+        page = self.pages.get(table_id)
+        if page is None or page[0] != snapshot.etag:
+            page = self.pages[table_id] = (snapshot.etag, self._render_index(snapshot.state).encode('utf-8'))
+        return web.Response(body=page[1], content_type='text/html', charset='utf-8',
+                            headers={'ETag': page[0], 'Cache-Control': 'no-cache'})
+
+    def _render_index(self, state):
+        """Render the home page from a table's dashboard state (None if the table isn't open)."""
+        players = list(state['players']) if state else []
+        is_started = state['started'] if state else False
+
+        game_info = {
+            'started': is_started,
+            'players': players,
+            'current_player': state['current_player'] if state else None,
+            'top_card': state['top_card'] if state else None,
+            'current_suit': state['current_suit'] if state and is_started else None,
+            'player_count': len(players)
+        }
+
+        return self.templates.get_template('index.html').render(game=game_info)
+
+    async def game_state_api(self, request):
+        """API endpoint to get the current game state as JSON.
+           Answers If-None-Match with 304 while the table hasn't changed.
+        """
+        if not self.game_server:
+            return web.json_response({'error': 'Game server not initialized'})
+
+        table_id = request.query.get('table', DEFAULT_TABLE)
+        snapshot = self._get_snapshot(table_id)
+        if snapshot.state is None:
+            return web.json_response({'error': f'Table {table_id} not found'}, status=404)
+        if self._not_modified(request, snapshot.etag):
+            return web.Response(status=304, headers={'ETag': snapshot.etag})
+        return web.Response(body=snapshot.body, content_type='application/json', charset='utf-8',
+                            headers={'ETag': snapshot.etag, 'Cache-Control': 'no-cache'})
+
+    async def game_state_stream(self, request):
+        """Server-Sent Events stream of game state changes.
+           ?table=<id> (repeatable) picks the tables to watch, ?table=* watches all of them.
+           Each change sends a 'state' event with the /api/game-state payload, or a
+           'closed' event when the table isn't open.
+        """
+        if not self.game_server:
+            return web.json_response({'error': 'Game server not initialized'})
+
+        table_ids = request.query.getall('table', [DEFAULT_TABLE])
+        response = web.StreamResponse(headers={
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache'
+        })
+        await response.prepare(request)
+
+        hub = self.game_server.dashboard
+        subscription = hub.subscribe([ALL_TABLES] if ALL_TABLES in table_ids else table_ids)
+        try:
+            while True:
+                events = await subscription.next_events(KEEPALIVE_INTERVAL)
+                if events is None:
+                    break
+                await response.write(b"".join(events) if events else b": keep-alive\n\n")
+        except ConnectionResetError:
+            pass  # Dashboard went away
+        finally:
+            hub.unsubscribe(subscription)
+        return response
+
+    async def tables_api(self, request):
+        """API endpoint listing open tables and their player counts"""
+        if not self.game_server:
+            return web.json_response({'error': 'Game server not initialized'})
+
+        tables = {}
+        for table_id, game in self.game_server.tables:
+            tables[table_id] = {
+                'started': game.started,
+                'player_count': len(game.players),
+                'spectator_count': len(game.spectators),
+                'frame_cache': game.frame_cache.stats(),
+                'spectator_feed': game.spectator_feed.stats() if game.spectator_feed else None,
+                'actor': actor.stats() if (actor := self.game_server.actors.get(table_id)) else None
             }
-            
-            return jsonify(game_info)
-        
-    def start(self, host='0.0.0.0', port=5001, debug=False):
-        """Start the Flask web server"""
-        # Use a separate thread for Flask to avoid blocking the WebSocket server
-        threading.Thread(
-            target=self.app.run,
-            kwargs={'host': host, 'port': port, 'debug': debug},
-            daemon=True
-        ).start()
-        logger.info(f"Web UI started at http://{host}:{port}")
-        
+        return web.json_response({
+            'tables': tables,
+            'table_count': len(tables),
+            'dashboard': self.game_server.dashboard.stats(),
+            'event_loop': self.game_server.watchdog.stats(),
+            'bots': self.game_server.bots.stats(),
+            'event_log': self.game_server.event_log.stats() if self.game_server.event_log else None
+        })
+
+    async def replay_api(self, request):
+        """Newline-delimited JSON replay of a round from a table's event log, finished or still running.
+           ?table=<id>&round=<n> picks the round (1 is the table's first; negative counts back
+           from the latest, the default), ?move=<m> seeks to the state after m events (0, the
+           default, is the deal) and ?count=<k> limits the states sent after it.
+           The first line describes the round; each further line is
+           {'move': ..., 'event': ..., 'state': ...}, the first of them for the seek position.
+        """
+        if not self.game_server:
+            return web.json_response({'error': 'Game server not initialized'})
+        event_log = self.game_server.event_log
+        if not event_log:
+            return web.json_response({'error': 'Event log not enabled'}, status=404)
+
+        table_id = request.query.get('table', DEFAULT_TABLE)
+        try:
+            round_number = int(request.query.get('round', -1))
+            move = int(request.query.get('move', 0))
+            count = int(request.query['count']) if 'count' in request.query else None
+        except ValueError:
+            return web.json_response({'error': 'round, move and count must be integers'}, status=400)
+        if move < 0 or (count is not None and count < 0):
+            return web.json_response({'error': 'move and count must not be negative'}, status=400)
+
+        # Only committed events are replayed; a round still running ends at its last commit
+        rounds, index = event_log.find_round(table_id, round_number)
+        if not rounds:
+            return web.json_response({'error': f'No event log for table {table_id}'}, status=404)
+        if index is None:
+            return web.json_response({'error': f'Table {table_id} has no round {round_number}'}, status=404)
+        header = {
+            'table': table_id,
+            'round': round_number if round_number > 0 else rounds + round_number + 1,
+            'rounds': rounds,
+            'offset': index.offset,  # Of the round's START record in the log file
+            'moves': index.moves,
+        }
+
+        response = web.StreamResponse(headers={
+            'Content-Type': 'application/x-ndjson',
+            'Cache-Control': 'no-cache'
+        })
+        await response.prepare(request)
+        lines = _replay_lines(event_log.path(table_id), index, header, move, count)
+        job = None
+        try:
+            while True:
+                # The file is read and the round replayed off the event loop, a batch of lines at a time
+                job = self.replay_pool.submit(_next_lines, lines)
+                batch = await asyncio.wrap_future(job)
+                if not batch:
+                    break
+                await response.write(b"".join(batch))
+        except ConnectionResetError:
+            pass  # Client went away
+        except (OSError, ValueError) as e:
+            logger.error("Replay of table %s round %s failed: %s", table_id, header['round'], e)
+        finally:
+            # Closes the generator and its log file right away, or, if the request was
+            # cancelled mid-batch, as soon as the worker thread is done with it
+            if job is None:
+                lines.close()
+            else:
+                job.add_done_callback(lambda _: lines.close())
+        return response
+
+    async def metrics(self, request):
+        """Server metrics in the Prometheus text exposition format"""
+        if not self.game_server:
+            return web.Response(status=503, text='Game server not initialized')
+        return web.Response(text=self.game_server.metrics.render(),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    def _get_snapshot(self, table_id):
+        """Current dashboard snapshot of a table, or None without a game server."""
+        if not self.game_server:
+            return None
+        return self.game_server.dashboard.snapshot(table_id)
+
+    @staticmethod
+    def _not_modified(request, etag):
+        """True if the request's If-None-Match already names this ETag."""
+        header = request.headers.get('If-None-Match')
+        if not header:
+            return False
+        tags = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+        return '*' in tags or etag in tags
+
+    async def start(self, host='0.0.0.0', port=5001):
+        """Start serving the web UI on the running event loop"""
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        logger.info("Web UI started at http://%s:%s", host, port)
+
+    async def stop(self):
+        """Stop the web UI and close its connections"""
+        if self.runner:
+            if self.game_server:
+                self.game_server.dashboard.close()  # End open event streams
+            await self.runner.cleanup()
+            self.runner = None
+        self.replay_pool.shutdown(wait=False, cancel_futures=True)
+
     def set_game_server(self, game_server):
         """Set the game server instance after initialization"""
-        self.game_server = game_server
\ No newline at end of file
+        self.game_server = game_server
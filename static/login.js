@@ -354,7 +354,10 @@ document.addEventListener('DOMContentLoaded', function() {
 
         // Initialize WebSocket connection
         // Assuming your server is running on ws://localhost:8765
-        socket = new WebSocket('ws://localhost:8765');
+        // The table named in the page URL (e.g. /?table=friday) is also put in the
+        // socket URL so a sharded server can route the connection to its worker
+        const tableId = new URLSearchParams(window.location.search).get('table');
+        socket = new WebSocket(tableId ? `ws://localhost:8765/?table=${encodeURIComponent(tableId)}` : 'ws://localhost:8765');
 
         socket.onopen = function(event) {
             console.log('WebSocket connection established.');
@@ -363,6 +366,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 action: 'join', // As defined in protocol.py
                 username: currentUsername // Use stored username
             };
+            // Join the table named in the page URL, if any
+            if (tableId) {
+                joinMessage.table = tableId;
+            }
             socket.send(JSON.stringify(joinMessage));
             console.log('Join message sent:', joinMessage);
 
@@ -375,7 +382,10 @@ document.addEventListener('DOMContentLoaded', function() {
         };
 
         socket.onmessage = function(event) {
-            const message = JSON.parse(event.data);
+            handleServerMessage(JSON.parse(event.data));
+        };
+
+        function handleServerMessage(message) {
             console.log('Message from server:', message);
 
             switch (message.action) {
@@ -901,10 +911,54 @@ document.addEventListener('DOMContentLoaded', function() {
                     console.log(`Game over! Winner: ${winner}, Reason: ${reason}`);
                     break;
 
+                case 'batch': // Several messages from one server action in a single frame
+                    (message.messages || []).forEach(handleServerMessage);
+                    break;
+
+                case 'state_delta': { // Changed public state fields; replaces move_made + turn_change
+                    const changes = message.changes || {};
+                    if (message.move) {
+                        handleServerMessage({
+                            action: 'move_made',
+                            player: message.move.player,
+                            move: {
+                                card: message.move.card,
+                                topCard: changes.topCard,
+                                currentSuit: 'currentSuit' in changes ? changes.currentSuit : currentSuit,
+                                declaredSuit: message.move.declaredSuit
+                            }
+                        });
+                    }
+                    // Game start and game over have their own messages
+                    if (changes.currentTurn && !('started' in changes)) {
+                        handleServerMessage({
+                            action: 'turn_change',
+                            currentTurn: changes.currentTurn,
+                            topCard: changes.topCard,
+                            currentSuit: 'currentSuit' in changes ? changes.currentSuit : currentSuit
+                        });
+                    }
+                    break;
+                }
+
+                case 'snapshot': { // Full state, sent on join (and on request)
+                    const state = message.state || {};
+                    if (state.started) {
+                        handleServerMessage({
+                            action: 'game_update',
+                            topCard: state.topCard,
+                            currentTurn: state.currentTurn,
+                            hand: state.hand,
+                            player_for_hand: currentUsername
+                        });
+                    }
+                    break;
+                }
+
                 default:
                     console.log('Received unhandled action or message format:', message);
             }
-        };
+        }
 
         socket.onerror = function(error) {
             console.error('WebSocket Error:', error);